@@ -0,0 +1,130 @@
+"""Benchmarks of open-ai: ``analyzeRequest`` latency and ``/analyze`` throughput.
+
+Runs in-process against the stub OpenAI endpoint, using a scratch database
+on the MongoDB at ``MONGO_URI`` (dropped afterwards). Prints one JSON
+document; everything is reported as skipped when MongoDB is unreachable.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "open-ai"))
+sys.path.insert(0, HERE)
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from openai import OpenAI  # noqa: E402
+from pymongo import MongoClient  # noqa: E402
+from pymongo.errors import PyMongoError  # noqa: E402
+
+import app  # noqa: E402
+from analysiscache import AnalysisCache  # noqa: E402
+from measure import maxRss, peakMemory, summarize, timed  # noqa: E402
+from stubs import StubOpenAI, serve  # noqa: E402
+from synthetic import syntheticMetrics  # noqa: E402
+from tasks import AnalysisQueue  # noqa: E402
+
+SCRATCH_DB = "youtube_history_benchmark"
+
+
+def useScratchDatabase(mongo_uri, workers):
+    """Point the app at a throwaway database; returns its client."""
+    client = MongoClient(mongo_uri, serverSelectionTimeoutMS=2000)
+    client.admin.command("ping")
+    client.drop_database(SCRATCH_DB)
+    app.db = client[SCRATCH_DB]
+    app.analysisCache = AnalysisCache(app.db.analysis_cache, 3600)
+    app.analysisQueue = AnalysisQueue(
+        app.db, app.runAnalysisTask, on_failure=app.failAnalysis, workers=workers, poll_interval=0.05,
+    )
+    return client
+
+
+def insertRequests(count, events, seed):
+    docs = [
+        {"status": "analyzing", "event_count": events, "metrics": syntheticMetrics(events, seed=seed + i)}
+        for i in range(count)
+    ]
+    return [str(request_id) for request_id in app.db.Request.insert_many(docs).inserted_ids]
+
+
+def benchAnalyzeRequest(count, events):
+    ids = insertRequests(count, events, seed=0)
+    result = {}
+    # distinct metrics miss the analysis cache; asking again hits it
+    for label in ("cold", "cached"):
+        latencies = []
+        for request_id in ids:
+            (body, status), seconds = timed(app.analyzeRequest, request_id)
+            if status != 200:
+                raise RuntimeError(f"analyzeRequest failed: {body}")
+            latencies.append(seconds)
+        result[label] = summarize(latencies)
+    _, result["peak_memory_bytes"] = peakMemory(app.analyzeRequest, insertRequests(1, events, seed=count)[0])
+    return result
+
+
+def benchAnalyzeEndpoint(count, events):
+    ids = insertRequests(count, events, seed=10_000)
+    client = app.app.test_client()
+    latencies = []
+    start = time.perf_counter()
+    for request_id in ids:
+        response, seconds = timed(client.post, "/analyze", json={"id": request_id})
+        if response.status_code != 202:
+            raise RuntimeError(f"/analyze answered {response.status_code}")
+        latencies.append(seconds)
+
+    # the queue drains with its configured number of workers
+    app.analysisQueue.start()
+    while app.db.Request.count_documents({"_id": {"$in": [app.ObjectId(i) for i in ids]}, "status": "done"}) < count:
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - start
+    app.analysisQueue.stop()
+    return {
+        "requests": count,
+        "enqueue": summarize(latencies),
+        "analyses_per_second": round(count / elapsed, 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--events", type=int, default=10000, help="history size behind each request")
+    parser.add_argument("--openai-latency", type=float, default=0.2)
+    parser.add_argument("--workers", type=int, default=app.ANALYSIS_WORKERS)
+    parser.add_argument("--stream", action="store_true", help="use streaming completions")
+    parser.add_argument("--mongo-uri", default=os.getenv("MONGO_URI", "mongodb://localhost:27017"))
+    args = parser.parse_args(argv)
+
+    try:
+        mongo = useScratchDatabase(args.mongo_uri, args.workers)
+    except PyMongoError as e:
+        skipped = {"skipped": f"MongoDB not reachable at {args.mongo_uri}: {e.__class__.__name__}"}
+        json.dump({"analyze_request": skipped, "analyze": skipped}, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        return
+
+    server, url = serve(StubOpenAI, latency=args.openai_latency)
+    app.client = OpenAI(api_key="benchmark", base_url=f"{url}/v1", max_retries=0)
+    app.OPENAI_STREAM = args.stream
+    try:
+        results = {
+            "analyze_request": benchAnalyzeRequest(args.requests, args.events),
+            "analyze": benchAnalyzeEndpoint(args.requests, args.events),
+        }
+    finally:
+        server.shutdown()
+        mongo.drop_database(SCRATCH_DB)
+
+    results["max_rss_bytes"] = maxRss()
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
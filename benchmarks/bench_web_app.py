@@ -0,0 +1,252 @@
+"""Benchmarks of web-app: history processing, enrichment and ``/upload``.
+
+Processing and enrichment run in-process against the stub YouTube endpoint
+with a cold metadata cache. ``/upload`` needs a running stack, so it is only
+measured when ``--web-url`` is given. Prints one JSON document.
+"""
+
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import zlib
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "web-app"))
+sys.path.insert(0, HERE)
+
+import requests  # noqa: E402
+
+import app  # noqa: E402
+from columnar import EventColumns, EventColumnStore, EventColumnsWriter  # noqa: E402
+from measure import maxRss, peakMemory, summarize, timed  # noqa: E402
+from stubs import StubYouTube, serve  # noqa: E402
+from synthetic import takeoutBytes  # noqa: E402
+from takeout import iterWatchEvents  # noqa: E402
+from videocache import VideoLRUCache  # noqa: E402
+from watchstats import WatchMetrics  # noqa: E402
+from youtube import VideoFetcher  # noqa: E402
+
+
+class ColdMetadataCache:
+    """Stands in for the Mongo ``video_metadata`` cache: always a miss, never stored."""
+
+    def getMany(self, video_ids):
+        return {}
+
+    def putMany(self, items):
+        pass
+
+    def stats(self):
+        return {}
+
+
+class UnlimitedQuota:
+    """Stands in for the Mongo-backed quota governor: every reservation is granted."""
+
+    def reserve(self, user, units):
+        return units
+
+    def settle(self, user, reserved, spent):
+        pass
+
+    def exhaust(self):
+        pass
+
+
+def useStubYouTube(url, concurrency):
+    app.youtube = VideoFetcher("benchmark", f"{url}/youtube/v3/videos", concurrency=concurrency, backoff=0)
+    app.videoCache = ColdMetadataCache()
+    app.quota = UnlimitedQuota()
+    resetLRU()
+
+
+def resetLRU():
+    app.videoLRU = VideoLRUCache(app.VIDEO_LRU_MAX_BYTES, app.VIDEO_NEGATIVE_TTL)
+
+
+def benchProcessWatchHistory(data, records, chunk_size, repeat):
+    def run():
+        resetLRU()
+        app.processWatchHistory(
+            io.BytesIO(data), chunk_size=chunk_size, limit=records, stream=True,
+            metrics=WatchMetrics(), sink=lambda events: None,
+        )
+
+    durations = [timed(run)[1] for _ in range(repeat)]
+    _, peak = peakMemory(run)
+    best = min(durations)
+    return {
+        "records": records,
+        "bytes": len(data),
+        "seconds": [round(d, 4) for d in durations],
+        "records_per_second": round(records / best),
+        "peak_memory_bytes": peak,
+    }
+
+
+def benchEnrichData(data, chunk_size):
+    events = list(iterWatchEvents(io.BytesIO(data)))
+    chunks = [events[i:i + chunk_size] for i in range(0, len(events), chunk_size)]
+    result = {"events": len(events), "chunk_size": chunk_size}
+    resetLRU()
+    # the first pass fetches every video; the second is served by the LRU
+    for label in ("cold", "warm"):
+        metrics = WatchMetrics()
+        latencies = [timed(app.enrichData, chunk, metrics)[1] for chunk in chunks]
+        total = sum(latencies)
+        result[label] = {
+            "chunks": summarize(latencies),
+            "events_per_second": round(len(events) / total) if total else None,
+        }
+    return result
+
+
+def benchEventColumns(data):
+    """Dict-per-event list against the columnar file: memory, and one time rollup pass each."""
+    events = list(iterWatchEvents(io.BytesIO(data)))
+    videos = {event["video_id"]: {
+        "id": event["video_id"],
+        "contentDetails": {"duration": "PT4M"},
+        "snippet": {"channelTitle": "Channel", "categoryId": "22"},
+    } for event in events}
+
+    def asDicts():
+        return [{**event, "channel": "Channel", "category": "22", "duration": 240.0} for event in events]
+
+    def asColumns():
+        writer = EventColumnsWriter()
+        writer.extend(events, videos)
+        return writer
+
+    def dictHistogram(rows):
+        WatchMetrics().addWatches(row["timestamp"] for row in rows)
+
+    rows, dict_peak = peakMemory(asDicts)
+    writer, column_peak = peakMemory(asColumns)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "events.cols")
+        writer.write(path)
+        with EventColumns(path) as columns:
+            _, column_seconds = timed(columns.rollups)
+            result = {
+                "events": len(events),
+                "file_bytes": os.path.getsize(path),
+                "dicts": {"peak_memory_bytes": dict_peak, "rollup_seconds": round(timed(dictHistogram, rows)[1], 4)},
+                "columns": {"peak_memory_bytes": column_peak, "rollup_seconds": round(column_seconds, 4)},
+            }
+    return result
+
+
+def benchActivity(data, segments=4, repeat=3):
+    """What ``/activity`` does with a history saved as ``segments`` uploads: save each, then rollups and rankings."""
+    events = list(iterWatchEvents(io.BytesIO(data)))
+    videos = {event["video_id"]: {
+        "id": event["video_id"],
+        "contentDetails": {"duration": f"PT{len(event['video_id']) % 9 + 1}M"},
+        "snippet": {"channelTitle": f"Channel {zlib.crc32(event['video_id'].encode()) % 500}", "categoryId": str(zlib.crc32(event["video_id"].encode()) % 30)},
+    } for event in events}
+    # newest first, like Takeout; each upload's new events are newer than the last
+    size = -(-len(events) // segments)
+    writers = []
+    for i in range(0, len(events), size):
+        writer = EventColumnsWriter()
+        writer.extend(events[i:i + size], videos)
+        writers.append(writer)
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = EventColumnStore(directory)
+        ids = [f"segment-{i}" for i in range(len(writers))]
+
+        def save():
+            for request_id, writer in zip(ids, writers):
+                store.save(request_id, writer)
+
+        def activity():
+            with store.openHistory(ids) as history:
+                history.count()
+                history.rollups(timezone="America/New_York")
+                history.topChannels(10)
+                history.topCategories(10)
+
+        save_seconds = min(timed(save)[1] for _ in range(repeat))
+        activity_seconds = [timed(activity)[1] for _ in range(repeat)]
+    return {
+        "events": len(events),
+        "segments": len(writers),
+        "save_seconds": round(save_seconds, 4),
+        "activity": summarize(activity_seconds),
+        "activity_events_per_second": round(len(events) / min(activity_seconds)),
+    }
+
+
+def benchUpload(web_url, data, uploads, wait):
+    latencies = []
+    completions = []
+    for i in range(uploads):
+        files = {"file": (f"watch-history-{i}.json", data, "application/json")}
+        start = time.perf_counter()
+        response = requests.post(f"{web_url}/upload", files=files, allow_redirects=False, timeout=300)
+        latencies.append(time.perf_counter() - start)
+        response.raise_for_status()
+        if not wait:
+            continue
+        status_url = f"{web_url}{response.headers['Location']}/status"
+        while True:
+            status = requests.get(status_url, timeout=30).json().get("status")
+            if status in ("done", "failed"):
+                completions.append(time.perf_counter() - start)
+                break
+            time.sleep(0.2)
+    result = {
+        "uploads": uploads,
+        "bytes": len(data),
+        "request": summarize(latencies),
+        "uploads_per_second": round(uploads / sum(latencies), 3),
+    }
+    if wait:
+        result["end_to_end"] = summarize(completions)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--youtube-latency", type=float, default=0.02)
+    parser.add_argument("--concurrency", type=int, default=app.YOUTUBE_CONCURRENCY)
+    parser.add_argument("--web-url", help="running web-app to benchmark /upload against")
+    parser.add_argument("--uploads", type=int, default=5)
+    parser.add_argument("--upload-size", type=int, default=10000)
+    parser.add_argument("--wait", action="store_true", help="time uploads until their analysis finishes")
+    args = parser.parse_args(argv)
+
+    server, url = serve(StubYouTube, latency=args.youtube_latency)
+    useStubYouTube(url, args.concurrency)
+    results = {"process_watch_history": {}, "enrich_data": {}, "event_columns": {}, "activity": {}}
+    try:
+        for size in args.sizes:
+            data = takeoutBytes(size)
+            results["process_watch_history"][str(size)] = benchProcessWatchHistory(data, size, args.chunk_size, args.repeat)
+            results["enrich_data"][str(size)] = benchEnrichData(data, args.chunk_size)
+            results["event_columns"][str(size)] = benchEventColumns(data)
+            results["activity"][str(size)] = benchActivity(data)
+    finally:
+        server.shutdown()
+
+    if args.web_url:
+        results["upload"] = benchUpload(args.web_url.rstrip("/"), takeoutBytes(args.upload_size), args.uploads, args.wait)
+    else:
+        results["upload"] = {"skipped": "no --web-url given"}
+
+    results["max_rss_bytes"] = maxRss()
+    json.dump(results, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
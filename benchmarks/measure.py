@@ -0,0 +1,62 @@
+"""Timing and memory helpers shared by the benchmarks."""
+
+import resource
+import sys
+import time
+import tracemalloc
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies):
+    """Latency summary in milliseconds."""
+    values = sorted(latencies)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values) * 1000, 3),
+        "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+        "p90_ms": round(percentile(values, 0.90) * 1000, 3),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3),
+    }
+
+
+def timed(fn, *args, **kwargs):
+    """Run ``fn`` once; returns ``(result, seconds)``."""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def peakMemory(fn, *args, **kwargs):
+    """Run ``fn`` once under tracemalloc; returns ``(result, peak_bytes)``.
+
+    Tracing slows Python down, so timings are taken in separate runs. Only
+    allocations made through Python's allocator are seen; ``maxRss`` covers
+    the rest for the whole benchmark process.
+    """
+    tracemalloc.start()
+    try:
+        result = fn(*args, **kwargs)
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def maxRss():
+    """Peak resident set size, in bytes, of this process or any child it waited for.
+
+    ``ru_maxrss`` is a high-water mark for the process's whole life, so it
+    is reported once per benchmark process rather than per benchmark.
+    """
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
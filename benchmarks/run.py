@@ -0,0 +1,107 @@
+"""Run every benchmark and write one JSON report, optionally compared to a baseline.
+
+Each service is benchmarked in its own process, since both import a
+module called ``app``. Extra arguments after ``--web`` / ``--open-ai`` are
+passed to that service's benchmark:
+
+    python benchmarks/run.py -o head.json --baseline main.json --web --sizes 1000 100000
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SUITES = {"web_app": "bench_web_app.py", "open_ai": "bench_open_ai.py"}
+
+
+def gitCommit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=HERE, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def runSuite(script, args):
+    output = subprocess.check_output([sys.executable, os.path.join(HERE, script), *args], text=True)
+    return json.loads(output)
+
+
+def flatten(results, prefix=""):
+    """``{"a": {"b": 1}}`` -> ``{"a.b": 1}`` for the numeric leaves."""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(baseline, report):
+    """Lines of ``metric: old -> new (+x%)`` for metrics present in both reports."""
+    old, new = flatten(baseline["results"]), flatten(report["results"])
+    lines = []
+    for name in sorted(old.keys() & new.keys()):
+        change = f"{(new[name] - old[name]) / old[name]:+.1%}" if old[name] else "n/a"
+        lines.append(f"{name}: {old[name]} -> {new[name]} ({change})")
+    return lines
+
+
+def splitArgs(argv):
+    """Separate our own arguments from those after ``--web`` and ``--open-ai``."""
+    own, suite_args, current = [], {"web_app": [], "open_ai": []}, None
+    for arg in argv:
+        if arg == "--web":
+            current = suite_args["web_app"]
+        elif arg == "--open-ai":
+            current = suite_args["open_ai"]
+        elif current is None:
+            own.append(arg)
+        else:
+            current.append(arg)
+    return own, suite_args
+
+
+def main(argv=None):
+    own, suite_args = splitArgs(sys.argv[1:] if argv is None else argv)
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-o", "--output", help="file to write the report to (default: stdout)")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    parser.add_argument("--only", choices=sorted(SUITES), action="append", help="run just these suites")
+    args = parser.parse_args(own)
+
+    report = {
+        "commit": gitCommit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "results": {
+            name: runSuite(script, suite_args[name])
+            for name, script in SUITES.items()
+            if not args.only or name in args.only
+        },
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as out:
+            out.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"Compared to {baseline.get('commit')}:", file=sys.stderr)
+        for line in compare(baseline, report):
+            print(f"  {line}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Local stand-ins for the YouTube ``videos`` and OpenAI chat endpoints.
+
+Both answer after a configurable latency, so benchmarks measure our code
+rather than the network. Run them standalone to point a docker compose
+stack at them (``YOUTUBE_API_URL`` and ``OPENAI_BASE_URL``):
+
+    python benchmarks/stubs.py --youtube-port 9001 --openai-port 9002 --latency 0.05
+"""
+
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from synthetic import CATEGORIES, channelFor
+
+HABITS = {
+    "habits": {
+        "summary": "Mostly music and long-form explainers, watched in the evening.",
+        "recommendations": ["Live sessions", "Science documentaries", "Cooking shorts"],
+    }
+}
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+
+    def _send(self, status, body, content_type="application/json"):
+        payload = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubYouTube(_StubHandler):
+    """Answers ``videos.list``; about one video in fifty is treated as deleted."""
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        ids = parse_qs(urlparse(self.path).query).get("id", [""])[0].split(",")
+        items = []
+        for video_id in filter(None, ids):
+            seed = int(hashlib.blake2b(video_id.encode(), digest_size=4).hexdigest(), 16)
+            if seed % 50 == 0:
+                continue
+            items.append({
+                "id": video_id,
+                "contentDetails": {"duration": f"PT{seed % 40}M{seed % 60}S"},
+                "snippet": {
+                    "title": f"Video {video_id}",
+                    "channelTitle": f"Channel {channelFor(video_id)}",
+                    "categoryId": CATEGORIES[seed % len(CATEGORIES)],
+                    "tags": [f"tag{seed % 200}", f"tag{seed % 37}"],
+                },
+            })
+        self._send(200, {"kind": "youtube#videoListResponse", "items": items})
+
+
+class StubOpenAI(_StubHandler):
+    """Answers chat completions with a fixed habits reply, streamed on request."""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        time.sleep(self.latency)
+        content = json.dumps(HABITS)
+        if not body.get("stream"):
+            self._send(200, {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "stub"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for i in range(0, len(content), 16):
+            chunk = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "stub"),
+                "choices": [{"index": 0, "delta": {"content": content[i:i + 16]}, "finish_reason": None}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+
+
+def serve(handler, port=0, latency=0.0):
+    """Start ``handler`` on a background thread; returns ``(server, base_url)``."""
+    handler = type(handler.__name__, (handler,), {"latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the YouTube and OpenAI stubs until interrupted.")
+    parser.add_argument("--youtube-port", type=int, default=9001)
+    parser.add_argument("--openai-port", type=int, default=9002)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds before each response")
+    args = parser.parse_args(argv)
+
+    _, youtube_url = serve(StubYouTube, args.youtube_port, args.latency)
+    _, openai_url = serve(StubOpenAI, args.openai_port, args.latency)
+    print(f"YOUTUBE_API_URL={youtube_url}/youtube/v3/videos")
+    print(f"OPENAI_BASE_URL={openai_url}/v1")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Synthetic Google Takeout ``watch-history.json`` files for benchmarking.
+
+Video IDs follow a Zipf distribution, so a few videos are rewatched many
+times and most are seen once, like a real history. A share of entries are
+ads and removed videos without a ``titleUrl``, and ``=`` in URLs is written
+as ``\\u003d`` the way Takeout escapes it.
+
+    python benchmarks/synthetic.py 100000 watch-history.json
+"""
+
+import argparse
+import bisect
+import hashlib
+import json
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+
+ID_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+CHANNELS = 500
+CATEGORIES = ["1", "2", "10", "15", "17", "20", "22", "23", "24", "25", "26", "27", "28"]
+
+
+def videoId(rank):
+    """Stable 11 character ID for the ``rank``-th most popular video."""
+    digest = hashlib.blake2b(str(rank).encode(), digest_size=11).digest()
+    return "".join(ID_ALPHABET[byte % 64] for byte in digest)
+
+
+def channelFor(video_id):
+    return int(hashlib.blake2b(video_id.encode(), digest_size=4).hexdigest(), 16) % CHANNELS
+
+
+class ZipfSampler:
+    """Draws ranks in ``[0, n)`` with probability proportional to ``1 / (rank + 1) ** s``."""
+
+    def __init__(self, n, s, rng):
+        self.rng = rng
+        total = 0.0
+        self.cumulative = []
+        for rank in range(n):
+            total += 1.0 / (rank + 1) ** s
+            self.cumulative.append(total)
+        self.total = total
+
+    def __call__(self):
+        return bisect.bisect_left(self.cumulative, self.rng.random() * self.total)
+
+
+def iterRecords(count, videos=None, s=1.1, seed=0, ad_rate=0.02, removed_rate=0.03,
+                end=datetime(2025, 4, 1, tzinfo=timezone.utc)):
+    """Yield ``count`` Takeout records, newest first.
+
+    ``videos`` is the size of the catalogue IDs are drawn from; by default a
+    third of ``count``, so the average video is watched about three times.
+    """
+    rng = random.Random(seed)
+    sample = ZipfSampler(videos or max(1, count // 3), s, rng)
+    time = end
+    for _ in range(count):
+        time -= timedelta(seconds=rng.randint(30, 1800))
+        stamp = time.strftime("%Y-%m-%dT%H:%M:%S.") + f"{time.microsecond // 1000:03d}Z"
+        roll = rng.random()
+        if roll < ad_rate:
+            yield {
+                "header": "YouTube",
+                "title": "Watched an ad",
+                "time": stamp,
+                "products": ["YouTube"],
+                "details": [{"name": "From Google Ads"}],
+                "activityControls": ["YouTube watch history"],
+            }
+            continue
+        if roll < ad_rate + removed_rate:
+            yield {
+                "header": "YouTube",
+                "title": "Watched a video that has been removed",
+                "time": stamp,
+                "products": ["YouTube"],
+                "activityControls": ["YouTube watch history"],
+            }
+            continue
+        video_id = videoId(sample())
+        channel = channelFor(video_id)
+        yield {
+            "header": "YouTube",
+            "title": f"Watched Video {video_id} & more",
+            "titleUrl": f"https://www.youtube.com/watch?v={video_id}",
+            "subtitles": [{
+                "name": f"Channel {channel}",
+                "url": f"https://www.youtube.com/channel/UC{videoId(-channel)}",
+            }],
+            "time": stamp,
+            "products": ["YouTube"],
+            "activityControls": ["YouTube watch history"],
+        }
+
+
+def writeTakeout(out, count, **options):
+    """Write ``count`` records to the text stream ``out`` as Takeout formats them."""
+    out.write("[")
+    for i, record in enumerate(iterRecords(count, **options)):
+        if i:
+            out.write(",")
+        # '=' only ever occurs inside strings, so this escape keeps the JSON valid
+        out.write(json.dumps(record, indent=2, ensure_ascii=False).replace("=", "\\u003d"))
+    out.write("]")
+
+
+def takeoutBytes(count, **options):
+    """The whole file as bytes, for benchmarks that upload it."""
+    from io import StringIO
+    out = StringIO()
+    writeTakeout(out, count, **options)
+    return out.getvalue().encode("utf-8")
+
+
+def syntheticMetrics(count, seed=0):
+    """Aggregated metrics shaped like ``WatchMetrics.toDict()`` for ``count`` views."""
+    rng = random.Random(seed)
+    channel_stats = [
+        {"name": f"Channel {i}", "watchtime": rng.randint(60, 36000), "frequency": rng.randint(1, 200)}
+        for i in range(min(CHANNELS, max(1, count // 10)))
+    ]
+    category_stats = [
+        {"name": category, "watchtime": rng.randint(600, 360000), "frequency": rng.randint(1, 2000)}
+        for category in CATEGORIES
+    ]
+    return {
+        "total_videos": count,
+        "total_watchtime": sum(stat["watchtime"] for stat in channel_stats),
+        "hourly_watchtime": [rng.randint(0, count // 24 + 1) for _ in range(24)],
+        "weekday_watchtime": [rng.randint(0, count // 7 + 1) for _ in range(7)],
+        "tag_frequency": [[f"tag{i}", rng.randint(1, 500)] for i in range(200)],
+        "channel_stats": channel_stats,
+        "category_stats": category_stats,
+        "longest_video": {"id": videoId(0), "duration": 3600},
+        "shortest_video": {"id": videoId(1), "duration": 15},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("count", type=int, help="number of records, e.g. 1000 to 1000000")
+    parser.add_argument("output", nargs="?", help="file to write (default: stdout)")
+    parser.add_argument("--videos", type=int, help="distinct videos to draw from")
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of video popularity")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    options = {"videos": args.videos, "s": args.zipf, "seed": args.seed}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as out:
+            writeTakeout(out, args.count, **options)
+    else:
+        writeTakeout(sys.stdout, args.count, **options)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""Content-addressed cache of finished analyses, shared through MongoDB."""
+
+import hashlib
+import json
+from datetime import datetime, timezone
+from ttlcache import TTLCache
+
+
+def analysisKey(**inputs):
+    """SHA-256 of the normalized model inputs; equal inputs give equal keys."""
+    canonical = json.dumps(inputs, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class AnalysisCache(TTLCache):
+    """Analyses keyed by ``analysisKey``, expired by a TTL index.
+
+    Documents look like ``{key, analysis, cached_at}``; ``hits``/``misses``
+    count lookups so the model calls saved can be reported.
+    """
+
+    key_field = "key"
+
+    def get(self, key):
+        """Return the cached analysis for ``key``, or None."""
+        self.ensureIndexes()
+        doc = self.collection.find_one({"key": key}, {"_id": 0, "analysis": 1})
+        self._record(1 if doc else 0, 1)
+        return doc["analysis"] if doc else None
+
+    def put(self, key, analysis):
+        self.ensureIndexes()
+        self.collection.update_one(
+            {"key": key},
+            {"$set": {"analysis": analysis, "cached_at": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
@@ -0,0 +1,76 @@
+"""Deterministic analysis sections computed from the web app's aggregated metrics."""
+
+# YouTube Data API video category ids
+CATEGORY_NAMES = {
+    "1": "Film & Animation",
+    "2": "Autos & Vehicles",
+    "10": "Music",
+    "15": "Pets & Animals",
+    "17": "Sports",
+    "18": "Short Movies",
+    "19": "Travel & Events",
+    "20": "Gaming",
+    "21": "Videoblogging",
+    "22": "People & Blogs",
+    "23": "Comedy",
+    "24": "Entertainment",
+    "25": "News & Politics",
+    "26": "Howto & Style",
+    "27": "Education",
+    "28": "Science & Technology",
+    "29": "Nonprofits & Activism",
+    "30": "Movies",
+    "43": "Shows",
+    "44": "Trailers",
+}
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# hour ranges [start, end) of each part of the day; night wraps past midnight
+TIMES_OF_DAY = {
+    "morning": range(5, 12),
+    "afternoon": range(12, 17),
+    "evening": range(17, 22),
+    "night": [22, 23, 0, 1, 2, 3, 4],
+}
+
+
+def categoryName(category_id):
+    return CATEGORY_NAMES.get(str(category_id), str(category_id))
+
+
+def _minutes(seconds):
+    return round(seconds / 60)
+
+
+def _ranked(stats, key, top_n):
+    # ties keep first-seen order, so results are stable between runs
+    return sorted(stats, key=lambda s: s[key], reverse=True)[:top_n]
+
+
+def buildAnalysis(metrics, top_n=5):
+    """Build the ``categories``, ``channels`` and ``patterns`` result sections.
+
+    ``metrics`` is the ``WatchMetrics.toDict()`` document the web app stores
+    on the request, so the numbers cover the whole history. Watch times are
+    reported in minutes.
+    """
+    categories = _ranked(metrics.get("category_stats", []), "watchtime", top_n)
+    channels = _ranked(metrics.get("channel_stats", []), "frequency", top_n)
+    hourly = metrics.get("hourly_watchtime") or [0] * 24
+    weekday = metrics.get("weekday_watchtime") or [0] * 7
+
+    return {
+        "categories": {
+            "most_watched": [categoryName(c["name"]) for c in categories],
+            "watch_time": {categoryName(c["name"]): _minutes(c["watchtime"]) for c in categories},
+        },
+        "patterns": {
+            "time_of_day": {part: sum(hourly[hour] for hour in hours) for part, hours in TIMES_OF_DAY.items()},
+            "days_of_week": dict(zip(DAYS, weekday)),
+        },
+        "channels": {
+            "most_frequent": [c["name"] for c in channels],
+            "watch_time": {c["name"]: _minutes(c["watchtime"]) for c in channels},
+        },
+    }
@@ -1,63 +1,285 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from pymongo import MongoClient
+from pymongo.errors import CollectionInvalid
 from bson import ObjectId
 from openai import OpenAI, AuthenticationError, RateLimitError, APIError
+from datetime import datetime, timezone
 import os
 from dotenv import load_dotenv
-from config import OPENAI_API_KEY
+from config import (
+    OPENAI_API_KEY,
+    OPENAI_MODEL,
+    OPENAI_TEMPERATURE,
+    OPENAI_STREAM,
+    PROMPT_TOKEN_BUDGET,
+    TITLE_SAMPLE_SIZE,
+    ANALYSIS_WORKERS,
+    ANALYSIS_MAX_ATTEMPTS,
+    ANALYSIS_BACKOFF,
+    ANALYSIS_CACHE_TTL,
+    OPENAI_TIMEOUT,
+    OPENAI_MAX_RETRIES,
+    MONGO_URI,
+    MONGO_MAX_POOL_SIZE,
+    MONGO_TIMEOUT_MS,
+)
+from analytics import buildAnalysis
+from clients import ClientRegistry
+from analysiscache import AnalysisCache, analysisKey
+from digest import buildDigest, tokenCounter
+from streaming import SectionStream
+from schema import HABIT_FIELDS, SCHEMA_VERSION, extractHabits, responseFormat, validateAnalysis
+from tasks import AnalysisQueue, RetryLater
+from telemetry import registry, MongoCommandTimer
+from contextlib import contextmanager
+import time
 
 load_dotenv()
 
 app = Flask(__name__)
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-mongo_client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017"))
-db = mongo_client["youtube_history"]
+# nothing connects until first use, in whichever process uses it
+clients = ClientRegistry()
+clients.register(
+    "mongo",
+    lambda: MongoClient(
+        MONGO_URI,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        connectTimeoutMS=MONGO_TIMEOUT_MS,
+        serverSelectionTimeoutMS=MONGO_TIMEOUT_MS,
+        event_listeners=[MongoCommandTimer()],
+    ),
+    check=lambda mongo: mongo.admin.command("ping"),
+)
+clients.register("openai", lambda: OpenAI(api_key=OPENAI_API_KEY, timeout=OPENAI_TIMEOUT, max_retries=OPENAI_MAX_RETRIES))
+client = clients.lazy("openai")
+db = clients.lazy("mongo", "youtube_history")
+analysisCache = AnalysisCache(db["analysis_cache"], ANALYSIS_CACHE_TTL)
+
+OPENAI_SECONDS = registry.histogram("openai_request_seconds", "Duration of chat completion calls.", ["mode"])
+OPENAI_CALLS = registry.counter("openai_requests_total", "Chat completion calls by outcome.", ["mode", "outcome"])
+OPENAI_TOKENS = registry.counter("openai_tokens_total", "Tokens sent to and generated by the model.", ["direction"])
+ANALYSIS_SECONDS = registry.histogram("analysis_seconds", "Time to analyze one request.", ["status"])
+CACHE_LOOKUPS = registry.counter("analysis_cache_lookups_total", "Analysis cache lookups.", ["result"])
+QUEUE_DEPTH = registry.gauge("analysis_queue_tasks", "Analysis tasks by state.", ["state"])
+
+# set once this process has made sure the capped JobEvents collection exists
+jobEventsReady = False
+
+def ensureJobEvents():
+    global jobEventsReady
+    if not jobEventsReady:
+        try:
+            db.create_collection("JobEvents", capped=True, size=8 * 1024 * 1024)
+        except CollectionInvalid:
+            pass
+        jobEventsReady = True
+
+def publishJobEvent(request_id, status, partial=False):
+    """Tell web-app event streams that a job changed state."""
+    ensureJobEvents()
+    event = {"request_id": request_id, "status": status}
+    if partial:
+        event["partial"] = True
+    db.JobEvents.insert_one(event)
+
+def sampleTitles(request_ids, size):
+    """Titles of a random sample of the watch events stored under ``request_ids``."""
+    pipeline = [
+        {"$match": {"request_id": {"$in": request_ids}}},
+        {"$sample": {"size": size}},
+        {"$lookup": {
+            "from": "video_metadata",
+            "localField": "video_id",
+            "foreignField": "video_id",
+            "as": "video",
+        }},
+        {"$project": {"_id": 0, "title": {"$first": "$video.item.snippet.title"}}},
+    ]
+    return [doc["title"] for doc in db.WatchEvent.aggregate(pipeline) if doc.get("title")]
 
 @app.route("/analyze", methods=["POST"])
 def analyze():
-    """Analyze YouTube watch history using OpenAI and update MongoDB with results."""
+    """Queue an analysis of a request's watch history."""
     try:
         # Get the request ID from the web app
         data = request.get_json()
         if not data or "id" not in data:
             return jsonify({"error": "Missing request ID"}), 400
 
-        request_id = data["id"]
-        
-        # Get the record from MongoDB
-        record = db.Request.find_one({"_id": ObjectId(request_id)})
-        if not record:
+        request_id = ObjectId(data["id"])
+        if not db.Request.find_one({"_id": request_id}, {"_id": 1}):
             return jsonify({"error": "Request not found"}), 404
 
+        # optional, lets one job be followed through both services' logs
+        trace_id = data.get("trace_id") or request.headers.get("X-Trace-Id")
+        analysisQueue.enqueue(request_id, trace_id)
+        return jsonify({"status": "queued", "message": "Analysis queued"}), 202
+
+    except Exception as e:
+        app.logger.error(f"Error in analyze endpoint: {str(e)}")
+        return jsonify({"error": "Internal server error", "details": str(e)}), 500
+
+@app.route("/cache")
+def cache_stats():
+    """Hit rate of the analysis cache since startup."""
+    return jsonify(analysisCache.stats())
+
+@app.route("/health")
+def health():
+    """Whether this process can reach MongoDB; 503 if it can't."""
+    checks = clients.health(["mongo"])
+    return jsonify(checks), 200 if all(check["ok"] for check in checks.values()) else 503
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Counters and histograms in the Prometheus text format."""
+    try:
+        for state, count in analysisQueue.depth().items():
+            QUEUE_DEPTH.set(count, state=state)
+    except Exception as e:
+        app.logger.warning(f"Could not read analysis queue depth: {str(e)}")
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/queue")
+def queue_depth():
+    """How many analyses are waiting and running."""
+    return jsonify(analysisQueue.depth())
+
+def savePartial(request_id, fields):
+    """Store finished sections under ``partial`` so the loading page can show them."""
+    db.Request.update_one(
+        {"_id": ObjectId(request_id)},
+        {"$set": {f"partial.{key}": value for key, value in fields.items()}}
+    )
+    publishJobEvent(ObjectId(request_id), "analyzing", partial=True)
+
+@contextmanager
+def modelCall(mode):
+    """Time one chat completion call and count how it ended."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        OPENAI_SECONDS.observe(time.perf_counter() - started, mode=mode)
+        OPENAI_CALLS.inc(mode=mode, outcome=outcome)
+
+def recordUsage(usage):
+    if usage is not None and isinstance(getattr(usage, "prompt_tokens", None), int):
+        OPENAI_TOKENS.inc(usage.prompt_tokens, direction="in")
+        OPENAI_TOKENS.inc(usage.completion_tokens, direction="out")
+
+def streamCompletion(request_id, messages):
+    """Stream the model's reply, saving each habits field once it is complete."""
+    sections = SectionStream()
+    with modelCall("stream"):
+        stream = client.chat.completions.create(
+            model=OPENAI_MODEL,
+            messages=messages,
+            temperature=OPENAI_TEMPERATURE,
+            response_format=responseFormat(),
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        for chunk in stream:
+            # usage arrives on a final chunk without choices
+            recordUsage(getattr(chunk, "usage", None))
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            for path, value in sections.feed(chunk.choices[0].delta.content):
+                # the reply may or may not wrap its fields in "habits"
+                if path[-1] in HABIT_FIELDS:
+                    savePartial(request_id, {f"habits.{path[-1]}": value})
+    return sections.document or sections.buffer
+
+def completeHabits(messages, content):
+    """Validate the model's habits, re-asking only for the fields that came back broken."""
+    habits, broken = extractHabits(content)
+    if broken:
+        app.logger.warning(f"Repairing habits fields: {', '.join(broken)}")
+        with modelCall("repair"):
+            response = client.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=messages + [
+                    {"role": "assistant", "content": content or ""},
+                    {"role": "user", "content": f"These fields of your reply were missing or invalid: {', '.join(broken)}. Reply with only those fields."}
+                ],
+                temperature=OPENAI_TEMPERATURE,
+                response_format=responseFormat(broken)
+            )
+        recordUsage(getattr(response, "usage", None))
+        repaired, _ = extractHabits(response.choices[0].message.content)
+        habits.update({field: value for field, value in repaired.items() if field in broken})
+        still_broken = [field for field in broken if field not in habits]
+        if still_broken:
+            # fail rather than store (and cache) an empty analysis
+            raise ValueError(f"Habits still invalid after repair: {', '.join(still_broken)}")
+    return {field: habits[field] for field in HABIT_FIELDS}
+
+def completeRequest(request_id, analysis):
+    """Store the finished analysis on the request and announce it."""
+    db.Request.update_one(
+        {"_id": ObjectId(request_id)},
+        {
+            "$set": {"analysis": analysis, "status": "done", "completed_at": datetime.now(timezone.utc)},
+            "$unset": {"partial": ""},
+        }
+    )
+    publishJobEvent(ObjectId(request_id), "done")
+
+def analyzeRequest(request_id):
+    """Analyze YouTube watch history using OpenAI and update MongoDB with results.
+
+    Returns a ``(body, status_code)`` pair describing the outcome.
+    """
+    try:
+        # Get the record from MongoDB, without pulling anything we don't use
+        record = db.Request.find_one({"_id": ObjectId(request_id)}, {"metrics": 1, "event_count": 1, "segments": 1})
+        if not record:
+            return {"error": "Request not found"}, 404
+
         # Prepare the data for analysis
-        watch_history = record.get("raw_data", [])
-        if not watch_history:
-            return jsonify({"error": "No watch history data found"}), 400
+        if not record.get("event_count"):
+            return {"error": "No watch history data found"}, 400
+
+        # Re-uploads of the same history reuse the stored analysis
+        metrics = record.get("metrics") or {}
+        cache_key = analysisKey(
+            model=OPENAI_MODEL,
+            temperature=OPENAI_TEMPERATURE,
+            budget=PROMPT_TOKEN_BUDGET,
+            titles=TITLE_SAMPLE_SIZE,
+            schema=SCHEMA_VERSION,
+            metrics=metrics,
+        )
+        cached = analysisCache.get(cache_key)
+        CACHE_LOOKUPS.inc(result="miss" if cached is None else "hit")
+        app.logger.info(f"Analysis cache: {analysisCache.stats()}")
+        if cached is not None:
+            completeRequest(request_id, cached)
+            return {"status": "success", "message": "Analysis completed", "cached": True}, 200
 
         # Verify OpenAI API key
-        if not client.api_key:
-            return jsonify({"error": "OpenAI API key not configured"}), 500
+        if not OPENAI_API_KEY or not client.api_key:
+            return {"error": "OpenAI API key not configured"}, 500
 
-        # Limit the data size for analysis
-        if len(str(watch_history)) > 4000:  # Rough estimate of token limit
-            watch_history = watch_history[:100]  # Take first 100 entries
+        # Numeric sections are computed exactly from the aggregated metrics
+        sections = buildAnalysis(metrics)
+
+        # The model sees a fixed-size digest of the whole history
+        digest = buildDigest(
+            metrics,
+            # a repeat upload's history is split across the uploads it continued
+            sampleTitles(record.get("segments") or [ObjectId(request_id)], TITLE_SAMPLE_SIZE),
+            PROMPT_TOKEN_BUDGET,
+            tokenCounter(OPENAI_MODEL),
+        )
 
         # Create a prompt for OpenAI
         prompt_json_structure = '''
         {{
-            "categories": {{
-                "most_watched": [],
-                "watch_time": {{}}
-            }},
-            "patterns": {{
-                "time_of_day": {{}},
-                "days_of_week": {{}}
-            }},
-            "channels": {{
-                "most_frequent": [],
-                "watch_time": {{}}
-            }},
             "habits": {{
                 "summary": "",
                 "recommendations": []
@@ -66,55 +288,6 @@ def analyze():
         '''
         prompt_json_example = '''
         {
-            "categories": {
-                "most_watched": [
-                    "Category 1",
-                    "Category 2",
-                    "Category 3",
-                    "Category 4",
-                    "Category 5"
-                ],
-                "watch_time": {
-                    "Category 1": 15,
-                    "Category 2": 8,
-                    "Category 3": 6,
-                    "Category 4": 5,
-                    "Category 5": 4
-                }
-            },
-            "patterns": {
-                "time_of_day": {
-                    "morning": 5,
-                    "afternoon": 12,
-                    "evening": 15,
-                    "night": 8
-                },
-                "days_of_week": {
-                    "Monday": 3,
-                    "Tuesday": 5,
-                    "Wednesday": 7,
-                    "Thursday": 10,
-                    "Friday": 8,
-                    "Saturday": 5,
-                    "Sunday": 6
-                }
-            },
-            "channels": {
-                "most_frequent": [
-                    "Channel 1",
-                    "Channel 2",
-                    "Channel 3",
-                    "Channel 4",
-                    "Channel 5"
-                ],
-                "watch_time": {
-                    "Channel 1": 20,
-                    "Channel 2": 15,
-                    "Channel 3": 12,
-                    "Channel 4": 10,
-                    "Channel 5": 10
-                }
-            },
             "habits": {
                 "summary": "Summary.",
                 "recommendations": [
@@ -125,53 +298,93 @@ def analyze():
             }
         }
         '''
-        prompt = f"""Analyze this YouTube watch history data and provide insights about:
-1. Most watched categories
-2. Watch time patterns
-3. Most frequent channels
-4. General viewing habits
+        prompt = f"""Describe this user's general YouTube viewing habits and recommend what they could watch next.
 
-Data: {watch_history}
+Digest of their whole history (watch times in minutes, views counted per video):
+{digest}
 
-Please provide a detailed analysis in JSON format with the following structure without internal comments or leading quotations, categories and channels should be organized descending by watchtime:
+Please respond in JSON format with the following structure without internal comments or leading quotations:
 {prompt_json_structure}
 
 An example output is included for your reference:
 {prompt_json_example}
 """
 
-        try:
-            # Call OpenAI API
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are a YouTube watch history analyst. Analyze the data and provide insights in the specified JSON format."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.7
-            )
+        messages = [
+            {"role": "system", "content": "You are a YouTube watch history analyst. Analyze the data and provide insights in the specified JSON format."},
+            {"role": "user", "content": prompt}
+        ]
 
-            # Get the analysis from the response
-            analysis = response.choices[0].message.content
+        try:
+            if OPENAI_STREAM:
+                # The local sections are final already; show them while the model writes
+                savePartial(request_id, sections)
+                content = streamCompletion(request_id, messages)
+            else:
+                # Call OpenAI API
+                with modelCall("complete"):
+                    response = client.chat.completions.create(
+                        model=OPENAI_MODEL,
+                        messages=messages,
+                        temperature=OPENAI_TEMPERATURE,
+                        response_format=responseFormat()
+                    )
+                recordUsage(getattr(response, "usage", None))
+                content = response.choices[0].message.content
 
-            # Update the record in MongoDB
-            db.Request.update_one(
-                {"_id": ObjectId(request_id)},
-                {"$set": {"analysis": analysis}}
-            )
+            # Get the analysis from the response, stored as a document rather than text
+            analysis = {**sections, "habits": completeHabits(messages, content)}
+            validateAnalysis(analysis)
+            analysisCache.put(cache_key, analysis)
+            completeRequest(request_id, analysis)
 
-            return jsonify({"status": "success", "message": "Analysis completed"}), 200
+            return {"status": "success", "message": "Analysis completed"}, 200
 
         except AuthenticationError as e:
-            return jsonify({"error": "OpenAI authentication failed", "details": str(e)}), 500
+            return {"error": "OpenAI authentication failed", "details": str(e)}, 500
         except RateLimitError as e:
-            return jsonify({"error": "OpenAI rate limit exceeded", "details": str(e)}), 429
+            return {"error": "OpenAI rate limit exceeded", "details": str(e)}, 429
         except APIError as e:
-            return jsonify({"error": "OpenAI API error", "details": str(e)}), 500
+            return {"error": "OpenAI API error", "details": str(e)}, 500
 
     except Exception as e:
-        app.logger.error(f"Error in analyze endpoint: {str(e)}")
-        return jsonify({"error": "Internal server error", "details": str(e)}), 500
+        app.logger.error(f"Error analyzing request {request_id}: {str(e)}")
+        return {"error": "Internal server error", "details": str(e)}, 500
+
+def runAnalysisTask(task):
+    """Queue handler: rate limits are retried, other errors fail the task."""
+    started = time.perf_counter()
+    body, status = analyzeRequest(str(task["request_id"]))
+    elapsed = time.perf_counter() - started
+    ANALYSIS_SECONDS.observe(elapsed, status=status)
+    app.logger.info(f"[trace {task.get('trace_id')}] analysis {task['request_id']}: {status} in {elapsed:.2f}s")
+    if status == 429:
+        raise RetryLater(body.get("details", body["error"]))
+    if status >= 400:
+        raise RuntimeError(body["error"])
+
+def failAnalysis(task, error):
+    """Mark the request failed once its task gives up."""
+    db.Request.update_one({"_id": task["request_id"]}, {"$set": {"status": "failed", "error": str(error)}})
+    publishJobEvent(task["request_id"], "failed")
+
+analysisQueue = AnalysisQueue(
+    db,
+    runAnalysisTask,
+    on_failure=failAnalysis,
+    workers=ANALYSIS_WORKERS,
+    max_attempts=ANALYSIS_MAX_ATTEMPTS,
+    backoff=ANALYSIS_BACKOFF,
+)
+
+@app.before_request
+def startWorkers():
+    """Analysis workers run in whichever process serves requests, e.g. each gunicorn worker."""
+    analysisQueue.start()
 
 if __name__ == "__main__":
+    # the debug reloader's parent only watches files; its child serves and works
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        clients.warmUp()
+        analysisQueue.start()
     app.run(host="0.0.0.0", port=8000, debug=True)
\ No newline at end of file
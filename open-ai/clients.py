@@ -0,0 +1,128 @@
+"""Network clients created lazily, once per process.
+
+web-app and open-ai each keep an identical copy of this module: every
+service is its own Docker build context, and compose bind-mounts web-app's
+source over the image, so a copy made at build time would be hidden.
+web-app/tests/test_shared_modules.py fails if the two copies differ.
+"""
+
+import os
+import threading
+import time
+
+
+class ClientRegistry:
+    """Builds each registered client the first time the current process asks for it.
+
+    Mongo clients, HTTP pools and their background threads must not cross a
+    ``fork``: the registry forgets everything it built in a forked child, so
+    each worker of a pre-fork server builds its own clients. Importing the
+    app therefore opens no connections; ``warmUp`` does that ahead of the
+    first request, e.g. from a gunicorn ``post_fork`` hook.
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._checks = {}
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._forget)
+
+    def register(self, name, factory, check=None):
+        """Add a client built by ``factory()``; ``check(client)`` raises if it is unhealthy."""
+        self._factories[name] = factory
+        if check is not None:
+            self._checks[name] = check
+
+    def get(self, name):
+        if self._pid != os.getpid():
+            self._forget()
+        client = self._clients.get(name)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(name)
+                if client is None:
+                    client = self._clients[name] = self._factories[name]()
+        return client
+
+    def lazy(self, name, *path):
+        """A stand-in for client ``name`` (or ``client[path[0]][path[1]]...``) that builds it on first use."""
+        return LazyClient(self, name, path)
+
+    def _forget(self):
+        # the parent's clients are left open: they share its sockets
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def health(self, names=None):
+        """Build and check each client; ``{name: {"ok", "seconds"[, "error"]}}``."""
+        results = {}
+        for name in names or self._factories:
+            started = time.perf_counter()
+            try:
+                client = self.get(name)
+                check = self._checks.get(name)
+                if check is not None:
+                    check(client)
+                result = {"ok": True}
+            except Exception as e:
+                result = {"ok": False, "error": f"{e.__class__.__name__}: {e}"}
+            result["seconds"] = round(time.perf_counter() - started, 4)
+            results[name] = result
+        return results
+
+    def warmUp(self, names=None):
+        """Build the clients and open their connections now rather than on the first request."""
+        return self.health(names)
+
+    def close(self):
+        with self._lock:
+            clients, self._clients = self._clients, {}
+        for client in clients.values():
+            close = getattr(client, "close", None)
+            if close is not None:
+                close()
+
+
+class LazyClient:
+    """Forwards attribute access to a registry client, building it on first use.
+
+    Item access stays lazy, so ``db["collection"]`` can be handed to a
+    component at import time without connecting.
+    """
+
+    __slots__ = ("_registry", "_name", "_path")
+
+    def __init__(self, registry, name, path=()):
+        object.__setattr__(self, "_registry", registry)
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_path", tuple(path))
+
+    def resolve(self):
+        target = self._registry.get(self._name)
+        for key in self._path:
+            target = target[key]
+        return target
+
+    def __getitem__(self, key):
+        return LazyClient(self._registry, self._name, self._path + (key,))
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.resolve(), name, value)
+
+    def __delattr__(self, name):
+        delattr(self.resolve(), name)
+
+    def __repr__(self):
+        return f"<lazy {self._name}{''.join(f'[{key!r}]' for key in self._path)}>"
+
+
+def resolve(client):
+    """The real object behind a ``LazyClient``, for APIs that type-check their arguments."""
+    return client.resolve() if isinstance(client, LazyClient) else client
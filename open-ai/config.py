@@ -5,3 +5,29 @@ from pathlib import Path
 load_dotenv(dotenv_path=Path(__file__).resolve().parent.parent / ".env")
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+# connections per process: request threads and analysis workers share them
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "20"))
+# how long to wait for a connection or a usable server before failing
+MONGO_TIMEOUT_MS = int(os.getenv("MONGO_TIMEOUT_MS", "5000"))
+
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+OPENAI_TEMPERATURE = float(os.getenv("OPENAI_TEMPERATURE", "0.7"))
+# seconds before a model call is abandoned, and how often the SDK retries it
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "2"))
+# stream completions and save each section as soon as it has been generated
+OPENAI_STREAM = os.getenv("OPENAI_STREAM", "false").lower() in ("1", "true", "yes")
+# most tokens the history digest may take up in the analysis prompt
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1500"))
+TITLE_SAMPLE_SIZE = int(os.getenv("TITLE_SAMPLE_SIZE", "60"))
+
+# analyses (and so model calls) in flight at once in each serving process
+ANALYSIS_WORKERS = int(os.getenv("ANALYSIS_WORKERS", "2"))
+# rate-limited analyses are retried with jittered backoff up to this many times
+ANALYSIS_MAX_ATTEMPTS = int(os.getenv("ANALYSIS_MAX_ATTEMPTS", "5"))
+ANALYSIS_BACKOFF = float(os.getenv("ANALYSIS_BACKOFF", "2.0"))
+
+# finished analyses are reused for identical histories for this long (7 days)
+ANALYSIS_CACHE_TTL = int(os.getenv("ANALYSIS_CACHE_TTL", str(7 * 24 * 3600)))
@@ -0,0 +1,71 @@
+"""Compact, token-budgeted digest of a watch history for the analysis prompt."""
+
+import json
+from functools import lru_cache
+from analytics import DAYS, categoryName
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - tokenizer is optional
+    tiktoken = None
+
+DEFAULT_ENCODING = "o200k_base"
+
+
+@lru_cache(maxsize=None)
+def tokenCounter(model):
+    """Return a function counting tokens of a string as ``model`` would.
+
+    Falls back to roughly four characters per token when tiktoken or its
+    encoding files are unavailable.
+    """
+    if tiktoken is not None:
+        try:
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoding = tiktoken.get_encoding(DEFAULT_ENCODING)
+            return lambda text: len(encoding.encode(text))
+        except Exception:
+            pass
+    return lambda text: (len(text) + 3) // 4
+
+
+def _top(stats, top_n, name=str):
+    ranked = sorted(stats, key=lambda s: s["watchtime"], reverse=True)[:top_n]
+    return [[name(s["name"]), round(s["watchtime"] / 60), s["frequency"]] for s in ranked]
+
+
+def _render(metrics, titles, top_n):
+    tags = sorted(metrics.get("tag_frequency", []), key=lambda t: t[1], reverse=True)[:top_n]
+    digest = {
+        "total_videos": metrics.get("total_videos", 0),
+        "total_watch_minutes": round(metrics.get("total_watchtime", 0) / 60),
+        # [name, watch minutes, views]
+        "top_channels": _top(metrics.get("channel_stats", []), top_n),
+        "top_categories": _top(metrics.get("category_stats", []), top_n, categoryName),
+        "top_tags": [tag for tag, _ in tags],
+        "views_by_hour": metrics.get("hourly_watchtime") or [0] * 24,
+        "views_by_weekday": dict(zip(DAYS, metrics.get("weekday_watchtime") or [0] * 7)),
+        "sample_titles": titles,
+    }
+    return json.dumps(digest, separators=(",", ":"), ensure_ascii=False)
+
+
+def buildDigest(metrics, titles, budget, count_tokens, top_n=10):
+    """Render ``metrics`` and sampled ``titles`` as JSON within ``budget`` tokens.
+
+    The histograms always fit; titles and then the top-N lists are halved
+    until the digest is small enough, so prompt size stays constant however
+    long the history is.
+    """
+    while True:
+        text = _render(metrics, titles, top_n)
+        if count_tokens(text) <= budget:
+            return text
+        if titles:
+            titles = titles[:len(titles) // 2]
+        elif top_n > 1:
+            top_n //= 2
+        else:
+            return text
@@ -0,0 +1,113 @@
+"""Worker threads that claim queued documents under a lease they keep renewing.
+
+web-app and open-ai each keep an identical copy of this module: every
+service is its own Docker build context, and compose bind-mounts web-app's
+source over the image, so a copy made at build time would be hidden.
+web-app/tests/test_shared_modules.py fails if the two copies differ.
+"""
+
+import logging
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+
+class LeasedWorkers:
+    """Base for queues whose worker threads each run one claimed document at a time.
+
+    A claim sets ``worker`` and ``lease_until`` on the document. While the
+    handler runs, ``heartbeat`` pushes the lease forward every third of
+    ``lease_seconds``, so only a claim whose worker died expires and is
+    taken over. Subclasses name the ``collection`` and its ``index``, and
+    implement ``runOnce(worker_id)``.
+    """
+
+    collection = None
+    index = None
+    thread_name = "worker"
+
+    def __init__(self, db, workers=2, lease_seconds=300, poll_interval=1.0):
+        self.db = db
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._threads = []
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    def _documents(self):
+        return getattr(self.db, self.collection)
+
+    def renew(self, doc_id, worker_id):
+        """Push the lease on ``doc_id`` forward; False once another worker holds it."""
+        result = self._documents().update_one(
+            {"_id": doc_id, "worker": worker_id},
+            {"$set": {"lease_until": datetime.now() + timedelta(seconds=self.lease_seconds)}},
+        )
+        return bool(result.matched_count)
+
+    @contextmanager
+    def heartbeat(self, doc_id, worker_id):
+        """Keep renewing the lease on ``doc_id`` until the block is done."""
+        done = threading.Event()
+
+        def beat():
+            while not done.wait(self.lease_seconds / 3):
+                try:
+                    if not self.renew(doc_id, worker_id):
+                        logger.warning("Worker %s lost the lease on %s", worker_id, doc_id)
+                        return
+                except Exception:
+                    logger.exception("Worker %s could not renew the lease on %s", worker_id, doc_id)
+
+        thread = threading.Thread(target=beat, name=f"{threading.current_thread().name}-lease", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            done.set()
+            thread.join()
+
+    def runOnce(self, worker_id):
+        """Claim and run one document; returns False when nothing was claimed."""
+        raise NotImplementedError
+
+    def _work(self):
+        worker_id = f"{threading.current_thread().name}-{uuid.uuid4().hex[:8]}"
+        indexed = False
+        while not self._stopping.is_set():
+            try:
+                # here rather than in start(), which runs on a request thread
+                if not indexed:
+                    self._documents().create_index(self.index)
+                    indexed = True
+                if not self.runOnce(worker_id):
+                    self._stopping.wait(self.poll_interval)
+            except Exception:
+                # mongo unavailable; back off and keep the worker alive
+                logger.exception("Worker %s could not claim from %s", worker_id, self.collection)
+                self._stopping.wait(self.poll_interval)
+
+    def start(self):
+        """Start the worker threads once per process."""
+        # threads don't survive a fork, so a forked worker process starts its own
+        if any(thread.is_alive() for thread in self._threads):
+            return
+        with self._lock:
+            if any(thread.is_alive() for thread in self._threads):
+                return
+            self._threads = []
+            self._stopping.clear()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"{self.thread_name}-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
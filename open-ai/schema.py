@@ -0,0 +1,70 @@
+"""Schema of the analysis document and validation of the model's part of it."""
+
+import json
+
+# bump when the stored analysis changes shape or validity, so cached analyses are not reused
+SCHEMA_VERSION = 3
+
+SECTIONS = ("categories", "channels", "patterns", "habits")
+HABIT_FIELDS = ("summary", "recommendations")
+
+FIELD_SCHEMAS = {
+    "summary": {"type": "string"},
+    "recommendations": {"type": "array", "items": {"type": "string"}},
+}
+
+
+def responseFormat(fields=HABIT_FIELDS):
+    """Structured-output format for a ``{"habits": {...}}`` reply with just ``fields``."""
+    habits = {
+        "type": "object",
+        "properties": {field: FIELD_SCHEMAS[field] for field in fields},
+        "required": list(fields),
+        "additionalProperties": False,
+    }
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "habits",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {"habits": habits},
+                "required": ["habits"],
+                "additionalProperties": False,
+            },
+        },
+    }
+
+
+def _validField(field, value):
+    if field == "summary":
+        return isinstance(value, str) and bool(value.strip())
+    return isinstance(value, list) and bool(value) and all(isinstance(item, str) and item.strip() for item in value)
+
+
+def extractHabits(content):
+    """Parse the model's reply into ``(valid_fields, broken_field_names)``.
+
+    A reply that is not JSON at all counts as every field being broken.
+    """
+    try:
+        reply = json.loads(content)
+    except (TypeError, ValueError):
+        return {}, list(HABIT_FIELDS)
+    habits = reply.get("habits", reply) if isinstance(reply, dict) else None
+    if not isinstance(habits, dict):
+        return {}, list(HABIT_FIELDS)
+    valid = {field: habits[field] for field in HABIT_FIELDS if _validField(field, habits.get(field))}
+    return valid, [field for field in HABIT_FIELDS if field not in valid]
+
+
+def validateAnalysis(analysis):
+    """Raise ValueError unless ``analysis`` has every section the results page reads."""
+    missing = [section for section in SECTIONS if not isinstance(analysis.get(section), dict)]
+    if missing:
+        raise ValueError(f"Analysis is missing sections: {', '.join(missing)}")
+    habits = analysis["habits"]
+    broken = [field for field in HABIT_FIELDS if not _validField(field, habits.get(field))]
+    if broken:
+        raise ValueError(f"Analysis habits are missing or empty: {', '.join(broken)}")
@@ -0,0 +1,81 @@
+"""Incremental parsing of a JSON reply streamed from the model."""
+
+import json
+
+
+class SectionStream:
+    """Reports members of a streamed JSON object as soon as each one is complete.
+
+    Feed it the reply text in whatever pieces it arrives; ``feed`` returns
+    ``(path, value)`` pairs for members finished by that piece, innermost
+    first, e.g. ``(("habits", "summary"), "...")`` before ``(("habits",), {...})``.
+    Only members of objects nested at most ``max_depth`` deep are reported;
+    text outside the top-level object (such as a code fence) is ignored, and
+    ``document`` holds just the object's text once it has been closed.
+    """
+
+    def __init__(self, max_depth=2):
+        self.max_depth = max_depth
+        self.buffer = ""
+        self.document = None
+        self._pos = 0
+        self._start = None
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+
+    def feed(self, text):
+        self.buffer += text
+        completed = []
+        buffer = self.buffer
+        for i in range(self._pos, len(buffer)):
+            char = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    top = self._stack[-1] if self._stack else None
+                    if top and top["type"] == "{" and top["expect_key"]:
+                        top["key"] = json.loads(buffer[self._string_start:i + 1])
+                continue
+            if not self._stack and char != "{":
+                continue
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+            elif char in "{[":
+                if not self._stack:
+                    self._start = i
+                self._stack.append({"type": char, "key": None, "start": None, "expect_key": char == "{"})
+            elif char == ":":
+                top = self._stack[-1]
+                if top["type"] == "{":
+                    top["start"] = i + 1
+                    top["expect_key"] = False
+            elif char == ",":
+                self._complete(i, completed)
+                top = self._stack[-1]
+                if top["type"] == "{":
+                    top["key"] = top["start"] = None
+                    top["expect_key"] = True
+            elif char in "}]":
+                self._complete(i, completed)
+                self._stack.pop()
+                if not self._stack:
+                    self.document = buffer[self._start:i + 1]
+        self._pos = len(buffer)
+        return completed
+
+    def _complete(self, end, completed):
+        """Record the member of the innermost object that ends at ``end``."""
+        top = self._stack[-1]
+        if top["type"] != "{" or top["start"] is None or len(self._stack) > self.max_depth:
+            return
+        if any(entry["type"] != "{" for entry in self._stack):
+            return
+        path = tuple(entry["key"] for entry in self._stack)
+        completed.append((path, json.loads(self.buffer[top["start"]:end])))
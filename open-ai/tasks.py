@@ -0,0 +1,120 @@
+"""Durable queue of analysis tasks consumed by a bounded pool of worker threads."""
+
+import logging
+import random
+from datetime import datetime, timedelta
+from pymongo import ASCENDING, ReturnDocument
+from leases import LeasedWorkers
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+logger = logging.getLogger(__name__)
+
+
+class RetryLater(Exception):
+    """Raised by a handler when the task should be retried after a backoff."""
+
+
+class AnalysisQueue(LeasedWorkers):
+    """``AnalysisTask`` documents claimed atomically with ``find_one_and_update``.
+
+    The web app inserts ``{request_id, status: "pending"}``; each of the
+    ``workers`` threads runs one task at a time, which caps in-flight model
+    calls. A handler raising ``RetryLater`` is re-queued with jittered
+    exponential backoff until ``max_attempts``; any other error fails it.
+    The claim's lease is renewed while the handler runs, however long the
+    model takes, so only a task whose worker died is claimed again.
+    """
+
+    collection = "AnalysisTask"
+    index = [("status", ASCENDING), ("created_at", ASCENDING)]
+    thread_name = "analysis-worker"
+
+    def __init__(self, db, handler, on_failure=None, workers=2, max_attempts=5,
+                 backoff=2.0, max_backoff=60.0, lease_seconds=300, poll_interval=1.0):
+        super().__init__(db, workers=workers, lease_seconds=lease_seconds, poll_interval=poll_interval)
+        self.handler = handler
+        self.on_failure = on_failure
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def enqueue(self, request_id, trace_id=None):
+        now = datetime.now()
+        self.db.AnalysisTask.insert_one({
+            "request_id": request_id,
+            "trace_id": trace_id,
+            "status": PENDING,
+            "attempts": 0,
+            "created_at": now,
+            "not_before": now,
+        })
+
+    def claim(self, worker_id):
+        """Take the oldest task that is due (or whose worker went away), or None."""
+        now = datetime.now()
+        return self.db.AnalysisTask.find_one_and_update(
+            {"$or": [
+                {"status": PENDING, "not_before": {"$lte": now}},
+                {"status": RUNNING, "lease_until": {"$lt": now}},
+            ]},
+            {
+                "$set": {
+                    "status": RUNNING,
+                    "worker": worker_id,
+                    "lease_until": now + timedelta(seconds=self.lease_seconds),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("created_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def retryDelay(self, attempts):
+        """Full-jitter exponential backoff, in seconds."""
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempts - 1)))
+
+    def _finish(self, task, status, **fields):
+        fields["status"] = status
+        self.db.AnalysisTask.update_one({"_id": task["_id"]}, {"$set": fields})
+
+    def runOnce(self, worker_id):
+        """Claim and run a single task; returns False when nothing is due."""
+        task = self.claim(worker_id)
+        if task is None:
+            return False
+        if task["attempts"] > self.max_attempts:
+            # its workers keep dying on it; don't let it take down the next one
+            self._fail(task, f"abandoned after {self.max_attempts} attempts")
+            return True
+        try:
+            with self.heartbeat(task["_id"], worker_id):
+                self.handler(task)
+        except RetryLater as e:
+            if task["attempts"] < self.max_attempts:
+                delay = self.retryDelay(task["attempts"])
+                logger.warning("Retrying analysis %s in %.1fs: %s", task["request_id"], delay, e)
+                self._finish(task, PENDING, not_before=datetime.now() + timedelta(seconds=delay), error=str(e))
+            else:
+                self._fail(task, e)
+        except Exception as e:
+            logger.exception("Analysis %s failed", task["request_id"])
+            self._fail(task, e)
+        else:
+            self._finish(task, DONE)
+        return True
+
+    def _fail(self, task, error):
+        self._finish(task, FAILED, error=str(error))
+        if self.on_failure:
+            self.on_failure(task, error)
+
+    def depth(self):
+        """Number of tasks waiting and in progress."""
+        return {
+            PENDING: self.db.AnalysisTask.count_documents({"status": PENDING}),
+            RUNNING: self.db.AnalysisTask.count_documents({"status": RUNNING}),
+        }
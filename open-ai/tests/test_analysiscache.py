@@ -0,0 +1,38 @@
+"""Testing open-ai/analysiscache.py file."""
+
+from unittest.mock import MagicMock
+from analysiscache import AnalysisCache, analysisKey
+
+
+def test_key_ignores_ordering_and_tracks_inputs():
+    a = analysisKey(model="m", temperature=0.7, metrics={"a": 1, "b": [1, 2]})
+    b = analysisKey(metrics={"b": [1, 2], "a": 1}, temperature=0.7, model="m")
+    assert a == b
+    assert a != analysisKey(model="other", temperature=0.7, metrics={"a": 1, "b": [1, 2]})
+    assert a != analysisKey(model="m", temperature=0.7, metrics={"a": 2, "b": [1, 2]})
+
+
+def test_get_counts_hits_and_misses():
+    collection = MagicMock()
+    cache = AnalysisCache(collection, ttl_seconds=60)
+
+    collection.find_one.return_value = None
+    assert cache.get("k") is None
+    collection.find_one.return_value = {"analysis": "{}"}
+    assert cache.get("k") == "{}"
+
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5}
+
+
+def test_put_upserts_and_creates_ttl_index_once():
+    collection = MagicMock()
+    cache = AnalysisCache(collection, ttl_seconds=60)
+    cache.put("k", "{}")
+    cache.put("k", "{}")
+
+    assert collection.create_index.call_count == 2
+    assert collection.create_index.call_args.kwargs == {"expireAfterSeconds": 60}
+    query, update = collection.update_one.call_args.args
+    assert query == {"key": "k"}
+    assert update["$set"]["analysis"] == "{}"
+    assert collection.update_one.call_args.kwargs == {"upsert": True}
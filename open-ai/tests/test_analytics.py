@@ -0,0 +1,41 @@
+"""Testing open-ai/analytics.py file."""
+
+from analytics import buildAnalysis, categoryName
+
+METRICS = {
+    "hourly_watchtime": [1] * 5 + [2] * 7 + [3] * 5 + [4] * 5 + [5] * 2,
+    "weekday_watchtime": [1, 2, 3, 4, 5, 6, 7],
+    "channel_stats": [
+        {"name": "Rare", "watchtime": 6000, "frequency": 1},
+        {"name": "Often", "watchtime": 600, "frequency": 9},
+    ],
+    "category_stats": [
+        {"name": "20", "watchtime": 1200, "frequency": 5},
+        {"name": "27", "watchtime": 3000, "frequency": 2},
+        {"name": "UnknownCategory", "watchtime": 60, "frequency": 1},
+    ],
+}
+
+
+def test_category_names():
+    assert categoryName("28") == "Science & Technology"
+    assert categoryName(10) == "Music"
+    assert categoryName("UnknownCategory") == "UnknownCategory"
+
+
+def test_build_analysis_sections():
+    analysis = buildAnalysis(METRICS)
+
+    assert analysis["categories"]["most_watched"] == ["Education", "Gaming", "UnknownCategory"]
+    assert analysis["categories"]["watch_time"] == {"Education": 50, "Gaming": 20, "UnknownCategory": 1}
+    assert analysis["channels"]["most_frequent"] == ["Often", "Rare"]
+    assert analysis["channels"]["watch_time"] == {"Often": 10, "Rare": 100}
+    assert analysis["patterns"]["time_of_day"] == {"morning": 14, "afternoon": 15, "evening": 20, "night": 15}
+    assert analysis["patterns"]["days_of_week"]["Sunday"] == 7
+
+
+def test_build_analysis_top_n_and_empty():
+    assert len(buildAnalysis(METRICS, top_n=1)["channels"]["most_frequent"]) == 1
+    empty = buildAnalysis({})
+    assert empty["categories"]["most_watched"] == []
+    assert sum(empty["patterns"]["time_of_day"].values()) == 0
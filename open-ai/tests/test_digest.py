@@ -0,0 +1,45 @@
+"""Testing open-ai/digest.py file."""
+
+import json
+from digest import buildDigest, tokenCounter
+
+METRICS = {
+    "total_videos": 500,
+    "total_watchtime": 60000,
+    "hourly_watchtime": list(range(24)),
+    "weekday_watchtime": [1, 2, 3, 4, 5, 6, 7],
+    "tag_frequency": [["rare", 1], ["common", 40]],
+    "channel_stats": [{"name": f"Channel {i}", "watchtime": i * 60, "frequency": i} for i in range(40)],
+    "category_stats": [{"name": "20", "watchtime": 600, "frequency": 3}],
+}
+
+
+def count_chars(text):
+    return len(text)
+
+
+def test_digest_contents():
+    digest = json.loads(buildDigest(METRICS, ["A"], 10_000, count_chars, top_n=3))
+    assert digest["top_channels"][0] == ["Channel 39", 39, 39]
+    assert digest["top_categories"] == [["Gaming", 10, 3]]
+    assert digest["top_tags"] == ["common", "rare"]
+    assert digest["views_by_weekday"]["Sunday"] == 7
+    assert digest["sample_titles"] == ["A"]
+
+
+def test_digest_fits_budget_whatever_the_history_size():
+    titles = [f"A fairly long video title number {i}" for i in range(5000)]
+    small = buildDigest(METRICS, titles[:10], 1200, count_chars)
+    large = buildDigest(METRICS, titles, 1200, count_chars)
+    assert len(small) <= 1200
+    assert len(large) <= 1200
+
+
+def test_token_counter_falls_back_without_encoding(monkeypatch):
+    import digest
+    monkeypatch.setattr(digest, "tiktoken", None)
+    tokenCounter.cache_clear()
+    try:
+        assert tokenCounter("gpt-4o-mini")("abcdefgh") == 2
+    finally:
+        tokenCounter.cache_clear()
@@ -3,13 +3,23 @@
 import json
 import pytest
 from unittest.mock import patch, MagicMock
-from app import app
+from bson import ObjectId
+from app import app, analyzeRequest, publishJobEvent, runAnalysisTask, sampleTitles, OPENAI_TOKENS
+from tasks import RetryLater
+
+
+@pytest.fixture(autouse=True)
+def analysis_cache():
+    with patch("app.analysisCache") as cache:
+        cache.get.return_value = None
+        cache.stats.return_value = {"hits": 0, "misses": 0, "hit_rate": 0.0}
+        yield cache
 
 
 @pytest.fixture
 def client():
     app.config["TESTING"] = True
-    with app.test_client() as client:
+    with patch("app.analysisQueue.start"), app.test_client() as client:
         yield client
 
 
@@ -33,88 +43,291 @@ def test_analyze_record_not_found(mock_db, client):
     assert b"Request not found" in response.data
 
 
+@patch("app.analysisQueue")
 @patch("app.db")
-def test_analyze_no_data(mock_db, client):
+def test_analyze_queues_request(mock_db, mock_queue, client):
     """
-    Testing that a record without any data returns error code.
+    Testing that a known request is queued rather than analyzed inline.
     """
-    mock_db.Request.find_one.return_value = {"raw_data": []}
+    mock_db.Request.find_one.return_value = {"_id": ObjectId("012345678901234567890123")}
     response = client.post("/analyze", json={"id": "012345678901234567890123"})
-    assert response.status_code == 400
-    assert b"No watch history data found" in response.data
+    assert response.status_code == 202
+    mock_queue.enqueue.assert_called_once_with(ObjectId("012345678901234567890123"), None)
+
+    client.post("/analyze", json={"id": "012345678901234567890123"}, headers={"X-Trace-Id": "trace-1"})
+    assert mock_queue.enqueue.call_args.args[1] == "trace-1"
+
+
+@patch("app.analysisQueue")
+def test_queue_depth(mock_queue, client):
+    mock_queue.depth.return_value = {"pending": 3, "running": 2}
+    response = client.get("/queue")
+    assert response.get_json() == {"pending": 3, "running": 2}
+
+
+@patch("app.analysisQueue")
+def test_metrics_endpoint(mock_queue, client):
+    mock_queue.depth.return_value = {"pending": 3, "running": 1}
+    text = client.get("/metrics").get_data(as_text=True)
+    assert 'analysis_queue_tasks{state="pending"} 3' in text
+    assert "# TYPE openai_tokens_total counter" in text
+
+
+@patch("app.clients")
+def test_health_endpoint(mock_clients, client):
+    mock_clients.health.return_value = {"mongo": {"ok": True, "seconds": 0.01}}
+    assert client.get("/health").status_code == 200
+    mock_clients.health.return_value = {"mongo": {"ok": False, "seconds": 5.0, "error": "ServerSelectionTimeoutError"}}
+    assert client.get("/health").status_code == 503
+
+
+@patch("app.analysisQueue")
+def test_first_request_starts_workers(mock_queue, client):
+    """Workers start in the serving process, not only when run as a script."""
+    mock_queue.depth.return_value = {}
+    client.get("/metrics")
+    mock_queue.start.assert_called_with()
 
 
 @patch("app.client")
 @patch("app.db")
-def test_analyze_no_api_key(mock_db, mock_client, client):
+def test_analyze_counts_tokens(mock_db, mock_client):
+    mock_db.Request.find_one.return_value = {"event_count": 1}
+    mock_client.api_key = "fake-key"
+    mock_response = MagicMock()
+    mock_response.choices = [MagicMock(message=MagicMock(content='{"habits": {"summary": "s", "recommendations": ["r"]}}'))]
+    mock_response.usage = MagicMock(prompt_tokens=120, completion_tokens=30)
+    mock_client.chat.completions.create.return_value = mock_response
+    before_in, before_out = OPENAI_TOKENS.value(direction="in"), OPENAI_TOKENS.value(direction="out")
+
+    analyzeRequest("012345678901234567890123")
+    assert OPENAI_TOKENS.value(direction="in") - before_in == 120
+    assert OPENAI_TOKENS.value(direction="out") - before_out == 30
+
+
+@patch("app.analyzeRequest")
+def test_analysis_task_retries_rate_limits(mock_analyze):
+    """
+    Testing that rate limits are retried and other errors fail the task.
+    """
+    task = {"request_id": ObjectId("012345678901234567890123")}
+    mock_analyze.return_value = ({"error": "OpenAI rate limit exceeded", "details": "slow down"}, 429)
+    with pytest.raises(RetryLater):
+        runAnalysisTask(task)
+
+    mock_analyze.return_value = ({"error": "No watch history data found"}, 400)
+    with pytest.raises(RuntimeError):
+        runAnalysisTask(task)
+
+    mock_analyze.return_value = ({"status": "success"}, 200)
+    runAnalysisTask(task)
+
+
+@patch("app.db")
+def test_analyze_no_data(mock_db):
+    """
+    Testing that a record without any data returns error code.
+    """
+    mock_db.Request.find_one.return_value = {"event_count": 0}
+    body, status = analyzeRequest("012345678901234567890123")
+    assert status == 400
+    assert body["error"] == "No watch history data found"
+
+
+@patch("app.client")
+@patch("app.db")
+def test_analyze_no_api_key(mock_db, mock_client):
     """
     Testing that a missing API key returns error code.
     """
-    mock_db.Request.find_one.return_value = {"raw_data": ["sample data"]}
+    mock_db.Request.find_one.return_value = {"event_count": 1}
     mock_client.api_key = None
-    response = client.post("/analyze", json={"id": "012345678901234567890123"})
-    assert response.status_code == 500
-    assert b"OpenAI API key not configured" in response.data
+    body, status = analyzeRequest("012345678901234567890123")
+    assert status == 500
+    assert body["error"] == "OpenAI API key not configured"
 
 
 @patch("app.client")
 @patch("app.db")
-def test_analyze_success(mock_db, mock_client, client):
+def test_analyze_success(mock_db, mock_client):
     """
     Testing that a valid request is accepted.
     """
-    mock_db.Request.find_one.return_value = {"raw_data": ["sample data"]}
+    mock_db.Request.find_one.return_value = {"event_count": 1}
     mock_client.api_key = "fake-key"
 
     mock_response = MagicMock()
-    mock_response.choices = [MagicMock(message=MagicMock(content='{"fake": "result"}'))]
+    mock_response.choices = [MagicMock(message=MagicMock(content='{"habits": {"summary": "s", "recommendations": ["r"]}}'))]
     mock_client.chat.completions.create.return_value = mock_response
 
-    response = client.post("/analyze", json={"id": "012345678901234567890123"})
-    assert response.status_code == 200
-    assert b"success" in response.data
+    body, status = analyzeRequest("012345678901234567890123")
+    assert status == 200
+    assert body["status"] == "success"
 
 
 @patch("app.client")
 @patch("app.db")
-def test_analyze_openai_auth_error(mock_db, mock_client, client):
+def test_analyze_openai_auth_error(mock_db, mock_client):
     """
     Testing that authentication errors are handled.
     """
-    mock_db.Request.find_one.return_value = {"raw_data": ["sample data"]}
+    mock_db.Request.find_one.return_value = {"event_count": 1}
     mock_client.api_key = "fake-key"
     mock_client.chat.completions.create.side_effect = Exception("Authentication error")
 
-    response = client.post("/analyze", json={"id": "012345678901234567890123"})
-    assert response.status_code == 500
-    assert b"Internal server error" in response.data
+    body, status = analyzeRequest("012345678901234567890123")
+    assert status == 500
+    assert body["error"] == "Internal server error"
 
 
 @patch("app.client")
 @patch("app.db")
-def test_analyze_openai_rate_limit_error(mock_db, mock_client, client):
+def test_analyze_openai_rate_limit_error(mock_db, mock_client):
     """
     Testing that issue with OpenAI rate limit returns error code.
     """
-    mock_db.Request.find_one.return_value = {"raw_data": ["sample data"]}
+    mock_db.Request.find_one.return_value = {"event_count": 1}
     mock_client.api_key = "fake-key"
     mock_client.chat.completions.create.side_effect = Exception("Rate limit exceeded")
 
-    response = client.post("/analyze", json={"id": "012345678901234567890123"})
-    assert response.status_code == 500
-    assert b"Internal server error" in response.data
+    body, status = analyzeRequest("012345678901234567890123")
+    assert status == 500
+    assert body["error"] == "Internal server error"
 
 
 @patch("app.client")
 @patch("app.db")
-def test_analyze_openai_api_error(mock_db, mock_client, client):
+def test_analyze_openai_api_error(mock_db, mock_client):
     """
     Testing that miscellaneous OpenAI API error returns an error code.
     """
-    mock_db.Request.find_one.return_value = {"raw_data": ["sample data"]}
+    mock_db.Request.find_one.return_value = {"event_count": 1}
     mock_client.api_key = "fake-key"
     mock_client.chat.completions.create.side_effect = Exception("API Error")
 
-    response = client.post("/analyze", json={"id": "012345678901234567890123"})
-    assert response.status_code == 500
-    assert b"Internal server error" in response.data
+    body, status = analyzeRequest("012345678901234567890123")
+    assert status == 500
+    assert body["error"] == "Internal server error"
+
+
+@patch("app.client")
+@patch("app.db")
+def test_analyze_combines_local_sections_with_habits(mock_db, mock_client):
+    """
+    Testing that numeric sections come from the stored metrics, not the model.
+    """
+    mock_db.Request.find_one.return_value = {
+        "event_count": 3,
+        "metrics": {"channel_stats": [{"name": "Channel", "watchtime": 120, "frequency": 3}]},
+    }
+    mock_client.api_key = "fake-key"
+    mock_response = MagicMock()
+    mock_response.choices = [MagicMock(message=MagicMock(content='{"habits": {"summary": "Likes Channel.", "recommendations": ["More"]}}'))]
+    mock_client.chat.completions.create.return_value = mock_response
+
+    body, status = analyzeRequest("012345678901234567890123")
+    assert status == 200
+    stored = mock_db.Request.update_one.call_args.args[1]["$set"]["analysis"]
+    assert stored["channels"]["watch_time"] == {"Channel": 2}
+    assert stored["habits"] == {"summary": "Likes Channel.", "recommendations": ["More"]}
+
+
+@patch("app.client")
+@patch("app.db")
+def test_analyze_reuses_cached_analysis(mock_db, mock_client, analysis_cache):
+    """
+    Testing that an identical history is answered from the cache without the model.
+    """
+    mock_db.Request.find_one.return_value = {"event_count": 3, "metrics": {"total_videos": 3}}
+    analysis_cache.get.return_value = {"habits": {}}
+
+    body, status = analyzeRequest("012345678901234567890123")
+    assert status == 200
+    assert body["cached"] is True
+    mock_client.chat.completions.create.assert_not_called()
+    assert mock_db.Request.update_one.call_args.args[1]["$set"]["analysis"] == {"habits": {}}
+
+
+@patch("app.client")
+@patch("app.db")
+def test_analyze_stores_new_analysis_in_cache(mock_db, mock_client, analysis_cache):
+    mock_db.Request.find_one.return_value = {"event_count": 1}
+    mock_client.api_key = "fake-key"
+    mock_response = MagicMock()
+    mock_response.choices = [MagicMock(message=MagicMock(content='{"habits": {"summary": "s", "recommendations": ["r"]}}'))]
+    mock_client.chat.completions.create.return_value = mock_response
+
+    analyzeRequest("012345678901234567890123")
+    key, analysis = analysis_cache.put.call_args.args
+    assert key == analysis_cache.get.call_args.args[0]
+    assert analysis["habits"]["summary"] == "s"
+
+
+@patch("app.client")
+@patch("app.db")
+def test_analyze_repairs_only_broken_fields(mock_db, mock_client):
+    """
+    Testing that an invalid field is asked for again on its own, not the whole analysis.
+    """
+    mock_db.Request.find_one.return_value = {"event_count": 1}
+    mock_client.api_key = "fake-key"
+    first = MagicMock()
+    first.choices = [MagicMock(message=MagicMock(content='{"habits": {"summary": "Likes music.", "recommendations": []}}'))]
+    repair = MagicMock()
+    repair.choices = [MagicMock(message=MagicMock(content='{"habits": {"recommendations": ["Jazz"]}}'))]
+    mock_client.chat.completions.create.side_effect = [first, repair]
+
+    body, status = analyzeRequest("012345678901234567890123")
+    assert status == 200
+    repair_call = mock_client.chat.completions.create.call_args_list[1].kwargs
+    habits_schema = repair_call["response_format"]["json_schema"]["schema"]["properties"]["habits"]
+    assert habits_schema["required"] == ["recommendations"]
+    stored = mock_db.Request.update_one.call_args.args[1]["$set"]["analysis"]
+    assert stored["habits"] == {"summary": "Likes music.", "recommendations": ["Jazz"]}
+
+
+@patch("app.client")
+@patch("app.db")
+def test_analyze_fails_when_repair_is_still_broken(mock_db, mock_client, analysis_cache):
+    """
+    Testing that an analysis still broken after its repair is neither stored nor cached.
+    """
+    mock_db.Request.find_one.return_value = {"event_count": 1}
+    mock_client.api_key = "fake-key"
+    first = MagicMock()
+    first.choices = [MagicMock(message=MagicMock(content='{"habits": {"summary": "Likes music.", "recommendations": []}}'))]
+    repair = MagicMock()
+    repair.choices = [MagicMock(message=MagicMock(content='{"habits": {"recommendations": []}}'))]
+    mock_client.chat.completions.create.side_effect = [first, repair]
+
+    body, status = analyzeRequest("012345678901234567890123")
+    assert status == 500
+    assert "recommendations" in body["details"]
+    analysis_cache.put.assert_not_called()
+    mock_db.Request.update_one.assert_not_called()
+
+
+@patch("app.jobEventsReady", False)
+@patch("app.db")
+def test_publish_job_event_creates_collection_once(mock_db):
+    request_id = ObjectId()
+    publishJobEvent(request_id, "analyzing", partial=True)
+    publishJobEvent(request_id, "done")
+
+    mock_db.create_collection.assert_called_once()
+    assert mock_db.JobEvents.insert_one.call_args_list[0].args[0] == {"request_id": request_id, "status": "analyzing", "partial": True}
+    assert mock_db.JobEvents.insert_one.call_args_list[1].args[0] == {"request_id": request_id, "status": "done"}
+
+
+@patch("app.db")
+def test_sample_titles_joins_video_metadata(mock_db):
+    """
+    Testing that sampled titles come from the event and metadata collections.
+    """
+    mock_db.WatchEvent.aggregate.return_value = [{"title": "A"}, {}, {"title": "B"}]
+    request_id = ObjectId("012345678901234567890123")
+
+    assert sampleTitles([request_id], 2) == ["A", "B"]
+    pipeline = mock_db.WatchEvent.aggregate.call_args.args[0]
+    assert pipeline[0] == {"$match": {"request_id": {"$in": [request_id]}}}
+    assert pipeline[1] == {"$sample": {"size": 2}}
@@ -0,0 +1,39 @@
+"""Testing open-ai/schema.py file."""
+
+import pytest
+from schema import extractHabits, responseFormat, validateAnalysis
+
+
+def test_extract_habits_keeps_valid_fields():
+    assert extractHabits('{"habits": {"summary": "s", "recommendations": ["r"]}}') == (
+        {"summary": "s", "recommendations": ["r"]}, [])
+    # fields may come without the "habits" wrapper
+    assert extractHabits('{"summary": "s", "recommendations": "r"}') == ({"summary": "s"}, ["recommendations"])
+    assert extractHabits('{"habits": {"summary": " ", "recommendations": ["r", 3]}}') == (
+        {}, ["summary", "recommendations"])
+
+
+def test_extract_habits_rejects_non_json():
+    assert extractHabits("plain text") == ({}, ["summary", "recommendations"])
+    assert extractHabits('["a"]') == ({}, ["summary", "recommendations"])
+    assert extractHabits(None) == ({}, ["summary", "recommendations"])
+
+
+def test_response_format_requires_only_requested_fields():
+    schema = responseFormat(["summary"])["json_schema"]["schema"]
+    assert schema["required"] == ["habits"]
+    assert schema["properties"]["habits"]["required"] == ["summary"]
+    assert list(schema["properties"]["habits"]["properties"]) == ["summary"]
+
+
+def test_validate_analysis():
+    analysis = {"categories": {}, "channels": {}, "patterns": {}, "habits": {"summary": "s", "recommendations": ["r"]}}
+    validateAnalysis(analysis)
+    with pytest.raises(ValueError):
+        validateAnalysis({**analysis, "patterns": None})
+    with pytest.raises(ValueError):
+        validateAnalysis({**analysis, "habits": {"summary": 1, "recommendations": []}})
+    with pytest.raises(ValueError):
+        validateAnalysis({**analysis, "habits": {"summary": " ", "recommendations": ["r"]}})
+    with pytest.raises(ValueError):
+        validateAnalysis({**analysis, "habits": {"summary": "s", "recommendations": []}})
@@ -0,0 +1,98 @@
+"""Testing open-ai/streaming.py and the streaming analysis path against a fake OpenAI server."""
+
+import json
+import threading
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from openai import OpenAI
+from streaming import SectionStream
+import app as analyzer
+
+REPLY = '```json\n{"habits": {"summary": "Mostly \\"music\\" {live}.", "recommendations": ["Jazz", "Talks"]}}\n```'
+
+
+class FakeOpenAI(BaseHTTPRequestHandler):
+    """Streams ``REPLY`` in small chat.completion.chunk events."""
+
+    requests = []
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        type(self).requests.append(body)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.end_headers()
+        for i in range(0, len(REPLY), 7):
+            chunk = {
+                "id": "chatcmpl-1",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": body["model"],
+                "choices": [{"index": 0, "delta": {"content": REPLY[i:i + 7]}, "finish_reason": None}],
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_client():
+    FakeOpenAI.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOpenAI)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield OpenAI(api_key="fake-key", base_url=f"http://127.0.0.1:{server.server_port}/v1", max_retries=0)
+    server.shutdown()
+    server.server_close()
+
+
+def test_section_stream_reports_members_as_they_finish():
+    stream = SectionStream()
+    completed = []
+    for i in range(0, len(REPLY), 3):
+        completed += stream.feed(REPLY[i:i + 3])
+
+    assert completed == [
+        (("habits", "summary"), 'Mostly "music" {live}.'),
+        (("habits", "recommendations"), ["Jazz", "Talks"]),
+        (("habits",), {"summary": 'Mostly "music" {live}.', "recommendations": ["Jazz", "Talks"]}),
+    ]
+    assert stream.buffer == REPLY
+    assert json.loads(stream.document)["habits"]["recommendations"] == ["Jazz", "Talks"]
+
+
+def test_section_stream_waits_for_unfinished_values():
+    stream = SectionStream()
+    assert stream.feed('{"summary": "half') == []
+    assert stream.feed(' done", "rec') == [(("summary",), "half done")]
+
+
+@patch("app.OPENAI_STREAM", True)
+@patch("app.publishJobEvent")
+@patch("app.analysisCache")
+@patch("app.db")
+def test_analyze_streams_partial_sections(mock_db, mock_cache, mock_publish, fake_client):
+    mock_db.Request.find_one.return_value = {
+        "event_count": 3,
+        "metrics": {"channel_stats": [{"name": "Channel", "watchtime": 120, "frequency": 3}]},
+    }
+    mock_db.WatchEvent.aggregate.return_value = []
+    mock_cache.get.return_value = None
+
+    with patch("app.client", fake_client):
+        body, status = analyzer.analyzeRequest("012345678901234567890123")
+
+    assert status == 200
+    assert FakeOpenAI.requests[0]["stream"] is True
+    updates = [call.args[1] for call in mock_db.Request.update_one.call_args_list]
+    # local sections first, then each habits field as it finished, then the full analysis
+    assert "partial.channels" in updates[0]["$set"]
+    assert updates[1] == {"$set": {"partial.habits.summary": 'Mostly "music" {live}.'}}
+    assert updates[2] == {"$set": {"partial.habits.recommendations": ["Jazz", "Talks"]}}
+    final = updates[-1]
+    assert final["$set"]["analysis"]["habits"]["recommendations"] == ["Jazz", "Talks"]
+    assert final["$unset"] == {"partial": ""}
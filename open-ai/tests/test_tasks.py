@@ -0,0 +1,124 @@
+"""Testing open-ai/tasks.py file."""
+
+import threading
+import time
+from unittest.mock import MagicMock
+from tasks import AnalysisQueue, RetryLater, DONE, FAILED, PENDING, RUNNING
+
+
+def make_queue(handler=None, on_failure=None, max_attempts=3, lease_seconds=300):
+    db = MagicMock()
+    queue = AnalysisQueue(db, handler or MagicMock(), on_failure=on_failure, workers=1, max_attempts=max_attempts,
+                          backoff=1.0, max_backoff=8.0, lease_seconds=lease_seconds, poll_interval=0.01)
+    return queue, db
+
+
+def test_enqueue_inserts_pending_task():
+    queue, db = make_queue()
+    queue.enqueue("request-1")
+    doc = db.AnalysisTask.insert_one.call_args.args[0]
+    assert doc["request_id"] == "request-1"
+    assert doc["status"] == PENDING
+    assert doc["attempts"] == 0
+
+
+def test_claim_takes_due_or_expired_tasks():
+    queue, db = make_queue()
+    queue.claim("worker-1")
+
+    query, update = db.AnalysisTask.find_one_and_update.call_args.args
+    assert query["$or"][0]["status"] == PENDING
+    assert query["$or"][1]["status"] == RUNNING
+    assert update["$set"]["status"] == RUNNING
+    assert update["$inc"] == {"attempts": 1}
+
+
+def test_run_once_empty_queue():
+    queue, db = make_queue()
+    db.AnalysisTask.find_one_and_update.return_value = None
+    assert queue.runOnce("worker-1") is False
+
+
+def test_run_once_marks_done():
+    queue, db = make_queue()
+    db.AnalysisTask.find_one_and_update.return_value = {"_id": 1, "request_id": "r", "attempts": 1}
+    assert queue.runOnce("worker-1") is True
+    assert db.AnalysisTask.update_one.call_args.args[1]["$set"]["status"] == DONE
+
+
+def test_retry_later_requeues_with_backoff_until_max_attempts():
+    on_failure = MagicMock()
+    queue, db = make_queue(handler=MagicMock(side_effect=RetryLater("429")), on_failure=on_failure)
+
+    db.AnalysisTask.find_one_and_update.return_value = {"_id": 1, "request_id": "r", "attempts": 1}
+    queue.runOnce("worker-1")
+    fields = db.AnalysisTask.update_one.call_args.args[1]["$set"]
+    assert fields["status"] == PENDING
+    assert "not_before" in fields
+    on_failure.assert_not_called()
+
+    db.AnalysisTask.find_one_and_update.return_value = {"_id": 1, "request_id": "r", "attempts": 3}
+    queue.runOnce("worker-1")
+    assert db.AnalysisTask.update_one.call_args.args[1]["$set"]["status"] == FAILED
+    on_failure.assert_called_once()
+
+
+def test_other_errors_fail_immediately():
+    on_failure = MagicMock()
+    queue, db = make_queue(handler=MagicMock(side_effect=ValueError("bad")), on_failure=on_failure)
+    db.AnalysisTask.find_one_and_update.return_value = {"_id": 1, "request_id": "r", "attempts": 1}
+    queue.runOnce("worker-1")
+    assert db.AnalysisTask.update_one.call_args.args[1]["$set"]["status"] == FAILED
+    assert str(on_failure.call_args.args[1]) == "bad"
+
+
+def test_task_past_max_attempts_is_failed_without_running():
+    handler, on_failure = MagicMock(), MagicMock()
+    queue, db = make_queue(handler=handler, on_failure=on_failure)
+    db.AnalysisTask.find_one_and_update.return_value = {"_id": 1, "request_id": "r", "attempts": 4}
+    assert queue.runOnce("worker-1") is True
+    handler.assert_not_called()
+    assert db.AnalysisTask.update_one.call_args.args[1]["$set"]["status"] == FAILED
+    on_failure.assert_called_once()
+
+
+def test_lease_is_renewed_while_the_model_is_slow():
+    queue, db = make_queue(handler=lambda task: time.sleep(0.1), lease_seconds=0.03)
+    db.AnalysisTask.find_one_and_update.return_value = {"_id": 1, "request_id": "r", "attempts": 1}
+    queue.runOnce("worker-1")
+
+    calls = [c.args for c in db.AnalysisTask.update_one.call_args_list]
+    renewals = [update for query, update in calls if query == {"_id": 1, "worker": "worker-1"}]
+    assert len(renewals) >= 2
+    assert set(renewals[0]["$set"]) == {"lease_until"}
+    assert calls[-1][1]["$set"]["status"] == DONE
+
+
+def test_retry_delay_is_capped():
+    queue, _ = make_queue()
+    for attempts in range(1, 10):
+        assert 0 <= queue.retryDelay(attempts) <= 8.0
+
+
+def test_workers_start_once_and_stop():
+    queue, db = make_queue()
+    db.AnalysisTask.find_one_and_update.return_value = None
+    queue.start()
+    queue.start()
+    assert len(queue._threads) == 1
+    time.sleep(0.02)
+    queue.stop()
+    assert queue._threads == []
+
+
+def test_workers_restart_when_their_threads_are_gone():
+    """A forked process inherits the thread list but not the threads."""
+    queue, db = make_queue()
+    db.AnalysisTask.find_one_and_update.return_value = None
+    dead = threading.Thread(target=lambda: None)
+    dead.start()
+    dead.join()
+    queue._threads = [dead]
+    queue.start()
+    assert len(queue._threads) == 1 and queue._threads[0].is_alive()
+    queue.stop()
@@ -1,187 +1,325 @@
 """Flask app to analyze user's Youtube watch data."""
 
-from flask import Flask, render_template, request, redirect, url_for
+from flask import Flask, Response, render_template, request, redirect, url_for, jsonify, make_response, stream_with_context
+from werkzeug.middleware.proxy_fix import ProxyFix
 from pymongo import MongoClient
-from datetime import datetime
+from datetime import datetime, timezone
 from bson import ObjectId
 from copy import deepcopy
-from collections import defaultdict
-from config import YOUTUBE_API_KEY
-import os
-import requests
+from config import (
+    YOUTUBE_API_KEY,
+    YOUTUBE_API_URL,
+    YOUTUBE_BACKOFF,
+    YOUTUBE_CONCURRENCY,
+    YOUTUBE_MAX_RETRIES,
+    YOUTUBE_TIMEOUT,
+    MONGO_URI,
+    MONGO_MAX_POOL_SIZE,
+    MONGO_TIMEOUT_MS,
+    VIDEO_CACHE_TTL,
+    VIDEO_LRU_MAX_BYTES,
+    VIDEO_NEGATIVE_TTL,
+    JOB_WORKERS,
+    JOB_LEASE_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    JOB_POLL_INTERVAL,
+    HISTORY_LIMIT,
+    PARSE_WORKERS,
+    PARALLEL_PARSE_MIN_BYTES,
+    EVENT_BATCH_SIZE,
+    EVENT_COLUMNS_DIR,
+    EVENT_COLUMNS_TTL,
+    RESULT_CACHE_SIZE,
+    SSE_TIMEOUT,
+    SSE_KEEPALIVE,
+    SSE_MAX_STREAMS,
+    SSE_BUSY_RETRY_MS,
+    YOUTUBE_DAILY_QUOTA,
+    YOUTUBE_USER_DAILY_QUOTA,
+    DEFAULT_TIMEZONE,
+    TRUSTED_PROXIES,
+)
+from takeout import dedupeWatchEvents, iterTakeoutRecords, parseWatchRecord
+from parallel import iterParsedChunks, summarizeEvents
+from youtube import BATCH_SIZE, QUOTA_COST, VideoFetcher, batched
+from quota import QuotaGovernor
+from videocache import VideoLRUCache, VideoMetadataCache
+from jobs import JobQueue, QUEUED, ENRICHING, ANALYZING, DONE, FAILED
+from resultcache import ResultCache
+from jobevents import JobEventFeed
+from watchstats import WatchMetrics
+from rollups import TimeRollups, isTimezone
+from eventstore import WatchEventStore
+from columnar import EventColumnStore, EventColumnsWriter
+from ingest import DeltaReader, UserHistory
+from telemetry import registry, MongoCommandTimer
+from clients import ClientRegistry
 import json
-import re
-import isodate
+import os
+import random
+import threading
+import time
+import uuid
 
 app = Flask(__name__)
-client = MongoClient("mongodb://mongodb:27017")
-db = client["youtube_history"]
-
-metrics = {
-        "total_watchtime": 0,
-        "total_videos": 0,
-        "hourly_watchtime": {},
-        "tag_frequency": {},
-        "channel_stats": defaultdict(lambda: {"watchtime": 0, "frequency": 0}),
-        "category_stats": defaultdict(lambda: {"watchtime": 0, "frequency": 0}),
-        "longest_video": {"video_id": "", "duration": 0},
-        "shortest_video": {"video_id": "", "duration": float("inf")}
-    }
+# remote_addr is the client as seen by the nearest trusted proxy, never a header the client set
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES, x_proto=0, x_host=0, x_port=0, x_prefix=0)
+
+# nothing connects until first use, in whichever process uses it
+clients = ClientRegistry()
+clients.register(
+    "mongo",
+    lambda: MongoClient(
+        MONGO_URI,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        connectTimeoutMS=MONGO_TIMEOUT_MS,
+        serverSelectionTimeoutMS=MONGO_TIMEOUT_MS,
+        event_listeners=[MongoCommandTimer()],
+    ),
+    check=lambda mongo: mongo.admin.command("ping"),
+)
+clients.register("youtube", lambda: VideoFetcher(
+    YOUTUBE_API_KEY,
+    YOUTUBE_API_URL,
+    concurrency=YOUTUBE_CONCURRENCY,
+    retries=YOUTUBE_MAX_RETRIES,
+    backoff=YOUTUBE_BACKOFF,
+    timeout=YOUTUBE_TIMEOUT,
+))
+db = clients.lazy("mongo", "youtube_history")
+youtube = clients.lazy("youtube")
+videoCache = VideoMetadataCache(db["video_metadata"], VIDEO_CACHE_TTL)
+videoLRU = VideoLRUCache(VIDEO_LRU_MAX_BYTES, VIDEO_NEGATIVE_TTL)
+eventStore = WatchEventStore(db["WatchEvent"], batch_size=EVENT_BATCH_SIZE)
+eventColumns = EventColumnStore(EVENT_COLUMNS_DIR, EVENT_COLUMNS_TTL or None)
+resultCache = ResultCache(RESULT_CACHE_SIZE)
+jobEvents = JobEventFeed(db, poll_interval=JOB_POLL_INTERVAL)
+quota = QuotaGovernor(db["youtube_quota"], YOUTUBE_DAILY_QUOTA, YOUTUBE_USER_DAILY_QUOTA)
+userHistory = UserHistory(db["user_history"])
+
+PENDING = (QUEUED, ENRICHING, ANALYZING)
+
+PARSE_SECONDS = registry.histogram("webapp_process_history_seconds", "Time to parse and enrich one upload.")
+RECORDS_PARSED = registry.counter("webapp_records_parsed_total", "Watch events parsed from uploads.")
+PARSE_RATE = registry.gauge("webapp_records_per_second", "Watch events processed per second by the last upload.")
+ENRICH_SECONDS = registry.histogram("webapp_enrich_batch_seconds", "Time to enrich one chunk of watch events.")
+CACHE_LOOKUPS = registry.counter("webapp_video_cache_lookups_total", "Video metadata lookups by cache layer.", ["cache", "result"])
+
+# records parsed and enriched together
+CHUNK_SIZE = 5000
+
+def processWatchHistory(raw_data, chunk_size=CHUNK_SIZE, limit=1000, stream=False, progress=None, metrics=None, workers=1, sink=None, user=None, delta=None, columns=None):
+    """Parse an uploaded watch history and enrich it in chunks.
+
+    With ``stream=True`` the upload is walked one record at a time instead of
+    being loaded whole, and nothing is kept: each enriched chunk of parsed
+    ``{video_id, timestamp}`` events is handed to ``sink``, if given, and
+    dropped, and None is returned in place of the raw Takeout records.
+    ``progress`` is called with the number of videos enriched so far after
+    every chunk. Results are accumulated into ``metrics``, a ``WatchMetrics``
+    owned by the caller. With ``workers > 1`` records are parsed on a process
+    pool; the metrics come out identical to the serial path. YouTube quota
+    is charged to ``user``. A ``DeltaReader`` given as ``delta`` limits the
+    work to records newer than the user's last upload, and the enriched
+    events are also appended to ``columns``, an ``EventColumnsWriter``.
+    """
+    if metrics is None:
+        metrics = WatchMetrics()
+    started = time.perf_counter()
+
+    if stream:
+        source = iterTakeoutRecords(raw_data)
+        records = None
+    else:
+        # Handle FileStorage object from Flask
+        records = json.loads(raw_data.read().decode('utf-8'))
+        source = records
+
+    if delta is not None:
+        source = delta.read(source)
+
+    if workers > 1:
+        video_count = processInParallel(source, chunk_size, limit, workers, metrics, sink, progress, user, columns)
+        recordParse(video_count, started)
+        return records
 
-def processWatchHistory(raw_data, chunk_size=5000, limit=1000): 
     clean_data = []
     video_count = 0
-    # Handle FileStorage object from Flask
-    records = json.loads(raw_data.read().decode('utf-8'))
-    for record in records:
+    for event in map(parseWatchRecord, source):
+        if event is None:
+            continue
         if video_count >= limit:
             break
-        
-        if "titleUrl" not in record:
-            continue
 
-        title_url = record["titleUrl"].encode().decode('unicode_escape')
-        match = re.search(r"v=(.{11})", title_url)
-        if not match:
-            continue
-        
-        video_id = match.group(1)
-        timestamp = datetime.fromisoformat(record["time"].replace("Z", "+00:00"))
-        
-        clean_data.append({
-            "video_id": video_id,
-            "timestamp": timestamp
-        })
-        
+        clean_data.append(event)
         video_count += 1
-        
+
         if len(clean_data) >= chunk_size:
-            enrichData(clean_data)
+            videos = enrichData(clean_data, metrics, user)
+            if columns is not None:
+                columns.extend(clean_data, videos)
+            if sink:
+                sink(clean_data)
             clean_data = []
-            
+            if progress:
+                progress(video_count)
+
     if clean_data:
-        enrichData(clean_data)
-    
+        videos = enrichData(clean_data, metrics, user)
+        if columns is not None:
+            columns.extend(clean_data, videos)
+        if sink:
+            sink(clean_data)
+        if progress:
+            progress(video_count)
+
+    recordParse(video_count, started)
     return records  # Return the parsed JSON data instead of raw string
 
-def saveWatchHistory(clean_chunk, last_chunk=False):
-    #save to mongodb
-    return
-
-def enrichData(clean_chunk):
-    subchunk = []
-    # collect 50 video ids to send to youtube
-    for video in clean_chunk:
-        # process hourly watchtime
-        temp_time = video["timestamp"].hour - 4
-        if temp_time < 0:
-            temp_time += 24
-        metrics["hourly_watchtime"][temp_time] = metrics["hourly_watchtime"].get(temp_time, 0) + 1
-        
-        subchunk.append(video["video_id"])
-        
-        if len(subchunk) == 50:
-            api_ids = ",".join(subchunk)
-            # api call
-            params = {
-                "key": YOUTUBE_API_KEY,
-                "part": "snippet,contentDetails,statistics",
-                "fields": "items(id,snippet(title,channelTitle,categoryId,tags,publishedAt),contentDetails(duration))",
-                "id": api_ids,
-            }
-            response = requests.get("https://www.googleapis.com/youtube/v3/videos", params=params)
-            enriched_video_data = response.json()
+def recordParse(video_count, started):
+    elapsed = time.perf_counter() - started
+    PARSE_SECONDS.observe(elapsed)
+    RECORDS_PARSED.inc(video_count)
+    if elapsed > 0:
+        PARSE_RATE.set(round(video_count / elapsed, 1))
 
-            if "items" not in enriched_video_data:
-                continue
-            
-            for enriched_video in enriched_video_data["items"]:
-                # temp datastore for easy access
-                temp_duration = isodate.parse_duration(enriched_video["contentDetails"]["duration"]).total_seconds()
-                # 6 hour cap
-                if temp_duration > 21600:
-                    continue
-                temp_tags = enriched_video["snippet"].get("tags", [])
-                temp_channel = enriched_video["snippet"].get("channelTitle", "UnknownChannel")
-                temp_category = enriched_video["snippet"].get("categoryId", "UnknownCategory")
-                
-                # metrics update
-                metrics["total_watchtime"] += temp_duration
-                metrics["total_videos"] += 1
-                for tag in temp_tags:
-                    metrics["tag_frequency"][tag] = metrics["tag_frequency"].get(tag, 0) + 1
-                metrics["channel_stats"][temp_channel]["watchtime"] += temp_duration
-                metrics["channel_stats"][temp_channel]["frequency"] += 1
-                metrics["category_stats"][temp_category]["watchtime"] += temp_duration
-                metrics["category_stats"][temp_category]["frequency"] += 1
-                if temp_duration > metrics["longest_video"]["duration"]:
-                    metrics["longest_video"]["video_id"] = enriched_video["id"]
-                    metrics["longest_video"]["duration"] = temp_duration
-                if temp_duration < metrics["shortest_video"]["duration"]:
-                    metrics["shortest_video"]["video_id"] = enriched_video["id"]
-                    metrics["shortest_video"]["duration"] = temp_duration
-            subchunk = []
-    if subchunk:
-        api_ids = ",".join(subchunk)
-        # api call
-        params = {
-            "key": YOUTUBE_API_KEY,
-            "part": "snippet,contentDetails,statistics",
-            "fields": "items(id,snippet(title,channelTitle,categoryId,tags,publishedAt),contentDetails(duration))",
-            "id": api_ids,
-        }
-        response = requests.get("https://www.googleapis.com/youtube/v3/videos", params=params)
-        enriched_video_data = response.json()
+def processInParallel(records, chunk_size, limit, workers, metrics, sink=None, progress=None, user=None, columns=None):
+    """Parse chunks on a process pool and merge their partial aggregates in order."""
+    video_count = 0
+    timezone = metrics.time.timezone
+    for events, partial, views in iterParsedChunks(records, workers, chunk_size, timezone):
+        if video_count >= limit:
+            break
+        if video_count + len(events) > limit:
+            # re-summarize only the events that fit under the limit
+            events = events[:limit - video_count]
+            partial, views = summarizeEvents(events, timezone)
 
-        if "items" not in enriched_video_data:
-            return
-        
-        for enriched_video in enriched_video_data["items"]:
-            # temp datastore for easy access
-            temp_duration = isodate.parse_duration(enriched_video["contentDetails"]["duration"]).total_seconds()
-            # 6 hour cap
-            if temp_duration > 21600:
-                continue
-            temp_tags = enriched_video["snippet"].get("tags", [])
-            temp_channel = enriched_video["snippet"].get("channelTitle", "UnknownChannel")
-            temp_category = enriched_video["snippet"].get("categoryId", "UnknownCategory")
-            
-            # metrics update
-            metrics["total_watchtime"] += temp_duration
-            metrics["total_videos"] += 1
-            for tag in temp_tags:
-                metrics["tag_frequency"][tag] = metrics["tag_frequency"].get(tag, 0) + 1
-            metrics["channel_stats"][temp_channel]["watchtime"] += temp_duration
-            metrics["channel_stats"][temp_channel]["frequency"] += 1
-            metrics["category_stats"][temp_category]["watchtime"] += temp_duration
-            metrics["category_stats"][temp_category]["frequency"] += 1
-            if temp_duration > metrics["longest_video"]["duration"]:
-                metrics["longest_video"]["video_id"] = enriched_video["id"]
-                metrics["longest_video"]["duration"] = temp_duration
-            if temp_duration < metrics["shortest_video"]["duration"]:
-                metrics["shortest_video"]["video_id"] = enriched_video["id"]
-                metrics["shortest_video"]["duration"] = temp_duration
-        subchunk = []
-    return
-
-def logOutput():
-    print("Total Watchtime: ", metrics["total_watchtime"])
-    print("Total Videos: ", metrics["total_videos"])
-    print("Hourly Watchtime: ", metrics["hourly_watchtime"])
+        with ENRICH_SECONDS.time():
+            metrics.merge(partial)
+            videos = enrichVideos(views, metrics, user)
+        if columns is not None:
+            columns.extend(events, videos)
+        video_count += len(events)
+        if sink:
+            sink(events)
+        if progress:
+            progress(video_count)
+    return video_count
+
+def enrichData(clean_chunk, metrics, user=None):
+    with ENRICH_SECONDS.time():
+        metrics.addWatches(event["timestamp"] for event in clean_chunk)
+        watched = dedupeWatchEvents(clean_chunk)
+
+        return enrichVideos({video_id: watch["views"] for video_id, watch in watched.items()}, metrics, user)
+
+def enrichVideos(views, metrics, user=None):
+    """Add metadata for ``{video_id: views}`` to ``metrics``, weighted by views.
+
+    Returns the ``{video_id: metadata}`` that was found.
+
+    When the quota only covers a sample of the uncached videos, each sampled
+    video also stands in for the skipped ones, so the totals stay representative.
+    """
+    # each unique video is looked up once and weighted by its rewatches
+    videos, sampled, skipped = resolveVideos(list(views), user)
+    weights = views
+    if skipped and sampled:
+        weights = dict(views)
+        weights.update(scaleViews(
+            {video_id: views[video_id] for video_id in sampled},
+            sum(views[video_id] for video_id in sampled) + sum(views[video_id] for video_id in skipped),
+        ))
+    for video_id, count in views.items():
+        if video_id in videos:
+            metrics.addVideo(videos[video_id], weights[video_id])
+            metrics.estimated_videos += weights[video_id] - count
+    return videos
+
+def scaleViews(views, total):
+    """Scale ``{video_id: views}`` up to whole numbers summing to ``total`` (largest remainder)."""
+    scale = total / sum(views.values())
+    exact = {video_id: count * scale for video_id, count in views.items()}
+    scaled = {video_id: int(value) for video_id, value in exact.items()}
+    leftover = total - sum(scaled.values())
+    for video_id in sorted(exact, key=lambda v: exact[v] - scaled[v], reverse=True)[:leftover]:
+        scaled[video_id] += 1
+    return scaled
+
+def quotaSample(video_ids, user):
+    """The IDs the quota lets us look up (all of them, or a random sample it can cover) and the units reserved."""
+    needed = -(-len(video_ids) // BATCH_SIZE) * QUOTA_COST
+    granted = quota.reserve(user or "anonymous", needed)
+    if granted >= needed:
+        return video_ids, granted
+    app.logger.warning(f"YouTube quota covers {granted} of {needed} units; sampling videos for {user}")
+    chosen = set(random.Random(len(video_ids)).sample(video_ids, min(len(video_ids), granted // QUOTA_COST * BATCH_SIZE)))
+    return [video_id for video_id in video_ids if video_id in chosen], granted
+
+def resolveVideos(video_ids, user=None):
+    """Map each video id to its metadata, only calling youtube for cache misses.
+
+    Returns ``(videos, sampled, skipped)``: the metadata found, the IDs looked
+    up on youtube, and the IDs left out because the quota ran short.
+    """
+    unique_ids = list(dict.fromkeys(video_ids))
+    videos, absent = videoLRU.getMany(unique_ids)
+    lookup = [video_id for video_id in unique_ids if video_id not in videos and video_id not in absent]
+    CACHE_LOOKUPS.inc(len(unique_ids) - len(lookup), cache="lru", result="hit")
+    CACHE_LOOKUPS.inc(len(lookup), cache="lru", result="miss")
+    if not lookup:
+        return videos, set(), []
+
+    stored = videoCache.getMany(lookup)
+    CACHE_LOOKUPS.inc(len(stored), cache="mongo", result="hit")
+    CACHE_LOOKUPS.inc(len(lookup) - len(stored), cache="mongo", result="miss")
+    videoLRU.putMany(stored.values())
+    videos.update(stored)
+    missing = [video_id for video_id in lookup if video_id not in stored]
+    sample, reserved = quotaSample(missing, user) if missing else ([], 0)
+    if sample:
+        # batches of 50 ids go to youtube concurrently
+        batches, spent, exhausted = youtube.fetchBatches(sample)
+        # failed and unsent batches give their units back; retries cost extra
+        quota.settle(user or "anonymous", reserved, spent)
+        if exhausted:
+            app.logger.warning("YouTube reported the daily quota exhausted")
+            quota.exhaust()
+        fetched, answered = [], []
+        for ids, items in zip(batched(sample), batches):
+            # a failed batch is left out like a skipped one, not taken as deleted
+            if items is not None:
+                fetched.extend(items)
+                answered.extend(ids)
+        videoCache.putMany(fetched)
+        videoLRU.putMany(fetched)
+        for item in fetched:
+            videos[item["id"]] = item
+        # deleted/private videos come back without an item
+        videoLRU.putMissing(video_id for video_id in answered if video_id not in videos)
+        sample = answered
+    sampled = set(sample)
+    return videos, sampled, [video_id for video_id in missing if video_id not in sampled]
+
+def logOutput(metrics):
+    print("Total Watchtime: ", metrics.total_watchtime)
+    print("Total Videos: ", metrics.total_videos)
+    print("Hourly Watchtime: ", dict(enumerate(metrics.hourly_watchtime)))
+    print("Weekday Watchtime: ", dict(enumerate(metrics.weekday_watchtime)))
     print("\nTag Frequency: ")
-    sorted_tags = sorted(metrics["tag_frequency"].items(), key=lambda x: x[1], reverse=True)[:100]
-    for tag, freq in sorted_tags:
+    for tag, freq in metrics.topTags(100):
         print(f"{tag}: {freq}")
     print("\nChannel Stats: ")
-    sorted_channels = sorted(metrics["channel_stats"].items(), key=lambda x: x[1]["frequency"], reverse=True)[:100]
-    for channel, freq in sorted_channels:
-        print(f"{channel}: {freq}")
+    for channel, totals in metrics.topChannels(100):
+        print(f"{channel}: {totals.toDict()}")
     print("\nCategory Stats: ")
-    sorted_categories = sorted(metrics["category_stats"].items(), key=lambda x: x[1]["frequency"], reverse=True)[:100]
-    for category, freq in sorted_categories:
-        print(f"{category}: {freq}")
-    print("\nLongest Video: ", '"', metrics["longest_video"]["video_id"], '" ', '"', metrics["longest_video"]["duration"], '"')
-    print("Shortest Video: ", '"', metrics["shortest_video"]["video_id"], '" ', '"', metrics["shortest_video"]["duration"], '"')
+    for category, totals in metrics.topCategories(100):
+        print(f"{category}: {totals.toDict()}")
+    print("\nLongest Video: ", '"', metrics.longest_video[0], '" ', '"', metrics.longest_video[1], '"')
+    print("Shortest Video: ", '"', metrics.shortest_video[0], '" ', '"', metrics.shortest_video[1], '"')
+    print("Video Cache: ", videoCache.stats())
+    print("Video LRU: ", videoLRU.stats())
 
 @app.route("/")
 def home():
@@ -190,34 +328,289 @@ def home():
 
 @app.route("/upload", methods=["POST"])
 def upload():
-    file = request.files["file"]
+    file = request.files.get("file")
     if not file or not file.filename.endswith(".json"):
         return {"error": "Please upload a JSON file."}, 400
 
-    history = processWatchHistory(file)
+    # parsing and enrichment happen on a background worker
+    trace_id = request.headers.get("X-Trace-Id") or uuid.uuid4().hex
+    timezone = request.form.get("timezone")
+    if not isTimezone(timezone):
+        timezone = DEFAULT_TIMEZONE
+    # there are no accounts, so quota is shared out per client address
+    job_id = jobs.submit(
+        file,
+        trace_id=trace_id,
+        user=request.remote_addr,
+        timezone=timezone,
+    )
 
-    data = {
-        "Timestamp": datetime.now(), 
-        "raw_data": history, 
-        "analysis": None
-    }
+    response = redirect(url_for("results", id=job_id))
+    response.headers["X-Trace-Id"] = trace_id
+    return response
+
+def runJob(job, queue):
+    """Parse and enrich one queued upload, then queue it for the open-ai service.
+
+    A repeat upload from the same user only processes the records newer than
+    the last one, and its metrics are merged into the user's stored totals.
+    """
+    trace_id = job.get("trace_id")
+    user = job.get("user")
+    timezone = job.get("timezone") or DEFAULT_TIMEZONE
+    started = time.perf_counter()
+    count = 0
+    while True:
+        stored = userHistory.load(user) if user else None
+        if stored and job["_id"] in stored.get("jobs", ()):
+            # merged before the last attempt stopped; its events are stored already
+            totals = stored["metrics"], stored["event_count"], userHistory.segments(stored)
+            break
+        delta = DeltaReader(userHistory.watermark(stored, timezone))
+        metrics, events = ingestUpload(job, queue, delta, timezone)
+        count = events.count
+        if not user:
+            totals = metrics.toDict(), events.count, [job["_id"]]
+            break
+        totals = userHistory.merge(user, job["_id"], stored, metrics, delta, events.count)
+        if totals:
+            break
+        # another upload from this user was merged first; read ours against its watermark
+        app.logger.info(f"[trace {trace_id}] job {job['_id']}: history of {user} changed, reading the upload again")
+    metrics, event_count, segments = totals
+    # the older segments are read along with this one, so they expire with it
+    eventColumns.touch(segments[:-1])
+    queue.update(job["_id"], status=ANALYZING, event_count=event_count, metrics=metrics, segments=segments)
+    queue.discardUpload(job)
+    queue.handOff(job["_id"], trace_id)
+    app.logger.info(f"[trace {trace_id}] job {job['_id']}: {count} new events enriched in {time.perf_counter() - started:.2f}s")
+
+def ingestUpload(job, queue, delta, timezone):
+    """Process the job's upload through ``delta``; returns its metrics and event writer.
+
+    Only the new events are stored, under this request: a continuation's
+    earlier events stay with the requests that stored them, and readers
+    follow the request's ``segments``.
+    """
+    upload = queue.openUpload(job)
+    metrics = WatchMetrics(timezone)
+    events = eventStore.writer(job["_id"])
+    columns = EventColumnsWriter()
+    workers = parseWorkers(getattr(upload, "length", 0), HISTORY_LIMIT)
+    processWatchHistory(
+        upload,
+        limit=HISTORY_LIMIT,
+        stream=True,
+        progress=lambda count: queue.update(job["_id"], progress=count),
+        metrics=metrics,
+        workers=workers,
+        sink=events.write,
+        user=job.get("user"),
+        delta=delta,
+        columns=columns,
+    )
+    events.flush()
+    eventColumns.save(job["_id"], columns)
+    return metrics, events
 
-    inserted = db.Request.insert_one(data)
+def parseWorkers(size, limit, chunk_size=CHUNK_SIZE):
+    """Processes to parse an upload of ``size`` bytes with, keeping ``limit`` events.
 
-    analysis_url = os.getenv("OPENAI_SERVICE_URL", "http://open-ai:8000")
-    requests.post(f"{analysis_url}/analyze", json={"id": str(inserted.inserted_id)})
+    Worker processes only pay for their start-up on a big export of which
+    enough is kept to hand every worker at least one whole chunk; otherwise
+    the serial path is done before they would be.
+    """
+    if PARSE_WORKERS < 2 or size < PARALLEL_PARSE_MIN_BYTES or limit < chunk_size * PARSE_WORKERS:
+        return 1
+    return PARSE_WORKERS
 
-    return redirect(url_for("results", id=str(inserted.inserted_id)))
+def renderFinalResults(id, data):
+    """Render a finished analysis once and keep it for later requests."""
+    analysis = data["analysis"]
+    if isinstance(analysis, str):
+        # analyses finished before they were stored as documents
+        analysis = json.loads(analysis)
+    html = render_template("results.html", analysis=analysis, id=id)
+    last_modified = data.get("completed_at") or datetime.now(timezone.utc)
+    return resultCache.put(id, analysis, html, last_modified)
+
+def conditionalResponse(cached):
+    """Serve a cached page with validators so repeat visits get a 304."""
+    response = make_response(cached.html)
+    response.set_etag(cached.etag)
+    response.last_modified = cached.last_modified
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 @app.route("/results/<id>")
 def results(id):
-    data = db.Request.find_one({"_id": ObjectId(id)})
+    cached = resultCache.get(id)
+    if cached:
+        return conditionalResponse(cached)
+
+    # cheap status check first; the analysis itself is only read once it's final
+    data = db.Request.find_one({"_id": ObjectId(id)}, {"status": 1, "progress": 1})
     if not data:
         return {"error": "Couldn't generate results. Try again."}, 400
-    if not data.get("analysis"):
-        return render_template("loading.html", id=id)
-    
-    return render_template("results.html", analysis=json.loads(data["analysis"]), id=id)
+    if data.get("status") == FAILED:
+        return {"error": "Couldn't generate results. Try again."}, 500
+    if data.get("status") in PENDING:
+        return renderLoading(id, data)
+
+    data = db.Request.find_one({"_id": ObjectId(id)}, {"analysis": 1, "completed_at": 1})
+    if not data or not data.get("analysis"):
+        return renderLoading(id, data or {})
+
+    return conditionalResponse(renderFinalResults(id, data))
+
+def renderLoading(id, data):
+    response = make_response(render_template("loading.html", id=id, status=data.get("status", ANALYZING), progress=data.get("progress", 0)))
+    response.cache_control.no_store = True
+    return response
+
+@app.route("/results/<id>/status")
+def results_status(id):
+    """Lightweight job state for the loading page to poll."""
+    if resultCache.get(id):
+        return jsonify({"status": DONE, "progress": 0})
+    if not ObjectId.is_valid(id):
+        return {"error": "Request not found"}, 404
+    data = db.Request.find_one({"_id": ObjectId(id)}, {"status": 1, "progress": 1, "partial": 1})
+    if not data:
+        return {"error": "Request not found"}, 404
+    state = {"status": data.get("status", ANALYZING), "progress": data.get("progress", 0)}
+    if data.get("partial"):
+        # sections the analyzer has already finished
+        state["partial"] = data["partial"]
+    return jsonify(state)
+
+@app.route("/results/<id>/time")
+def results_time(id):
+    """Watch counts by hour, weekday, day and month, from the rollups stored with the request.
+
+    ``days`` also answers how many videos were watched in the last that many
+    days, counted in the request's timezone.
+    """
+    days = request.args.get("days", type=int)
+    if days is not None and days < 1:
+        return {"error": "days must be a positive number."}, 400
+    if not ObjectId.is_valid(id):
+        return {"error": "Request not found"}, 404
+    data = db.Request.find_one({"_id": ObjectId(id)}, {"metrics.time_rollups": 1})
+    rollups = ((data or {}).get("metrics") or {}).get("time_rollups")
+    if not rollups:
+        return {"error": "Request not found"}, 404
+    state = dict(rollups)
+    if days:
+        state["last_days"] = {"days": days, "events": TimeRollups.fromDict(rollups).lastDays(days)}
+    return jsonify(state)
+
+@app.route("/results/<id>/activity")
+def results_activity(id):
+    """Histograms and rankings recomputed from the event columns of the request's history.
+
+    ``from`` and ``to`` (ISO dates or times, UTC) narrow it to a date range;
+    ``timezone`` picks the zone hours and days are counted in.
+    """
+    try:
+        start, end = (parseDate(request.args.get(name)) for name in ("from", "to"))
+    except ValueError:
+        return {"error": "Dates must be in ISO format."}, 400
+    timezone = request.args.get("timezone", DEFAULT_TIMEZONE)
+    if not isTimezone(timezone):
+        return {"error": "Unknown timezone."}, 400
+    data = db.Request.find_one({"_id": ObjectId(id)}, {"segments": 1}) if ObjectId.is_valid(id) else None
+    # requests stored before uploads were chained are a single segment
+    history = eventColumns.openHistory(data.get("segments") or [id]) if data else None
+    if history is None:
+        return {"error": "Request not found"}, 404
+    with history as columns:
+        rollups = columns.rollups(start, end, timezone)
+        return jsonify({
+            "events": columns.count(start, end),
+            "hourly_watchtime": list(rollups.hourly),
+            "weekday_watchtime": list(rollups.weekday),
+            "channel_stats": [dict(name=name, **totals) for name, totals in columns.topChannels(10, start, end)],
+            "category_stats": [dict(name=name, **totals) for name, totals in columns.topCategories(10, start, end)],
+        })
+
+def parseDate(value):
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+# each open stream holds a request thread and a pooled mongo connection
+eventStreams = threading.BoundedSemaphore(SSE_MAX_STREAMS)
+
+def eventStreamResponse(body):
+    return Response(body, mimetype="text/event-stream", headers={"Cache-Control": "no-store", "X-Accel-Buffering": "no"})
+
+@app.route("/results/<id>/events")
+def results_events(id):
+    """Server-sent events with the job's progress until it finishes."""
+    if not ObjectId.is_valid(id):
+        return {"error": "Request not found"}, 404
+    if not eventStreams.acquire(blocking=False):
+        # too many open streams; the browser tries again after the retry delay
+        return eventStreamResponse(f"retry: {SSE_BUSY_RETRY_MS}\n\n")
+    try:
+        # the current state is read once the feed listens, so a change in between isn't lost
+        updates = jobEvents.follow(
+            id,
+            SSE_TIMEOUT,
+            snapshot=lambda: db.Request.find_one({"_id": ObjectId(id)}, {"status": 1, "progress": 1}),
+            after=request.headers.get("Last-Event-ID"),
+        )
+        data = next(updates)
+    except BaseException:
+        eventStreams.release()
+        raise
+    if not data:
+        updates.close()
+        eventStreams.release()
+        return {"error": "Request not found"}, 404
+
+    def stream():
+        state = {"status": data.get("status", ANALYZING), "progress": data.get("progress", 0)}
+        yield f"data: {json.dumps(state)}\n\n"
+        if state["status"] in (DONE, FAILED):
+            return
+        last_sent = time.monotonic()
+        for update in updates:
+            if update is None:
+                if time.monotonic() - last_sent >= SSE_KEEPALIVE:
+                    last_sent = time.monotonic()
+                    yield ": keep-alive\n\n"
+                continue
+            # the browser sends the last id back as Last-Event-ID when it reconnects
+            event_id = update.pop("id", None)
+            state.update({key: value for key, value in update.items() if value is not None})
+            last_sent = time.monotonic()
+            yield (f"id: {event_id}\n" if event_id else "") + f"data: {json.dumps(state)}\n\n"
+        # browsers reconnect on their own if the job is still running
+        yield "retry: 1000\n\n"
+
+    response = eventStreamResponse(stream_with_context(stream()))
+
+    @response.call_on_close
+    def closeStream():
+        updates.close()
+        eventStreams.release()
+
+    return response
+
+@app.route("/health")
+def health():
+    """Whether this process can reach MongoDB; 503 if it can't."""
+    checks = clients.health(["mongo"])
+    return jsonify(checks), 200 if all(check["ok"] for check in checks.values()) else 503
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """Counters and histograms in the Prometheus text format."""
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
 
 @app.route("/example-results")
 def example_results():
@@ -230,12 +623,13 @@ def example_results():
                 "Gaming",
                 "Education"
             ],
+            # minutes, like the watch times of a real analysis
             "watch_time": {
-                "Sports": 15,
-                "Technology": 8,
-                "Comedy": 6,
-                "Gaming": 4,
-                "Education": 5
+                "Sports": 412,
+                "Technology": 236,
+                "Comedy": 188,
+                "Gaming": 143,
+                "Education": 95
             }
         },
         "channels": {
@@ -247,11 +641,11 @@ def example_results():
                 "Game Changer Shorts"
             ],
             "watch_time": {
-                "Bill Simmons": 20,
-                "Mortdog - TFT": 10,
-                "AFunkyDiabetic": 12,
-                "Linus Tech Tips": 10,
-                "Game Changer Shorts": 15
+                "Bill Simmons": 610,
+                "Mortdog - TFT": 245,
+                "AFunkyDiabetic": 132,
+                "Linus Tech Tips": 118,
+                "Game Changer Shorts": 41
             }
         },
         "habits": {
@@ -266,7 +660,26 @@ def example_results():
 
     return render_template("results.html", analysis=example_analysis, id=None)
 
+jobs = JobQueue(
+    db,
+    runJob,
+    workers=JOB_WORKERS,
+    max_attempts=JOB_MAX_ATTEMPTS,
+    lease_seconds=JOB_LEASE_SECONDS,
+    poll_interval=JOB_POLL_INTERVAL,
+    events=jobEvents,
+)
+
+@app.before_request
+def startWorkers():
+    """Job workers run in whichever process serves requests, e.g. each gunicorn worker."""
+    jobs.start()
+
 # main driver function
 if __name__ == "__main__":
     # processWatchHistory("watch-history.json")
+    # the debug reloader's parent only watches files; its child serves and works
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        clients.warmUp()
+        jobs.start()
     app.run(host="0.0.0.0", port=5002, debug=True)
\ No newline at end of file
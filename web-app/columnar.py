@@ -0,0 +1,309 @@
+"""Parsed watch events stored column by column, one memory-mapped file per request.
+
+A file is a fixed header, then one packed array per column (sorted by
+timestamp), then a JSON table of the interned names::
+
+    timestamps  int64    epoch seconds, ascending
+    videos      int32    index into names["videos"]
+    channels    int32    index into names["channels"], -1 if unknown
+    categories  int32    index into names["categories"], -1 if unknown
+    durations   float32  video length in seconds, 0 if unknown
+
+That is 24 bytes an event, against several hundred for a dict per event,
+and reading a file back maps the arrays instead of copying them.
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from operator import ge, le
+import isodate
+from config import DEFAULT_TIMEZONE
+from rollups import TimeRollups
+from watchstats import MAX_DURATION
+
+MAGIC = b"YTEC"
+VERSION = 1
+# magic, version, byte order (1 = little endian), rows, name table bytes
+HEADER = struct.Struct("<4sBBxxQQ")
+COLUMNS = (("timestamps", "q"), ("videos", "i"), ("channels", "i"), ("categories", "i"), ("durations", "f"))
+INTERNED = ("videos", "channels", "categories")
+UNKNOWN = -1
+
+
+class EventColumnsWriter:
+    """Collects enriched events as typed arrays, interning the repeated IDs."""
+
+    def __init__(self):
+        self.columns = {name: array(code) for name, code in COLUMNS}
+        self._ids = {name: {} for name in INTERNED}
+        # (channel, category, duration) per video index, parsed once per video
+        self._videos = {}
+
+    def __len__(self):
+        return len(self.columns["timestamps"])
+
+    def _intern(self, kind, name):
+        ids = self._ids[kind]
+        index = ids.get(name)
+        if index is None:
+            index = ids[name] = len(ids)
+        return index
+
+    def _describe(self, video, item):
+        info = self._videos.get(video)
+        if info is None:
+            if item is None:
+                info = (UNKNOWN, UNKNOWN, 0.0)
+            else:
+                snippet = item["snippet"]
+                info = (
+                    self._intern("channels", snippet.get("channelTitle", "UnknownChannel")),
+                    self._intern("categories", snippet.get("categoryId", "UnknownCategory")),
+                    isodate.parse_duration(item["contentDetails"]["duration"]).total_seconds(),
+                )
+            self._videos[video] = info
+        return info
+
+    def extend(self, events, videos):
+        """Append ``{video_id, timestamp}`` events, described by ``{video_id: videos.list item}``."""
+        timestamps, video_ids, channels, categories, durations = (self.columns[name] for name, _ in COLUMNS)
+        for event in events:
+            video = self._intern("videos", event["video_id"])
+            channel, category, duration = self._describe(video, videos.get(event["video_id"]))
+            timestamps.append(int(event["timestamp"].timestamp()))
+            video_ids.append(video)
+            channels.append(channel)
+            categories.append(category)
+            durations.append(duration)
+
+    def _sorted(self):
+        """The columns in time order.
+
+        Takeout lists events newest first, so they usually only need turning
+        around, which slicing does without visiting each row in Python; any
+        other order is sorted.
+        """
+        timestamps = self.columns["timestamps"]
+        later = timestamps[1:]
+        if all(map(le, timestamps, later)):
+            return self.columns
+        if all(map(ge, timestamps, later)):
+            return {name: column[::-1] for name, column in self.columns.items()}
+        order = sorted(range(len(timestamps)), key=timestamps.__getitem__)
+        return {name: array(code, map(self.columns[name].__getitem__, order)) for name, code in COLUMNS}
+
+    def write(self, path):
+        """Write the events sorted by time to ``path``, replacing it atomically."""
+        columns = self._sorted()
+        names = json.dumps({kind: list(self._ids[kind]) for kind in INTERNED}).encode()
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, sys.byteorder == "little", len(self), len(names)))
+            for name, _ in COLUMNS:
+                f.write(columns[name].tobytes())
+            f.write(names)
+        os.replace(tmp, path)
+
+
+class EventColumns:
+    """Read-only columns of one request's events, mapped from their file.
+
+    Each column is a ``memoryview`` over the mapping, so nothing is read
+    until it is used and no per-event objects are created.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, little, rows, names_size = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a version {VERSION} event columns file")
+        if little != (sys.byteorder == "little"):
+            self._mmap.close()
+            raise ValueError(f"{path} was written with the other byte order")
+
+        self._view = memoryview(self._mmap)
+        self._columns = []
+        offset = HEADER.size
+        for name, code in COLUMNS:
+            size = array(code).itemsize * rows
+            column = self._view[offset:offset + size].cast(code)
+            setattr(self, name, column)
+            self._columns.append(column)
+            offset += size
+        self.names = json.loads(bytes(self._view[offset:offset + names_size]))
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for column in self._columns:
+            column.release()
+        self._view.release()
+        self._mmap.close()
+
+    def rows(self, start=None, end=None):
+        """Row range ``(lo, hi)`` of the events in ``[start, end)`` (aware datetimes, or None)."""
+        lo = 0 if start is None else bisect_left(self.timestamps, int(start.timestamp()))
+        hi = len(self) if end is None else bisect_left(self.timestamps, int(end.timestamp()))
+        return lo, max(lo, hi)
+
+    def rollups(self, start=None, end=None, timezone=DEFAULT_TIMEZONE):
+        """``TimeRollups`` of the events in ``[start, end)``, bucketed in ``timezone``."""
+        lo, hi = self.rows(start, end)
+        rollups = TimeRollups(timezone)
+        rollups.addSorted(self.timestamps[lo:hi])
+        return rollups
+
+    def totals(self, kind, start=None, end=None):
+        """``(frequency, watchtime)`` Counters by channel or category name for ``[start, end)``."""
+        lo, hi = self.rows(start, end)
+        frequency = Counter()
+        watchtime = Counter()
+        # counting the distinct (name, duration) pairs happens in C; only
+        # those, about one per video, are visited here
+        for (key, duration), count in Counter(zip(getattr(self, kind)[lo:hi], self.durations[lo:hi])).items():
+            # same rules as WatchMetrics.addVideo
+            if key == UNKNOWN or duration > MAX_DURATION:
+                continue
+            frequency[key] += count
+            watchtime[key] += duration * count
+        names = self.names[kind]
+        return (
+            Counter({names[key]: count for key, count in frequency.items()}),
+            Counter({names[key]: seconds for key, seconds in watchtime.items()}),
+        )
+
+    def topChannels(self, n=100, start=None, end=None):
+        return rank(*self.totals("channels", start, end), n)
+
+    def topCategories(self, n=100, start=None, end=None):
+        return rank(*self.totals("categories", start, end), n)
+
+
+def rank(frequency, watchtime, n):
+    return [(name, {"watchtime": watchtime[name], "frequency": count}) for name, count in frequency.most_common(n)]
+
+
+class EventHistory:
+    """The columns of every upload in a history, read as one.
+
+    A repeat upload only stores its new events, so a request's history is
+    split into segments: the files of the uploads it continued, then its own.
+    """
+
+    def __init__(self, segments):
+        self.segments = segments
+
+    def __len__(self):
+        return sum(len(segment) for segment in self.segments)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+
+    def count(self, start=None, end=None):
+        """Events in ``[start, end)``."""
+        return sum(hi - lo for lo, hi in (segment.rows(start, end) for segment in self.segments))
+
+    def rollups(self, start=None, end=None, timezone=DEFAULT_TIMEZONE):
+        rollups = TimeRollups(timezone)
+        for segment in self.segments:
+            lo, hi = segment.rows(start, end)
+            rollups.addSorted(segment.timestamps[lo:hi])
+        return rollups
+
+    def _rank(self, kind, n, start, end):
+        frequency, watchtime = Counter(), Counter()
+        for segment in self.segments:
+            counts, seconds = segment.totals(kind, start, end)
+            frequency.update(counts)
+            watchtime.update(seconds)
+        return rank(frequency, watchtime, n)
+
+    def topChannels(self, n=100, start=None, end=None):
+        return self._rank("channels", n, start, end)
+
+    def topCategories(self, n=100, start=None, end=None):
+        return self._rank("categories", n, start, end)
+
+
+class EventColumnStore:
+    """Directory of ``<request_id>.cols`` files.
+
+    Files are deleted ``ttl_seconds`` after they were written (None keeps
+    them); saving checks for expired ones at most every ``prune_interval``.
+    """
+
+    def __init__(self, directory, ttl_seconds=None, prune_interval=3600):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.prune_interval = prune_interval
+        self._pruned_at = None
+
+    def path(self, request_id):
+        return os.path.join(self.directory, f"{request_id}.cols")
+
+    def save(self, request_id, writer):
+        os.makedirs(self.directory, exist_ok=True)
+        writer.write(self.path(request_id))
+        if self.ttl_seconds and (self._pruned_at is None or time.monotonic() - self._pruned_at >= self.prune_interval):
+            self.prune()
+
+    def prune(self, now=None):
+        """Delete the files (and leftover partial writes) older than ``ttl_seconds``; returns how many."""
+        self._pruned_at = time.monotonic()
+        expired = (time.time() if now is None else now) - self.ttl_seconds
+        removed = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.name.endswith((".cols", ".cols.tmp")):
+                    continue
+                try:
+                    if entry.stat().st_mtime < expired:
+                        os.remove(entry.path)
+                        removed += 1
+                except FileNotFoundError:
+                    # another worker got there first
+                    pass
+        return removed
+
+    def open(self, request_id):
+        """The request's ``EventColumns``, or None if none were saved."""
+        try:
+            return EventColumns(self.path(request_id))
+        except FileNotFoundError:
+            return None
+
+    def openHistory(self, request_ids):
+        """``EventHistory`` of the segments saved for ``request_ids``, or None if there are none."""
+        segments = [columns for columns in map(self.open, request_ids) if columns is not None]
+        return EventHistory(segments) if segments else None
+
+    def touch(self, request_ids):
+        """Restart the expiry of segments a newer upload still reads."""
+        for request_id in request_ids:
+            try:
+                os.utime(self.path(request_id))
+            except FileNotFoundError:
+                pass
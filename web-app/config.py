@@ -1,7 +1,83 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 from pathlib import Path
 
 load_dotenv(dotenv_path=Path(__file__).resolve().parent.parent / ".env")
 
 YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://mongodb:27017")
+# connections per process: request threads, job workers and the SSE feeds share them
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "20"))
+# how long to wait for a connection or a usable server before failing
+MONGO_TIMEOUT_MS = int(os.getenv("MONGO_TIMEOUT_MS", "5000"))
+
+YOUTUBE_API_URL = os.getenv("YOUTUBE_API_URL", "https://www.googleapis.com/youtube/v3/videos")
+# number of videos.list batches kept in flight at once
+YOUTUBE_CONCURRENCY = int(os.getenv("YOUTUBE_CONCURRENCY", "4"))
+YOUTUBE_MAX_RETRIES = int(os.getenv("YOUTUBE_MAX_RETRIES", "3"))
+YOUTUBE_BACKOFF = float(os.getenv("YOUTUBE_BACKOFF", "0.5"))
+YOUTUBE_TIMEOUT = float(os.getenv("YOUTUBE_TIMEOUT", "10"))
+# quota units per day for the whole API key, and for any one client;
+# once a budget runs low only a sample of uncached videos is looked up
+YOUTUBE_DAILY_QUOTA = int(os.getenv("YOUTUBE_DAILY_QUOTA", "10000"))
+YOUTUBE_USER_DAILY_QUOTA = int(os.getenv("YOUTUBE_USER_DAILY_QUOTA", "2000"))
+# reverse proxies in front of the app whose X-Forwarded-For entries are trusted;
+# clients are told apart by address, so 0 (the default) ignores the header
+TRUSTED_PROXIES = int(os.getenv("TRUSTED_PROXIES", "0"))
+
+# how long cached video metadata stays in the video_metadata collection
+VIDEO_CACHE_TTL = int(os.getenv("VIDEO_CACHE_TTL", str(7 * 24 * 3600)))
+
+# in-process LRU in front of the video_metadata collection
+VIDEO_LRU_MAX_BYTES = int(os.getenv("VIDEO_LRU_MAX_BYTES", str(32 * 1024 * 1024)))
+# how long ids youtube returned nothing for (deleted/private) are skipped
+VIDEO_NEGATIVE_TTL = int(os.getenv("VIDEO_NEGATIVE_TTL", str(6 * 3600)))
+
+# background workers that parse and enrich queued uploads
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# a claimed job is retried by another worker once its lease lapses; the
+# running worker renews it every third of this, so it only lapses on a crash
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "900"))
+# a job whose workers crashed this many times is failed instead of retried
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+
+# IANA timezone watch times are bucketed in when the browser doesn't send one
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "America/New_York")
+
+# counters kept for the top tags, channels and categories of each upload;
+# 0 counts every distinct one exactly
+TOP_K_CAPACITY = int(os.getenv("TOP_K_CAPACITY", "2000"))
+
+# most watch events analyzed per upload
+HISTORY_LIMIT = int(os.getenv("HISTORY_LIMIT", "1000"))
+# processes used to parse uploads at least PARALLEL_PARSE_MIN_BYTES big. This
+# is opt-in: it only applies once HISTORY_LIMIT is at least 5000 (one chunk)
+# times PARSE_WORKERS, e.g. HISTORY_LIMIT=40000 with 8 workers; with the
+# default limit every upload is parsed serially
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", str(os.cpu_count() or 1)))
+PARALLEL_PARSE_MIN_BYTES = int(os.getenv("PARALLEL_PARSE_MIN_BYTES", str(32 * 1024 * 1024)))
+
+# watch events per insert_many into the WatchEvent collection
+EVENT_BATCH_SIZE = int(os.getenv("EVENT_BATCH_SIZE", "1000"))
+
+# one memory-mapped file of parsed, enriched events per request, kept outside
+# the source tree; docker-compose puts it on its own volume
+EVENT_COLUMNS_DIR = os.getenv("EVENT_COLUMNS_DIR", os.path.join(tempfile.gettempdir(), "youtube-history", "columns"))
+# event column files are deleted this long after they were written (30 days); 0 keeps them
+EVENT_COLUMNS_TTL = int(os.getenv("EVENT_COLUMNS_TTL", str(30 * 24 * 3600)))
+
+# finished results pages kept rendered in memory
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "256"))
+
+# longest a /results/<id>/events stream stays open before the browser
+# reconnects and resumes from the last event it got
+SSE_TIMEOUT = int(os.getenv("SSE_TIMEOUT", "60"))
+SSE_KEEPALIVE = int(os.getenv("SSE_KEEPALIVE", "15"))
+# open streams per process; each holds a request thread and a pooled mongo
+# connection, so keep this well under MONGO_MAX_POOL_SIZE minus JOB_WORKERS
+SSE_MAX_STREAMS = int(os.getenv("SSE_MAX_STREAMS", "8"))
+# how long a browser turned away at SSE_MAX_STREAMS waits before retrying
+SSE_BUSY_RETRY_MS = int(os.getenv("SSE_BUSY_RETRY_MS", "5000"))
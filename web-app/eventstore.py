@@ -0,0 +1,54 @@
+"""Normalized watch events stored in their own collection, one document per event."""
+
+from pymongo import ASCENDING
+
+
+class WatchEventWriter:
+    """Buffers one request's events and writes them with ordered ``insert_many``."""
+
+    def __init__(self, collection, request_id, batch_size):
+        self.collection = collection
+        self.request_id = request_id
+        self.batch_size = batch_size
+        self.count = 0
+        self._buffer = []
+
+    def write(self, events):
+        for event in events:
+            self._buffer.append({
+                "request_id": self.request_id,
+                "video_id": event["video_id"],
+                "timestamp": event["timestamp"],
+            })
+            if len(self._buffer) >= self.batch_size:
+                self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self.collection.insert_many(self._buffer, ordered=True)
+            self.count += len(self._buffer)
+            self._buffer = []
+
+
+class WatchEventStore:
+    """``WatchEvent`` collection indexed on ``(request_id, timestamp)``.
+
+    Keeps the per-event history out of the ``Request`` document, which only
+    holds aggregated metrics and the analysis.
+    """
+
+    def __init__(self, collection, batch_size=1000):
+        self.collection = collection
+        self.batch_size = batch_size
+        self._indexed = False
+
+    def ensureIndexes(self):
+        if not self._indexed:
+            self.collection.create_index([("request_id", ASCENDING), ("timestamp", ASCENDING)])
+            self._indexed = True
+
+    def writer(self, request_id):
+        """Start writing ``request_id``'s events, replacing any from an earlier attempt."""
+        self.ensureIndexes()
+        self.collection.delete_many({"request_id": request_id})
+        return WatchEventWriter(self.collection, request_id, self.batch_size)
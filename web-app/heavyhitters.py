@@ -0,0 +1,160 @@
+"""Bounded-memory top-K counting of tags, channels and categories (Space-Saving)."""
+
+import heapq
+
+
+class StatTotals:
+    """Watch time and view count for one channel or category."""
+
+    __slots__ = ("watchtime", "frequency")
+
+    def __init__(self, watchtime=0, frequency=0):
+        self.watchtime = watchtime
+        self.frequency = frequency
+
+    def toDict(self):
+        return {"watchtime": self.watchtime, "frequency": self.frequency}
+
+
+class TopK:
+    """The most frequent keys of a weighted stream, kept in at most ``capacity`` counters.
+
+    This is the Space-Saving algorithm (Metwally et al., 2005). While fewer
+    than ``capacity`` distinct keys have been seen every count is exact.
+    After that, a new key takes over the smallest counter and inherits its
+    count as ``error``. With ``total`` the summed weight of the stream:
+
+    - a kept key's ``frequency`` overstates its true count by at most its
+      ``error``, which is never more than ``total / capacity``;
+    - every key whose true count is above ``total / capacity`` is kept;
+    - ``watchtime`` only covers the views since the key was last admitted,
+      so it is a lower bound.
+
+    ``capacity=None`` is the exact mode: every key is kept, like a dict.
+    """
+
+    __slots__ = ("capacity", "total", "_counters", "_errors", "_heap")
+
+    def __init__(self, capacity=None):
+        self.capacity = capacity or None
+        self.total = 0
+        self._counters = {}
+        self._errors = {}
+        # (frequency, key) entries; stale ones are skipped when popped
+        self._heap = []
+
+    def __len__(self):
+        return len(self._counters)
+
+    def __contains__(self, key):
+        return key in self._counters
+
+    def __getitem__(self, key):
+        return self._counters[key]
+
+    def items(self):
+        return self._counters.items()
+
+    @property
+    def exact(self):
+        """True while no key has been evicted, i.e. every count is exact."""
+        return not self._errors
+
+    def error(self, key):
+        """How much ``key``'s frequency may overstate its true count."""
+        return self._errors.get(key, 0)
+
+    def add(self, key, frequency=1, watchtime=0):
+        totals = self._counters.get(key)
+        if totals is None:
+            if self.capacity is not None and len(self._counters) >= self.capacity:
+                floor = self._evict()
+                totals = self._counters[key] = StatTotals(0, floor)
+                self._errors[key] = floor
+            else:
+                totals = self._counters[key] = StatTotals()
+        totals.watchtime += watchtime
+        totals.frequency += frequency
+        self.total += frequency
+        if self.capacity is not None:
+            heapq.heappush(self._heap, (totals.frequency, key))
+            if len(self._heap) > 4 * self.capacity:
+                self._rebuildHeap()
+
+    def _rebuildHeap(self):
+        self._heap = [(totals.frequency, key) for key, totals in self._counters.items()]
+        heapq.heapify(self._heap)
+
+    def _evict(self):
+        """Drop the smallest counter; returns its frequency."""
+        while True:
+            frequency, key = heapq.heappop(self._heap)
+            totals = self._counters.get(key)
+            if totals is not None and totals.frequency == frequency:
+                del self._counters[key]
+                self._errors.pop(key, None)
+                return frequency
+
+    def _floor(self):
+        """Most any key not kept could have been counted."""
+        if self.capacity is None or len(self._counters) < self.capacity:
+            return 0
+        return min(totals.frequency for totals in self._counters.values())
+
+    def top(self, n=100):
+        """``[(key, StatTotals)]`` for the ``n`` most frequent keys, most frequent first."""
+        return heapq.nlargest(n, self._counters.items(), key=lambda item: item[1].frequency)
+
+    def merge(self, other):
+        """Fold ``other`` into this summary and return ``self``.
+
+        A key missing from a full summary may have been counted up to that
+        summary's smallest counter, which is added to its count and error,
+        so the merged summary keeps the bounds above for the combined stream.
+        """
+        if self.capacity is None and other.exact:
+            for key, totals in other.items():
+                self.add(key, totals.frequency, totals.watchtime)
+            return self
+
+        mine, theirs = self._floor(), other._floor()
+        merged = {}
+        for key in list(self._counters) + [key for key in other._counters if key not in self._counters]:
+            a, b = self._counters.get(key), other._counters.get(key)
+            merged[key] = (
+                StatTotals(
+                    (a.watchtime if a else 0) + (b.watchtime if b else 0),
+                    (a.frequency if a else mine) + (b.frequency if b else theirs),
+                ),
+                (self.error(key) if a else mine) + (other.error(key) if b else theirs),
+            )
+        kept = merged.items()
+        if self.capacity is not None and len(merged) > self.capacity:
+            kept = heapq.nlargest(self.capacity, kept, key=lambda item: item[1][0].frequency)
+        self._counters = {key: totals for key, (totals, _) in kept}
+        self._errors = {key: error for key, (_, error) in kept if error}
+        self.total += other.total
+        if self.capacity is not None:
+            self._rebuildHeap()
+        return self
+
+    def toDict(self):
+        """Capacity, stream total and non-zero errors; the counts themselves are stored by the caller."""
+        return {
+            "capacity": self.capacity,
+            "total": self.total,
+            "errors": [[key, error] for key, error in self._errors.items()],
+        }
+
+    @classmethod
+    def fromEntries(cls, entries, sketch=None):
+        """Rebuild from ``(key, StatTotals)`` pairs and ``toDict`` output."""
+        sketch = sketch or {}
+        topk = cls(sketch.get("capacity"))
+        for key, totals in entries:
+            topk._counters[key] = totals
+        topk.total = sketch.get("total", sum(totals.frequency for totals in topk._counters.values()))
+        topk._errors = dict(sketch.get("errors", ()))
+        if topk.capacity is not None:
+            topk._rebuildHeap()
+        return topk
@@ -0,0 +1,171 @@
+"""Incremental ingestion of repeat uploads from the same user."""
+
+import hashlib
+from datetime import datetime, timezone
+from pymongo.errors import DuplicateKeyError
+from config import DEFAULT_TIMEZONE
+from watchstats import WatchMetrics
+
+# newest records fingerprinted to recognise where the last upload left off
+BOUNDARY_SIZE = 8
+# merged uploads remembered per user, so re-running one changes nothing
+RECENT_JOBS = 20
+
+
+def fingerprint(record):
+    """Short stable hash of a raw Takeout record's video link and time."""
+    text = f"{record.get('titleUrl', '')}\x00{record.get('time', '')}"
+    return hashlib.blake2b(text.encode(), digest_size=8).hexdigest()
+
+
+def recordTime(record):
+    try:
+        return datetime.fromisoformat(record["time"].replace("Z", "+00:00"))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class Watermark:
+    """The newest event a user's stored aggregates include, and the records around it."""
+
+    __slots__ = ("latest", "boundary")
+
+    def __init__(self, latest=None, boundary=()):
+        self.latest = latest
+        self.boundary = list(boundary)
+
+    def toDict(self):
+        return {"latest": self.latest, "boundary": self.boundary}
+
+    @classmethod
+    def fromDict(cls, data):
+        latest = data.get("latest")
+        if latest is not None and latest.tzinfo is None:
+            # mongo hands datetimes back as naive UTC
+            latest = latest.replace(tzinfo=timezone.utc)
+        return cls(latest, data.get("boundary", ()))
+
+
+class DeltaReader:
+    """Passes on only the records of an export that are newer than ``watermark``.
+
+    Takeout lists the newest records first, so ``read`` stops at the first
+    record whose fingerprint the watermark recognises: it and everything
+    after it were ingested before, and ``continued`` becomes True. An export
+    that runs past the watermark without meeting one of its records is not a
+    continuation of the stored history (it was cleared, or someone else
+    uploaded from the same address), so all of it is passed on instead.
+    """
+
+    def __init__(self, watermark=None, boundary_size=BOUNDARY_SIZE):
+        self.watermark = watermark
+        self.boundary_size = boundary_size
+        self.continued = False
+        self._latest = None
+        self._boundary = []
+
+    def read(self, records):
+        latest = self.watermark.latest if self.watermark else None
+        known = set(self.watermark.boundary) if self.watermark else set()
+        for record in records:
+            time = recordTime(record)
+            key = fingerprint(record)
+            if latest is not None and time is not None and time <= latest:
+                if key in known:
+                    self.continued = True
+                    return
+                if time < latest:
+                    latest = None
+            if time is not None and (self._latest is None or time > self._latest):
+                self._latest = time
+            if len(self._boundary) < self.boundary_size:
+                self._boundary.append(key)
+            yield record
+
+    def next(self):
+        """The watermark to store once the records read so far are ingested."""
+        if not self.continued or self.watermark is None:
+            return Watermark(self._latest, self._boundary)
+        if self._latest is None:
+            return self.watermark
+        # topped up with the older records the last upload already fingerprinted
+        boundary = self._boundary + self.watermark.boundary[:self.boundary_size - len(self._boundary)]
+        return Watermark(max(self._latest, self.watermark.latest), boundary)
+
+
+class UserHistory:
+    """Each user's aggregated metrics and ingestion watermark, one document per user.
+
+    Documents look like ``{_id: user, watermark, metrics, event_count,
+    segments, version, jobs}``; ``segments`` lists the requests whose stored
+    events together make up the history. Updates are compare-and-set on ``version``, and
+    ``jobs`` lists the latest uploads merged so a retried job is a no-op.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def load(self, user):
+        return self.collection.find_one({"_id": user})
+
+    @staticmethod
+    def watermark(stored, timezone):
+        """Where to resume reading, or None to read a whole export.
+
+        Totals bucketed in another timezone can't be added to, so a user who
+        changed timezone gets everything rebuilt.
+        """
+        if not stored:
+            return None
+        stored_timezone = stored["metrics"].get("time_rollups", {}).get("timezone", DEFAULT_TIMEZONE)
+        if stored_timezone != timezone:
+            return None
+        return Watermark.fromDict(stored["watermark"])
+
+    @staticmethod
+    def segments(stored):
+        """The uploads whose events make up the stored history, oldest first."""
+        return stored.get("segments") or stored["jobs"][-1:]
+
+    def merge(self, user, job_id, stored, delta, reader, event_count):
+        """Fold one upload's ``delta`` metrics into the ``stored`` document.
+
+        A continuation's counters are added to the stored ones and its events
+        become the history's newest segment; any other export replaces them.
+        Returns the user's ``(metrics, event_count, segments)`` afterwards,
+        or None if another upload was merged since ``stored`` was loaded and
+        this one has to be read again.
+        """
+        if stored and job_id in stored.get("jobs", ()):
+            return stored["metrics"], stored["event_count"], UserHistory.segments(stored)
+        if stored and reader.continued:
+            metrics = WatchMetrics.fromDict(stored["metrics"]).merge(delta)
+            event_count += stored["event_count"]
+            segments = UserHistory.segments(stored) + [job_id]
+        else:
+            metrics = delta
+            segments = [job_id]
+        fields = {
+            "watermark": reader.next().toDict(),
+            "metrics": metrics.toDict(),
+            "event_count": event_count,
+            "segments": segments,
+        }
+
+        if stored is None:
+            try:
+                self.collection.insert_one({"_id": user, "version": 1, "jobs": [job_id], **fields})
+            except DuplicateKeyError:
+                return None
+        else:
+            result = self.collection.update_one(
+                {"_id": user, "version": stored["version"]},
+                {
+                    "$set": fields,
+                    "$inc": {"version": 1},
+                    "$push": {"jobs": {"$each": [job_id], "$slice": -RECENT_JOBS}},
+                },
+            )
+            if not result.matched_count:
+                return None
+        return fields["metrics"], event_count, segments
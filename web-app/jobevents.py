@@ -0,0 +1,162 @@
+"""Job progress notifications for the results event stream."""
+
+import logging
+import threading
+import time
+from bson import ObjectId
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid, OperationFailure, PyMongoError
+
+FINAL = ("done", "failed")
+
+logger = logging.getLogger(__name__)
+
+
+class JobEventFeed:
+    """Publishes job state changes and follows them for one request.
+
+    Followers use a MongoDB change stream on ``Request`` when the server
+    supports it (replica sets). On a standalone server they tail the capped
+    ``JobEvents`` collection, which both services append to.
+    """
+
+    def __init__(self, db, capped_bytes=8 * 1024 * 1024, poll_interval=1.0, await_ms=5000):
+        self.db = db
+        self.capped_bytes = capped_bytes
+        self.poll_interval = poll_interval
+        self.await_ms = await_ms
+        self._change_streams = None
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def ensureCollection(self):
+        """Create the capped ``JobEvents`` collection if it doesn't exist yet."""
+        if self._ready:
+            return
+        with self._lock:
+            if not self._ready:
+                try:
+                    self.db.create_collection("JobEvents", capped=True, size=self.capped_bytes)
+                except CollectionInvalid:
+                    pass
+                self._ready = True
+
+    def publish(self, request_id, status=None, progress=None):
+        self.ensureCollection()
+        event = {"request_id": request_id, "status": status}
+        if progress is not None:
+            event["progress"] = progress
+        self.db.JobEvents.insert_one(event)
+
+    def changeStreamsAvailable(self):
+        """Whether this server supports change streams; probed until it answers."""
+        if self._change_streams is None:
+            try:
+                with self.db.Request.watch(max_await_time_ms=1) as stream:
+                    stream.try_next()
+                self._change_streams = True
+            except OperationFailure:
+                self._change_streams = False
+            except PyMongoError:
+                # unreachable rather than unsupported; tail this time and ask again next time
+                logger.warning("Could not probe for change streams", exc_info=True)
+                return False
+        return self._change_streams
+
+    def follow(self, request_id, timeout, snapshot=None, after=None):
+        """Yield ``{status, progress, partial}`` updates for ``request_id``.
+
+        ``partial`` is set when the analyzer saved another finished section.
+        Updates read from ``JobEvents`` also carry the event's ``id``; passing
+        the last one back as ``after`` resumes from there instead of
+        replaying the request's events from the start.
+
+        ``snapshot()`` reads the request's current state. It is called once
+        the feed is already listening, so nothing written in between is lost,
+        and its result comes first; if that is None (no such request) or
+        final, nothing follows.
+
+        Yields None whenever nothing arrived for a while so callers can send
+        keep-alives. Stops after a final status or once ``timeout`` passes.
+        """
+        deadline = time.monotonic() + timeout
+        if self.changeStreamsAvailable():
+            updates = self._watchRequest(ObjectId(request_id), deadline, snapshot)
+        else:
+            after = ObjectId(after) if after and ObjectId.is_valid(after) else None
+            updates = self._tailEvents(ObjectId(request_id), deadline, snapshot, after)
+        if snapshot is not None:
+            state = next(updates)
+            yield state
+            if state is None or state.get("status") in FINAL:
+                updates.close()
+                return
+        for update in updates:
+            yield update
+            if update and update.get("status") in FINAL:
+                return
+
+    @staticmethod
+    def _update(fields, partial):
+        update = {"status": fields.get("status"), "progress": fields.get("progress")}
+        if partial:
+            update["partial"] = True
+        return update
+
+    def _watchRequest(self, request_id, deadline, snapshot=None):
+        pipeline = [{"$match": {"operationType": "update", "documentKey._id": request_id}}]
+        with self.db.Request.watch(pipeline, max_await_time_ms=self.await_ms) as stream:
+            if snapshot is not None:
+                yield snapshot()
+            while time.monotonic() < deadline:
+                change = stream.try_next()
+                if change is None:
+                    yield None
+                    continue
+                fields = change["updateDescription"]["updatedFields"]
+                partial = any(key.startswith("partial") for key in fields)
+                if "status" in fields or "progress" in fields or partial:
+                    yield self._update(fields, partial)
+
+    @staticmethod
+    def _since(after):
+        """Query for events from the second ``after`` was written in onwards.
+
+        Both services generate event ids, so ids written in the same second
+        don't sort in insertion order; re-reading that second can repeat an
+        update but never skips one.
+        """
+        return {"$gte": ObjectId.from_datetime(after.generation_time)}
+
+    def _tailEvents(self, request_id, deadline, snapshot=None, after=None):
+        self.ensureCollection()
+        # with no event to resume from, the request's events replay from the start, so none are missed
+        if snapshot is not None:
+            yield snapshot()
+        while time.monotonic() < deadline:
+            query = {"request_id": request_id}
+            if after is not None:
+                query["_id"] = self._since(after)
+            cursor = self.db.JobEvents.find(
+                query,
+                cursor_type=CursorType.TAILABLE_AWAIT,
+                max_await_time_ms=self.await_ms,
+            )
+            while cursor.alive and time.monotonic() < deadline:
+                event = cursor.try_next()
+                if event is None:
+                    yield None
+                    continue
+                if after is not None and event.get("_id") == after:
+                    continue
+                update = self._update(event, event.get("partial"))
+                if "_id" in event:
+                    after = event["_id"]
+                    update["id"] = str(after)
+                yield update
+            cursor.close()
+            # a tailable cursor dies when nothing matched yet; poll again shortly,
+            # picking up after the last event this follower has seen
+            if time.monotonic() < deadline:
+                yield None
+                time.sleep(self.poll_interval)
@@ -0,0 +1,130 @@
+"""Upload jobs queued in MongoDB and processed by background worker threads."""
+
+import logging
+from datetime import datetime, timedelta
+import gridfs
+from pymongo import ASCENDING, ReturnDocument
+from clients import resolve
+from leases import LeasedWorkers
+
+QUEUED = "queued"
+ENRICHING = "enriching"
+ANALYZING = "analyzing"
+DONE = "done"
+FAILED = "failed"
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue(LeasedWorkers):
+    """Queue of uploads kept on the ``Request`` documents themselves.
+
+    ``submit`` stores the upload in GridFS and inserts a ``queued`` request;
+    worker threads claim requests atomically with ``find_one_and_update`` and
+    hand them to ``handler(job, queue)``. A claim is a lease, renewed while
+    the handler runs: if a worker dies mid-job the request is picked up again
+    once ``lease_seconds`` have passed, up to ``max_attempts`` claims.
+    """
+
+    collection = "Request"
+    index = [("status", ASCENDING), ("Timestamp", ASCENDING)]
+    thread_name = "job-worker"
+
+    def __init__(self, db, handler, workers=2, max_attempts=3, lease_seconds=900, poll_interval=1.0, events=None):
+        super().__init__(db, workers=workers, lease_seconds=lease_seconds, poll_interval=poll_interval)
+        self.handler = handler
+        self.events = events
+        self.max_attempts = max_attempts
+
+    def _files(self):
+        return gridfs.GridFS(resolve(self.db), collection="uploads")
+
+    def submit(self, file, trace_id=None, user=None, timezone=None):
+        """Store an uploaded file and queue it; returns the job (request) id."""
+        file_id = self._files().put(file, filename=file.filename)
+        inserted = self.db.Request.insert_one({
+            "Timestamp": datetime.now(),
+            "status": QUEUED,
+            "progress": 0,
+            "file_id": file_id,
+            "trace_id": trace_id,
+            "user": user,
+            "timezone": timezone,
+            "analysis": None
+        })
+        return str(inserted.inserted_id)
+
+    def handOff(self, job_id, trace_id=None):
+        """Queue the job for the open-ai service, which consumes ``AnalysisTask``."""
+        now = datetime.now()
+        self.db.AnalysisTask.insert_one({
+            "request_id": job_id,
+            "trace_id": trace_id,
+            "status": "pending",
+            "attempts": 0,
+            "created_at": now,
+            "not_before": now,
+        })
+
+    def openUpload(self, job):
+        """Return a readable stream over the job's uploaded file."""
+        return self._files().get(job["file_id"])
+
+    def discardUpload(self, job):
+        self._files().delete(job["file_id"])
+
+    def claim(self, worker_id):
+        """Atomically take the oldest queued (or abandoned) job, or None."""
+        now = datetime.now()
+        return self.db.Request.find_one_and_update(
+            {"$or": [
+                {"status": QUEUED},
+                {"status": ENRICHING, "lease_until": {"$lt": now}},
+            ]},
+            {
+                "$set": {
+                    "status": ENRICHING,
+                    "worker": worker_id,
+                    "lease_until": now + timedelta(seconds=self.lease_seconds),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("Timestamp", ASCENDING)],
+            projection={"file_id": 1, "trace_id": 1, "user": 1, "timezone": 1, "attempts": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def update(self, job_id, **fields):
+        """Record progress (or any other field) on a job."""
+        self.db.Request.update_one({"_id": job_id}, {"$set": fields})
+        if self.events and ("status" in fields or "progress" in fields):
+            self.events.publish(job_id, fields.get("status"), fields.get("progress"))
+
+    def fail(self, job_id, error):
+        self.update(job_id, status=FAILED, error=str(error))
+
+    def giveUp(self, job, error):
+        """Fail a job for good and delete its upload, which nothing will read again."""
+        self.fail(job["_id"], error)
+        try:
+            self.discardUpload(job)
+        except Exception:
+            logger.exception("Could not delete the upload of job %s", job["_id"])
+
+    def runOnce(self, worker_id):
+        """Claim and process a single job; returns False when the queue is empty."""
+        job = self.claim(worker_id)
+        if job is None:
+            return False
+        if job.get("attempts", 1) > self.max_attempts:
+            # its workers keep dying on it; don't let it take down the next one
+            logger.error("Job %s abandoned after %d attempts", job["_id"], self.max_attempts)
+            self.giveUp(job, f"abandoned after {self.max_attempts} attempts")
+            return True
+        try:
+            with self.heartbeat(job["_id"], worker_id):
+                self.handler(job, self)
+        except Exception as e:
+            logger.exception("Job %s failed", job["_id"])
+            self.giveUp(job, e)
+        return True
@@ -0,0 +1,67 @@
+"""Multi-process parsing of large watch histories."""
+
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from config import DEFAULT_TIMEZONE
+from takeout import parseWatchRecord
+from watchstats import WatchMetrics
+
+
+def summarizeEvents(events, timezone=DEFAULT_TIMEZONE):
+    """Build the time rollups and per-video view counts for some events.
+
+    Returns ``(partial, views)``: a ``WatchMetrics`` holding only the time
+    rollups (in ``timezone``), and ``{video_id: views}`` in first-seen order.
+    """
+    partial = WatchMetrics(timezone)
+    partial.addWatches(event["timestamp"] for event in events)
+    views = {}
+    for event in events:
+        views[event["video_id"]] = views.get(event["video_id"], 0) + 1
+    return partial, views
+
+
+def parseRows(rows, timezone=DEFAULT_TIMEZONE):
+    """Parse ``(titleUrl, time)`` rows in a worker process.
+
+    Returns ``(events, partial, views)`` for the chunk; see ``summarizeEvents``.
+    """
+    events = []
+    for title_url, time in rows:
+        event = parseWatchRecord({"titleUrl": title_url, "time": time})
+        if event is not None:
+            events.append(event)
+    partial, views = summarizeEvents(events, timezone)
+    return events, partial, views
+
+
+def iterRows(records, chunk_size):
+    """Group the records that link to a video into lists of ``(titleUrl, time)``."""
+    rows = []
+    for record in records:
+        if "titleUrl" in record:
+            rows.append((record["titleUrl"], record["time"]))
+            if len(rows) >= chunk_size:
+                yield rows
+                rows = []
+    if rows:
+        yield rows
+
+
+def iterParsedChunks(records, workers, chunk_size, timezone=DEFAULT_TIMEZONE):
+    """Parse ``records`` on a process pool, yielding ``parseRows`` results in order.
+
+    At most ``2 * workers`` chunks are in flight, so a streamed upload is
+    still read incrementally. Workers are spawned rather than forked so they
+    never inherit the parent's Mongo client or threads.
+    """
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        pending = deque()
+        for rows in iterRows(records, chunk_size):
+            pending.append(pool.submit(parseRows, rows, timezone))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -0,0 +1,83 @@
+"""YouTube Data API quota shared by every worker through MongoDB."""
+
+import time
+from pymongo import ReturnDocument
+
+GLOBAL = "global"
+DAY = 24 * 3600
+
+
+class QuotaGovernor:
+    """Token buckets of quota units: one for the API key, one per user.
+
+    Each bucket holds up to a day's budget and refills continuously at
+    ``limit / day``. Buckets live in ``collection`` as
+    ``{_id, tokens, updated_at}`` and are refilled and debited in a single
+    pipeline update, so concurrent workers in any process never overspend.
+    """
+
+    def __init__(self, collection, daily_limit, user_daily_limit):
+        self.collection = collection
+        self.daily_limit = daily_limit
+        self.user_daily_limit = user_daily_limit
+
+    def _take(self, key, capacity, units):
+        """Atomically refill bucket ``key`` and take up to ``units`` whole units from it."""
+        now = time.time()
+        rate = capacity / DAY
+        refilled = {"$min": [
+            capacity,
+            {"$add": [
+                {"$ifNull": ["$tokens", capacity]},
+                {"$multiply": [{"$subtract": [now, {"$ifNull": ["$updated_at", now]}]}, rate]},
+            ]},
+        ]}
+        bucket = self.collection.find_one_and_update(
+            {"_id": key},
+            [
+                {"$set": {"tokens": refilled, "updated_at": now}},
+                {"$set": {"granted": {"$max": [0, {"$min": [units, {"$floor": "$tokens"}]}]}}},
+                {"$set": {"tokens": {"$subtract": ["$tokens", "$granted"]}}},
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return int(bucket["granted"])
+
+    def _giveBack(self, key, units):
+        if units:
+            self.collection.update_one({"_id": key}, {"$inc": {"tokens": units}})
+
+    def reserve(self, user, units):
+        """Take up to ``units`` from both ``user``'s and the global bucket; returns the units granted."""
+        if units <= 0:
+            return 0
+        user_key = f"user:{user}"
+        granted = self._take(user_key, self.user_daily_limit, units)
+        if not granted:
+            return 0
+        allowed = self._take(GLOBAL, self.daily_limit, granted)
+        self._giveBack(user_key, granted - allowed)
+        return allowed
+
+    def settle(self, user, reserved, spent):
+        """Square a reservation made for ``user`` with the units actually spent.
+
+        Units not spent (failed or unsent requests) go back to both buckets;
+        retries beyond the reservation are taken from both, which can leave
+        a bucket below zero until it refills.
+        """
+        self._giveBack(f"user:{user}", reserved - spent)
+        self._giveBack(GLOBAL, reserved - spent)
+
+    def exhaust(self):
+        """Empty the global bucket after the API itself reported the quota used up."""
+        self.collection.update_one({"_id": GLOBAL}, {"$set": {"tokens": 0, "updated_at": time.time()}}, upsert=True)
+
+    def remaining(self, user=None):
+        """Units left (as of the last update) in the global bucket, or in ``user``'s."""
+        key = GLOBAL if user is None else f"user:{user}"
+        bucket = self.collection.find_one({"_id": key}, {"tokens": 1})
+        if bucket is None:
+            return self.daily_limit if user is None else self.user_daily_limit
+        return int(bucket["tokens"])
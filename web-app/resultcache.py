@@ -0,0 +1,41 @@
+"""In-process cache of finished results pages."""
+
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+
+CachedResult = namedtuple("CachedResult", ["analysis", "html", "etag", "last_modified"])
+
+
+class ResultCache:
+    """LRU of rendered results pages keyed by request id.
+
+    Only final results are stored; they never change afterwards, so the
+    cached page and its validators can be served until evicted.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, request_id):
+        with self._lock:
+            entry = self._entries.get(request_id)
+            if entry is not None:
+                self._entries.move_to_end(request_id)
+            return entry
+
+    def put(self, request_id, analysis, html, last_modified):
+        """Cache a rendered page; its ETag is a digest of the HTML."""
+        etag = hashlib.sha1(html.encode("utf-8")).hexdigest()
+        entry = CachedResult(analysis, html, etag, last_modified)
+        with self._lock:
+            self._entries[request_id] = entry
+            self._entries.move_to_end(request_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def __len__(self):
+        return len(self._entries)
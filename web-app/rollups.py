@@ -0,0 +1,155 @@
+"""Watch counts by hour, weekday, day and month in the user's own timezone."""
+
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# zones only ever change offset on a quarter hour
+OFFSET_STEP = 900
+DAY = 86400
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# 1970-01-01 was a Thursday
+EPOCH_WEEKDAY = 3
+
+
+def isTimezone(name):
+    """Whether ``name`` is an IANA timezone we have data for."""
+    if not name or not isinstance(name, str):
+        return False
+    try:
+        ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+    return True
+
+
+class TimeRollups:
+    """Watch events bucketed by local hour, weekday, day and month.
+
+    Timestamps are epoch seconds. The UTC offset is looked up once per UTC
+    day, or per quarter hour on days the zone changes offset, and calendar
+    dates once per local day, so a batch costs a few integer operations per
+    event. Day totals are kept as ISO dates, which makes range queries a
+    pair of bisects over their running sums.
+    """
+
+    __slots__ = ("timezone", "zone", "hourly", "weekday", "daily", "monthly", "_offsets", "_index")
+
+    def __init__(self, timezone):
+        self.timezone = timezone
+        self.zone = ZoneInfo(timezone)
+        self.hourly = array("q", bytes(24 * 8))
+        self.weekday = array("q", bytes(7 * 8))  # Monday == 0
+        self.daily = Counter()
+        self.monthly = Counter()
+        self._offsets = {}
+        self._index = None
+
+    def _utcoffset(self, timestamp):
+        return int(datetime.fromtimestamp(timestamp, self.zone).utcoffset().total_seconds())
+
+    def _offset(self, timestamp):
+        day = timestamp // DAY
+        offset = self._offsets.get(day)
+        if offset is None:
+            first, last = self._utcoffset(day * DAY), self._utcoffset((day + 1) * DAY - 1)
+            # -1 marks a day the offset changes on
+            offset = self._offsets[day] = first if first == last else -1
+        if offset == -1:
+            return self._utcoffset(timestamp // OFFSET_STEP * OFFSET_STEP)
+        return offset
+
+    def add(self, timestamps):
+        """Bucket a batch of epoch-second timestamps."""
+        offset = self._offset
+        local = [timestamp + offset(timestamp) for timestamp in timestamps]
+        self._count(Counter([seconds // 3600 % 24 for seconds in local]), Counter([seconds // DAY for seconds in local]))
+
+    def addSorted(self, timestamps):
+        """Bucket ascending epoch-second timestamps, such as a column of them.
+
+        Each run of events in the same local hour is counted with one bisect
+        rather than event by event, so a history costs per hour watched.
+        """
+        hours, days = Counter(), Counter()
+        i, n = 0, len(timestamps)
+        while i < n:
+            timestamp = timestamps[i]
+            offset = self._offset(timestamp)
+            local = timestamp + offset
+            # the run ends with the local hour, or where the offset may change
+            end = min(local - local % 3600 + 3600 - offset, (timestamp // DAY + 1) * DAY)
+            if self._offsets[timestamp // DAY] == -1:
+                end = min(end, (timestamp // OFFSET_STEP + 1) * OFFSET_STEP)
+            j = bisect_left(timestamps, end, i + 1, n)
+            hours[local // 3600 % 24] += j - i
+            days[local // DAY] += j - i
+            i = j
+        self._count(hours, days)
+
+    def _count(self, hours, days):
+        for hour, count in hours.items():
+            self.hourly[hour] += count
+        for day, count in days.items():
+            self.weekday[(day + EPOCH_WEEKDAY) % 7] += count
+            iso = date.fromordinal(EPOCH_ORDINAL + day).isoformat()
+            self.daily[iso] += count
+            self.monthly[iso[:7]] += count
+        self._index = None
+
+    def merge(self, other):
+        """Fold ``other`` (bucketed in the same timezone) into these rollups."""
+        if other.timezone != self.timezone:
+            raise ValueError(f"cannot merge {other.timezone} rollups into {self.timezone}")
+        for i, count in enumerate(other.hourly):
+            self.hourly[i] += count
+        for i, count in enumerate(other.weekday):
+            self.weekday[i] += count
+        self.daily.update(other.daily)
+        self.monthly.update(other.monthly)
+        self._index = None
+        return self
+
+    def _cumulative(self):
+        if self._index is None:
+            days = sorted(self.daily)
+            totals = [0]
+            for day in days:
+                totals.append(totals[-1] + self.daily[day])
+            self._index = (days, totals)
+        return self._index
+
+    def between(self, start=None, end=None):
+        """Watch events on local days from ``start`` up to, not including, ``end``."""
+        days, totals = self._cumulative()
+        lo = 0 if start is None else bisect_left(days, str(start))
+        hi = len(days) if end is None else bisect_left(days, str(end))
+        return totals[max(lo, hi)] - totals[lo]
+
+    def today(self):
+        return datetime.now(self.zone).date()
+
+    def lastDays(self, days, today=None):
+        """Watch events in the ``days`` local days up to and including ``today``."""
+        today = today or self.today()
+        return self.between(today - timedelta(days=days - 1), today + timedelta(days=1))
+
+    def toDict(self):
+        return {
+            "timezone": self.timezone,
+            "hourly": list(self.hourly),
+            "weekday": list(self.weekday),
+            "daily": sorted([day, count] for day, count in self.daily.items()),
+            "monthly": sorted([month, count] for month, count in self.monthly.items()),
+        }
+
+    @classmethod
+    def fromDict(cls, data):
+        rollups = cls(data["timezone"])
+        rollups.hourly = array("q", data["hourly"])
+        rollups.weekday = array("q", data["weekday"])
+        rollups.daily = Counter(dict(data["daily"]))
+        rollups.monthly = Counter(dict(data["monthly"]))
+        return rollups
@@ -0,0 +1,116 @@
+"""Incremental reader for Google Takeout watch-history exports."""
+
+import codecs
+import json
+import re
+from datetime import datetime
+
+READ_SIZE = 64 * 1024
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r"[ \t\n\r]*")
+_video_id = re.compile(r"v=(.{11})")
+
+
+def iterTakeoutRecords(stream, read_size=READ_SIZE):
+    """Yield the objects of the top-level JSON array in ``stream`` one at a time.
+
+    Only the record being decoded (plus at most ``read_size`` bytes of
+    look-ahead) is held in memory, so peak usage does not grow with the size
+    of the export. ``stream`` is anything with ``read(n)`` returning bytes,
+    e.g. a Flask ``FileStorage`` or ``io.BytesIO``.
+    """
+    text = codecs.getincrementaldecoder("utf-8-sig")()
+    buf = ""
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buf, pos, eof
+        data = stream.read(read_size)
+        if not data:
+            eof = True
+            buf = buf[pos:] + text.decode(b"", final=True)
+        else:
+            buf = buf[pos:] + text.decode(data)
+        pos = 0
+
+    def skip(chars):
+        # advance past whitespace and any of ``chars``; returns the next char
+        nonlocal pos
+        while True:
+            pos = _whitespace.match(buf, pos).end()
+            if pos < len(buf):
+                if buf[pos] not in chars:
+                    return buf[pos]
+                pos += 1
+            elif eof:
+                return ""
+            else:
+                fill()
+
+    if skip("") != "[":
+        raise ValueError("Watch history must be a JSON array.")
+    pos += 1
+
+    while True:
+        char = skip(",")
+        if char == "]":
+            return
+        if not char:
+            raise ValueError("Unexpected end of watch history.")
+        while True:
+            try:
+                record, end = _decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+            # a scalar cut off at the buffer edge can still decode; re-read to be sure
+            if end == len(buf) and not eof:
+                fill()
+                continue
+            break
+        pos = end
+        yield record
+
+
+def parseWatchRecord(record):
+    """Turn one Takeout record into a ``{video_id, timestamp}`` event, or None."""
+    if "titleUrl" not in record:
+        return None
+
+    title_url = record["titleUrl"].encode().decode('unicode_escape')
+    match = _video_id.search(title_url)
+    if not match:
+        return None
+
+    return {
+        "video_id": match.group(1),
+        "timestamp": datetime.fromisoformat(record["time"].replace("Z", "+00:00"))
+    }
+
+
+def iterWatchEvents(stream, read_size=READ_SIZE):
+    """Yield ``{video_id, timestamp}`` events straight from an upload stream."""
+    for record in iterTakeoutRecords(stream, read_size):
+        event = parseWatchRecord(record)
+        if event is not None:
+            yield event
+
+
+def dedupeWatchEvents(events):
+    """Collapse watch events into ``{video_id: {views, timestamps}}``.
+
+    The result keeps first-seen order, so every unique video can be looked up
+    once and its metadata weighted by how many times it was watched.
+    """
+    watched = {}
+    for event in events:
+        watch = watched.get(event["video_id"])
+        if watch is None:
+            watch = watched[event["video_id"]] = {"views": 0, "timestamps": []}
+        watch["views"] += 1
+        watch["timestamps"].append(event["timestamp"])
+    return watched
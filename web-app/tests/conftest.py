@@ -29,6 +29,9 @@ from unittest.mock import patch
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 import app  # web-app/app.py
+from videocache import VideoLRUCache
+from resultcache import ResultCache
+from columnar import EventColumnStore
 
 
 @pytest.fixture
@@ -38,13 +41,41 @@ def mock_db():
 
 
 @pytest.fixture
-def mock_requests_post():
-    with patch("app.requests.post") as mock_post:
-        yield mock_post
+def mock_quota():
+    with patch("app.quota") as mock_quota:
+        # unlimited unless a test says otherwise
+        mock_quota.reserve.side_effect = lambda user, units: units
+        yield mock_quota
 
 
 @pytest.fixture
-def client(mock_db, mock_requests_post):
+def mock_video_cache(mock_quota):
+    with patch("app.videoCache") as mock_cache, \
+            patch("app.videoLRU", VideoLRUCache(1024 * 1024, 60)):
+        mock_cache.getMany.return_value = {}
+        yield mock_cache
+
+
+@pytest.fixture(autouse=True)
+def event_columns(tmp_path):
+    with patch("app.eventColumns", EventColumnStore(str(tmp_path / "columns"))) as store:
+        yield store
+
+
+@pytest.fixture
+def mock_jobs():
+    with patch("app.jobs") as mock_jobs:
+        yield mock_jobs
+
+
+@pytest.fixture
+def result_cache():
+    with patch("app.resultCache", ResultCache(16)) as cache:
+        yield cache
+
+
+@pytest.fixture
+def client(mock_db, mock_jobs, result_cache):
     app.app.config["TESTING"] = True
     app.app.secret_key = "test"
     with app.app.test_client() as client:
@@ -0,0 +1,81 @@
+"""Testing web-app/clients.py file."""
+
+import os
+import subprocess
+import sys
+from unittest.mock import MagicMock, patch
+import pytest
+from clients import ClientRegistry, resolve
+
+APP_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+
+def registryWith(factory, check=None):
+    registry = ClientRegistry()
+    registry.register("mongo", factory, check)
+    return registry
+
+
+def test_clients_are_built_on_first_use_only():
+    factory = MagicMock()
+    registry = registryWith(factory)
+    db = registry.lazy("mongo", "youtube_history")
+    collection = db["Request"]
+    factory.assert_not_called()
+
+    collection.find_one({"_id": 1})
+    db.Request.count_documents({})
+    factory.assert_called_once_with()
+    factory.return_value.__getitem__.return_value.__getitem__.return_value.find_one.assert_called_once_with({"_id": 1})
+    assert resolve(collection) is factory.return_value["youtube_history"]["Request"]
+
+
+def test_attributes_set_on_a_lazy_client_reach_the_real_one():
+    registry = registryWith(lambda: MagicMock(spec=["fetchBatches"]))
+    youtube = registry.lazy("mongo")
+    with patch.object(youtube, "fetchBatches", return_value=[]) as fetch:
+        assert registry.get("mongo").fetchBatches is fetch
+    assert registry.get("mongo").fetchBatches is not fetch
+
+
+def test_forked_process_builds_its_own_client():
+    registry = registryWith(object)
+    parent = registry.get("mongo")
+    registry._pid = -1  # as if this process had been forked
+    assert registry.get("mongo") is not parent
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_fork_forgets_parent_clients():
+    registry = registryWith(object)
+    parent = registry.get("mongo")
+    pid = os.fork()
+    if pid == 0:
+        os._exit(0 if registry._clients == {} and registry.get("mongo") is not parent else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+
+
+def test_health_and_warm_up_report_each_client():
+    check = MagicMock(side_effect=[None, ConnectionError("no route")])
+    registry = registryWith(MagicMock, check)
+    registry.register("youtube", MagicMock)
+
+    health = registry.warmUp()
+    assert health["mongo"]["ok"] and health["youtube"]["ok"]
+    health = registry.health(["mongo"])
+    assert health["mongo"] == {"ok": False, "error": "ConnectionError: no route", "seconds": health["mongo"]["seconds"]}
+
+
+def test_close_closes_built_clients():
+    registry = registryWith(MagicMock)
+    client = registry.get("mongo")
+    registry.close()
+    client.close.assert_called_once_with()
+    assert registry.get("mongo") is not client
+
+
+def test_importing_the_app_connects_to_nothing():
+    code = "import app; print(sorted(app.clients._clients))"
+    output = subprocess.run([sys.executable, "-c", code], cwd=APP_DIR, capture_output=True, text=True, check=True)
+    assert output.stdout.strip() == "[]"
@@ -0,0 +1,151 @@
+"""Testing web-app/columnar.py file."""
+
+import os
+import time
+from datetime import datetime, timedelta, timezone
+import pytest
+from columnar import EventColumns, EventColumnStore, EventColumnsWriter, EventHistory
+from watchstats import WatchMetrics
+
+
+def item(video_id, duration, channel, category="22"):
+    return {
+        "id": video_id,
+        "contentDetails": {"duration": duration},
+        "snippet": {"channelTitle": channel, "categoryId": category},
+    }
+
+
+VIDEOS = {
+    "aaaaaaaaaaa": item("aaaaaaaaaaa", "PT10M", "A"),
+    "bbbbbbbbbbb": item("bbbbbbbbbbb", "PT2M", "B", "10"),
+    "ccccccccccc": item("ccccccccccc", "PT7H", "A"),
+}
+
+
+def events():
+    start = datetime(2023, 10, 1, tzinfo=timezone.utc)
+    # newest first, like Takeout; "ddddddddddd" has no metadata
+    ids = ["aaaaaaaaaaa", "bbbbbbbbbbb", "aaaaaaaaaaa", "ccccccccccc", "ddddddddddd"]
+    return [{"video_id": video_id, "timestamp": start + timedelta(hours=30 * (5 - i))} for i, video_id in enumerate(ids)]
+
+
+@pytest.fixture
+def columns(tmp_path):
+    writer = EventColumnsWriter()
+    writer.extend(events()[:2], VIDEOS)
+    writer.extend(events()[2:], VIDEOS)
+    store = EventColumnStore(str(tmp_path))
+    store.save("req", writer)
+    with store.open("req") as opened:
+        yield opened
+
+
+def test_columns_are_sorted_and_interned(columns):
+    assert len(columns) == 5
+    assert list(columns.timestamps) == sorted(columns.timestamps)
+    assert columns.timestamps.format == "q"
+    assert [columns.names["videos"][v] for v in columns.videos] == [e["video_id"] for e in reversed(events())]
+    assert columns.names["channels"] == ["A", "B"]
+    assert columns.channels[0] == -1
+    assert columns.durations[-1] == 600.0
+
+
+@pytest.mark.parametrize("order", [[0, 1, 2, 3, 4], [4, 3, 2, 1, 0], [2, 0, 4, 1, 3]])
+def test_any_input_order_is_written_sorted(tmp_path, order):
+    writer = EventColumnsWriter()
+    writer.extend([events()[i] for i in order], VIDEOS)
+    store = EventColumnStore(str(tmp_path))
+    store.save("req", writer)
+    with store.open("req") as columns:
+        assert list(columns.timestamps) == sorted(columns.timestamps)
+        assert [columns.names["videos"][v] for v in columns.videos] == [e["video_id"] for e in reversed(events())]
+        assert list(columns.durations) == [0.0, 25200.0, 600.0, 120.0, 600.0]
+
+
+def test_history_reads_its_segments_as_one(columns, tmp_path):
+    writer = EventColumnsWriter()
+    writer.extend([{"video_id": "bbbbbbbbbbb", "timestamp": datetime(2023, 10, 9, tzinfo=timezone.utc)}], VIDEOS)
+    store = EventColumnStore(str(tmp_path / "segments"))
+    store.save("older", writer)
+    store.save("newer", writer)
+
+    assert store.openHistory(["missing"]) is None
+    with store.openHistory(["older", "missing", "newer"]) as history:
+        assert len(history) == 2
+        assert history.count(end=datetime(2023, 10, 9, tzinfo=timezone.utc)) == 0
+        assert history.topChannels(1) == [("B", {"watchtime": 240.0, "frequency": 2})]
+        assert sum(history.rollups().hourly) == 2
+    with EventHistory([columns, store.open("newer")]) as history:
+        assert history.topChannels(2) == [("A", {"watchtime": 1200.0, "frequency": 2}), ("B", {"watchtime": 240.0, "frequency": 2})]
+
+
+def test_touch_restarts_expiry(tmp_path):
+    store = EventColumnStore(str(tmp_path), ttl_seconds=3600)
+    store.save("old", EventColumnsWriter())
+    an_hour_ago = time.time() - 7200
+    os.utime(tmp_path / "old.cols", (an_hour_ago, an_hour_ago))
+    store.touch(["old", "missing"])
+    assert store.prune() == 0
+
+
+def test_histograms_match_watch_metrics(columns):
+    metrics = WatchMetrics()
+    for event in events():
+        metrics.addWatch(event["timestamp"])
+    rollups = columns.rollups()
+    assert rollups.hourly == metrics.hourly_watchtime
+    assert rollups.weekday == metrics.weekday_watchtime
+    assert columns.rollups(timezone="Asia/Tokyo").daily != rollups.daily
+
+
+def test_rankings_skip_unknown_and_overlong_videos(columns):
+    assert columns.topChannels() == [
+        ("A", {"watchtime": 1200.0, "frequency": 2}),
+        ("B", {"watchtime": 120.0, "frequency": 1}),
+    ]
+    assert columns.topCategories(1) == [("22", {"watchtime": 1200.0, "frequency": 2})]
+
+
+def test_date_range_slices_rows(columns):
+    start = datetime(2023, 10, 4, tzinfo=timezone.utc)
+    lo, hi = columns.rows(start)
+    assert hi - lo == 3
+    assert sum(columns.rollups(start).hourly) == 3
+    assert columns.rows(start, start) == (lo, lo)
+    assert columns.topChannels(start=datetime(2023, 10, 7, tzinfo=timezone.utc)) == [
+        ("A", {"watchtime": 600.0, "frequency": 1}),
+    ]
+
+
+def test_empty_and_missing_files(tmp_path):
+    store = EventColumnStore(str(tmp_path))
+    assert store.open("nothing") is None
+    store.save("empty", EventColumnsWriter())
+    with store.open("empty") as empty:
+        assert len(empty) == 0
+        assert list(empty.rollups().hourly) == [0] * 24
+
+
+def test_expired_files_are_pruned_when_saving(tmp_path):
+    store = EventColumnStore(str(tmp_path), ttl_seconds=3600)
+    store.save("old", EventColumnsWriter())
+    (tmp_path / "old.cols.tmp").write_bytes(b"")
+    (tmp_path / "notes.txt").write_bytes(b"")
+    an_hour_ago = time.time() - 7200
+    for name in ("old.cols", "old.cols.tmp", "notes.txt"):
+        os.utime(tmp_path / name, (an_hour_ago, an_hour_ago))
+
+    # checked at most once per prune_interval
+    store.save("new", EventColumnsWriter())
+    assert store.open("old") is not None
+    store._pruned_at -= store.prune_interval
+    store.save("newer", EventColumnsWriter())
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["new.cols", "newer.cols", "notes.txt"]
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "bad.cols"
+    path.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError):
+        EventColumns(str(path))
@@ -0,0 +1,46 @@
+"""Testing web-app/eventstore.py file."""
+
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+from bson import ObjectId
+from eventstore import WatchEventStore
+
+
+def events(count):
+    timestamp = datetime(2023, 10, 1, tzinfo=timezone.utc)
+    return [{"video_id": f"video{i:06d}", "timestamp": timestamp} for i in range(count)]
+
+
+def test_writer_inserts_ordered_batches():
+    collection = MagicMock()
+    store = WatchEventStore(collection, batch_size=4)
+    request_id = ObjectId()
+
+    writer = store.writer(request_id)
+    writer.write(events(3))
+    writer.write(events(6))
+    writer.flush()
+
+    collection.delete_many.assert_called_once_with({"request_id": request_id})
+    sizes = [len(call.args[0]) for call in collection.insert_many.call_args_list]
+    assert sizes == [4, 4, 1]
+    assert all(call.kwargs == {"ordered": True} for call in collection.insert_many.call_args_list)
+    assert writer.count == 9
+    first = collection.insert_many.call_args_list[0].args[0][0]
+    assert first == {"request_id": request_id, "video_id": "video000000", "timestamp": events(1)[0]["timestamp"]}
+
+
+def test_index_created_once():
+    collection = MagicMock()
+    store = WatchEventStore(collection)
+    store.writer(ObjectId())
+    store.writer(ObjectId())
+    collection.create_index.assert_called_once_with([("request_id", 1), ("timestamp", 1)])
+
+
+def test_flush_without_events_writes_nothing():
+    collection = MagicMock()
+    writer = WatchEventStore(collection).writer(ObjectId())
+    writer.flush()
+    collection.insert_many.assert_not_called()
+    assert writer.count == 0
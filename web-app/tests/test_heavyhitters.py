@@ -0,0 +1,91 @@
+"""Testing web-app/heavyhitters.py file."""
+
+import random
+from collections import Counter
+from heavyhitters import StatTotals, TopK
+
+
+def zipfStream(length, keys=2000, seed=7):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(keys)]
+    return rng.choices([f"tag{rank}" for rank in range(keys)], weights, k=length)
+
+
+def checkBounds(topk, truth):
+    total = sum(truth.values())
+    assert topk.total == total
+    assert len(topk) <= topk.capacity
+    for key, totals in topk.items():
+        assert truth[key] <= totals.frequency <= truth[key] + topk.error(key)
+        assert topk.error(key) <= total / topk.capacity
+    # everything heavier than total / capacity survives
+    for key, count in truth.items():
+        if count > total / topk.capacity:
+            assert key in topk
+
+
+def test_exact_mode_counts_everything():
+    topk = TopK()
+    for key in zipfStream(3000):
+        topk.add(key)
+    truth = Counter(zipfStream(3000))
+    assert len(topk) == len(truth)
+    assert {key: totals.frequency for key, totals in topk.items()} == dict(truth)
+    assert [key for key, _ in topk.top(5)] == [key for key, _ in truth.most_common(5)]
+    assert topk.exact
+
+
+def test_bounded_memory_keeps_heavy_hitters_within_error_bounds():
+    stream = zipfStream(20000)
+    topk = TopK(100)
+    for key in stream:
+        topk.add(key, watchtime=60)
+
+    assert not topk.exact
+    checkBounds(topk, Counter(stream))
+    assert [key for key, _ in topk.top(3)] == ["tag0", "tag1", "tag2"]
+    # watch time only counts views since the key was last admitted
+    assert all(totals.watchtime <= 60 * totals.frequency for _, totals in topk.items())
+
+
+def test_small_input_stays_exact_under_capacity():
+    topk = TopK(10)
+    for key, weight in [("a", 3), ("b", 1), ("a", 2)]:
+        topk.add(key, weight)
+    assert topk.exact
+    assert topk["a"].frequency == 5
+    assert [key for key, _ in topk.top(1)] == ["a"]
+
+
+def test_merge_of_bounded_summaries_keeps_bounds():
+    first, second = zipfStream(10000, seed=1), zipfStream(10000, seed=2)
+    left, right = TopK(100), TopK(100)
+    for key in first:
+        left.add(key)
+    for key in second:
+        right.add(key)
+
+    checkBounds(left.merge(right), Counter(first) + Counter(second))
+
+
+def test_merge_exact_summaries_matches_one_pass():
+    left, right, serial = TopK(), TopK(), TopK()
+    for i, key in enumerate(zipfStream(500)):
+        (left if i % 2 else right).add(key, 1, 10)
+        serial.add(key, 1, 10)
+    merged = right.merge(left)
+    assert {k: (t.frequency, t.watchtime) for k, t in merged.items()} == {k: (t.frequency, t.watchtime) for k, t in serial.items()}
+
+
+def test_round_trip_through_entries():
+    topk = TopK(50)
+    for key in zipfStream(5000):
+        topk.add(key)
+    restored = TopK.fromEntries(
+        ((key, StatTotals(totals.watchtime, totals.frequency)) for key, totals in topk.items()), topk.toDict(),
+    )
+    assert restored.capacity == 50
+    assert restored.total == topk.total
+    assert all(restored.error(key) == topk.error(key) for key, _ in topk.items())
+    restored.add("new")
+    assert len(restored) == 50
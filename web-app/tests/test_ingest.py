@@ -0,0 +1,137 @@
+"""Testing web-app/ingest.py file."""
+
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+from pymongo.errors import DuplicateKeyError
+from ingest import DeltaReader, UserHistory, Watermark
+from watchstats import WatchMetrics
+
+
+def record(video, minute):
+    return {"titleUrl": f"https://www.youtube.com/watch?v={video:0>11}", "time": f"2023-10-01T12:{minute:02d}:00Z"}
+
+
+def export(*minutes):
+    # newest first, like Takeout
+    return [record(f"v{minute}", minute) for minute in sorted(minutes, reverse=True)]
+
+
+def firstUpload(*minutes):
+    reader = DeltaReader(boundary_size=3)
+    list(reader.read(export(*minutes)))
+    return reader.next()
+
+
+def test_first_upload_reads_everything_and_marks_newest():
+    reader = DeltaReader(boundary_size=3)
+    assert len(list(reader.read(export(1, 2, 3, 4)))) == 4
+    watermark = reader.next()
+    assert watermark.latest == datetime(2023, 10, 1, 12, 4, tzinfo=timezone.utc)
+    assert len(watermark.boundary) == 3
+    assert not reader.continued
+
+
+def test_reupload_stops_at_the_watermark():
+    reader = DeltaReader(firstUpload(1, 2, 3), boundary_size=3)
+    read = list(reader.read(export(1, 2, 3, 4, 5)))
+
+    assert [r["time"][-6:-4] for r in read] == ["05", "04"]
+    assert reader.continued
+    watermark = reader.next()
+    assert watermark.latest == datetime(2023, 10, 1, 12, 5, tzinfo=timezone.utc)
+    assert len(watermark.boundary) == 3
+
+
+def test_reupload_without_new_records_keeps_the_watermark():
+    watermark = firstUpload(1, 2)
+    reader = DeltaReader(watermark, boundary_size=3)
+    assert list(reader.read(export(1, 2))) == []
+    assert reader.continued
+    assert reader.next() is watermark
+
+
+def test_newest_record_removed_from_history_still_continues():
+    reader = DeltaReader(firstUpload(1, 2, 3), boundary_size=3)
+    assert len(list(reader.read(export(1, 2, 4)))) == 1
+    assert reader.continued
+
+
+def test_unrelated_export_is_read_in_full():
+    reader = DeltaReader(firstUpload(10, 20), boundary_size=3)
+    other = [record("other", minute) for minute in (30, 15, 5)]
+    assert len(list(reader.read(other))) == 3
+    assert not reader.continued
+
+
+def test_watermark_from_mongo_is_made_aware():
+    watermark = Watermark.fromDict({"latest": datetime(2023, 10, 1, 12, 0), "boundary": ["a"]})
+    assert watermark.latest.tzinfo is timezone.utc
+
+
+def metricsWith(hour_count):
+    metrics = WatchMetrics()
+    metrics.hourly_watchtime[0] = hour_count
+    metrics.total_videos = hour_count
+    return metrics
+
+
+def continued():
+    reader = DeltaReader(firstUpload(1), boundary_size=3)
+    list(reader.read(export(1, 2)))
+    return reader
+
+
+def test_merge_adds_a_continuation_to_the_stored_counters():
+    collection = MagicMock()
+    collection.update_one.return_value.matched_count = 1
+    stored = {"_id": "1.2.3.4", "version": 4, "jobs": ["a"], "event_count": 10, "metrics": metricsWith(10).toDict()}
+
+    metrics, count, segments = UserHistory(collection).merge("1.2.3.4", "b", stored, metricsWith(2), continued(), 2)
+
+    assert count == 12
+    # the new events are chained onto the stored ones, not copied
+    assert segments == ["a", "b"]
+    assert metrics["hourly_watchtime"][0] == 12
+    assert metrics["total_videos"] == 12
+    query, update = collection.update_one.call_args.args
+    assert query == {"_id": "1.2.3.4", "version": 4}
+    assert update["$inc"] == {"version": 1}
+    assert update["$push"]["jobs"]["$each"] == ["b"]
+
+
+def test_merge_replaces_totals_for_an_unrelated_export():
+    collection = MagicMock()
+    collection.update_one.return_value.matched_count = 1
+    stored = {"_id": "u", "version": 1, "jobs": [], "event_count": 10, "metrics": metricsWith(10).toDict()}
+
+    stored["segments"] = ["x", "y"]
+    metrics, count, segments = UserHistory(collection).merge("u", "b", stored, metricsWith(3), DeltaReader(), 3)
+
+    assert (metrics["total_videos"], count, segments) == (3, 3, ["b"])
+
+
+def test_merge_of_an_already_merged_job_changes_nothing():
+    collection = MagicMock()
+    stored = {"_id": "u", "version": 2, "jobs": ["a"], "event_count": 10, "metrics": metricsWith(10).toDict()}
+
+    metrics, count, segments = UserHistory(collection).merge("u", "a", stored, metricsWith(2), continued(), 2)
+
+    assert (metrics["total_videos"], count, segments) == (10, 10, ["a"])
+    collection.update_one.assert_not_called()
+
+
+def test_merge_reports_a_concurrent_update():
+    collection = MagicMock()
+    collection.update_one.return_value.matched_count = 0
+    stored = {"_id": "u", "version": 2, "jobs": [], "event_count": 1, "metrics": metricsWith(1).toDict()}
+    assert UserHistory(collection).merge("u", "b", stored, metricsWith(2), continued(), 2) is None
+
+    collection.insert_one.side_effect = DuplicateKeyError("exists")
+    assert UserHistory(collection).merge("u", "c", None, metricsWith(2), DeltaReader(), 2) is None
+
+
+def test_timezone_change_rebuilds_from_the_whole_export():
+    stored = {"watermark": firstUpload(1).toDict(), "metrics": WatchMetrics("Europe/Paris").toDict()}
+    assert UserHistory.watermark(stored, "Europe/Paris").latest is not None
+    assert UserHistory.watermark(stored, "Asia/Tokyo") is None
+    assert UserHistory.watermark(None, "Asia/Tokyo") is None
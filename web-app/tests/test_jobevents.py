@@ -0,0 +1,107 @@
+"""Testing web-app/jobevents.py file."""
+
+from unittest.mock import MagicMock
+from bson import ObjectId
+from pymongo.errors import CollectionInvalid, OperationFailure, ServerSelectionTimeoutError
+from jobevents import JobEventFeed
+
+
+def make_feed(change_streams):
+    db = MagicMock()
+    if not change_streams:
+        db.Request.watch.side_effect = OperationFailure("only supported on replica sets")
+    return JobEventFeed(db, poll_interval=0, await_ms=1), db
+
+
+def test_publish_creates_capped_collection_once():
+    feed, db = make_feed(False)
+    db.create_collection.side_effect = CollectionInvalid("exists")
+    request_id = ObjectId()
+    feed.publish(request_id, "enriching", 500)
+    feed.publish(request_id, progress=1000)
+
+    db.create_collection.assert_called_once_with("JobEvents", capped=True, size=feed.capped_bytes)
+    assert db.JobEvents.insert_one.call_args_list[0].args[0] == {"request_id": request_id, "status": "enriching", "progress": 500}
+    assert db.JobEvents.insert_one.call_args_list[1].args[0] == {"request_id": request_id, "status": None, "progress": 1000}
+
+
+def test_follow_tails_capped_collection_without_change_streams():
+    feed, db = make_feed(False)
+    dead, live = MagicMock(alive=False), MagicMock(alive=True)
+    live.try_next.side_effect = [None, {"status": "analyzing"}, {"status": "done"}]
+    db.JobEvents.find.side_effect = [dead, live]
+    request_id = ObjectId()
+
+    updates = list(feed.follow(str(request_id), timeout=60))
+
+    assert feed.changeStreamsAvailable() is False
+    assert [u for u in updates if u] == [{"status": "analyzing", "progress": None}, {"status": "done", "progress": None}]
+    assert db.JobEvents.find.call_args.args[0] == {"request_id": request_id}
+
+
+def test_follow_resumes_the_tail_after_the_last_event():
+    feed, db = make_feed(False)
+    seen, newer = ObjectId(), ObjectId()
+    first, second = MagicMock(alive=True), MagicMock(alive=True)
+    first.try_next.side_effect = [{"_id": seen, "status": "enriching"}, {"_id": newer, "progress": 10}]
+    type(first).alive = property(lambda cursor: cursor.try_next.call_count < 2)
+    second.try_next.side_effect = [{"_id": newer, "progress": 10}, {"status": "done"}]
+    db.JobEvents.find.side_effect = [first, second]
+    request_id = ObjectId()
+
+    updates = [u for u in feed.follow(str(request_id), timeout=60, after=str(seen)) if u]
+
+    # the event the browser already had is not sent again, nor one this follower sent
+    assert updates == [{"status": None, "progress": 10, "id": str(newer)}, {"status": "done", "progress": None}]
+    queries = [c.args[0] for c in db.JobEvents.find.call_args_list]
+    assert queries[0]["_id"] == {"$gte": ObjectId.from_datetime(seen.generation_time)}
+    assert queries[1]["_id"] == {"$gte": ObjectId.from_datetime(newer.generation_time)}
+
+
+def test_probe_retries_when_mongo_is_unreachable():
+    feed, db = make_feed(True)
+    db.Request.watch.side_effect = ServerSelectionTimeoutError("no servers")
+    assert feed.changeStreamsAvailable() is False
+    db.Request.watch.side_effect = None
+    assert feed.changeStreamsAvailable() is True
+
+
+def test_follow_uses_change_streams_when_available():
+    feed, db = make_feed(True)
+    stream = db.Request.watch.return_value.__enter__.return_value
+    stream.try_next.side_effect = [
+        None,  # availability probe
+        {"updateDescription": {"updatedFields": {"progress": 5000}}},
+        {"updateDescription": {"updatedFields": {"analysis": "{}"}}},
+        {"updateDescription": {"updatedFields": {"partial.habits.summary": "s"}}},
+        {"updateDescription": {"updatedFields": {"status": "done"}}},
+    ]
+
+    updates = [u for u in feed.follow(str(ObjectId()), timeout=60) if u]
+
+    assert updates == [
+        {"status": None, "progress": 5000},
+        {"status": None, "progress": None, "partial": True},
+        {"status": "done", "progress": None},
+    ]
+    db.JobEvents.find.assert_not_called()
+
+
+def test_follow_reads_the_snapshot_after_it_starts_listening():
+    """A status written between the read and the watch can't be lost."""
+    feed, db = make_feed(True)
+    calls = []
+    db.Request.watch.side_effect = lambda *args, **kwargs: calls.append("watch") or MagicMock()
+    snapshot = MagicMock(side_effect=lambda: calls.append("snapshot") or {"status": "done"})
+    feed._change_streams = True
+
+    updates = list(feed.follow(str(ObjectId()), timeout=60, snapshot=snapshot))
+
+    assert updates == [{"status": "done"}]
+    assert calls == ["watch", "snapshot"]
+
+
+def test_follow_stops_when_the_request_is_missing():
+    feed, db = make_feed(False)
+    assert list(feed.follow(str(ObjectId()), timeout=60, snapshot=lambda: None)) == [None]
+    db.JobEvents.find.assert_not_called()
@@ -0,0 +1,128 @@
+"""Testing web-app/jobs.py file."""
+
+import io
+import threading
+import time
+from unittest.mock import MagicMock, patch
+from bson import ObjectId
+from jobs import JobQueue, ENRICHING, FAILED, QUEUED
+
+
+def make_queue(handler=None, lease_seconds=60):
+    db = MagicMock()
+    return JobQueue(db, handler or MagicMock(), workers=1, lease_seconds=lease_seconds, poll_interval=0.01), db
+
+
+@patch("jobs.gridfs.GridFS")
+def test_submit_stores_file_and_queues_request(mock_gridfs):
+    queue, db = make_queue()
+    mock_gridfs.return_value.put.return_value = "file-id"
+    db.Request.insert_one.return_value.inserted_id = ObjectId("6522b06b9f2e4e3d8f5b5e29")
+    upload = io.BytesIO(b"[]")
+    upload.filename = "watch-history.json"
+
+    assert queue.submit(upload) == "6522b06b9f2e4e3d8f5b5e29"
+    doc = db.Request.insert_one.call_args.args[0]
+    assert doc["status"] == QUEUED
+    assert doc["file_id"] == "file-id"
+
+
+def test_claim_takes_queued_or_expired_jobs():
+    queue, db = make_queue()
+    queue.claim("worker-1")
+
+    query, update = db.Request.find_one_and_update.call_args.args
+    assert {"status": QUEUED} in query["$or"]
+    assert query["$or"][1]["status"] == ENRICHING
+    assert update["$set"]["status"] == ENRICHING
+    assert update["$set"]["worker"] == "worker-1"
+
+
+def test_run_once_empty_queue():
+    queue, db = make_queue()
+    db.Request.find_one_and_update.return_value = None
+    assert queue.runOnce("worker-1") is False
+
+
+@patch("jobs.gridfs.GridFS")
+def test_run_once_marks_failed_jobs_and_deletes_their_upload(mock_gridfs):
+    handler = MagicMock(side_effect=ValueError("bad file"))
+    queue, db = make_queue(handler)
+    job = {"_id": ObjectId(), "file_id": "file-id", "attempts": 1}
+    db.Request.find_one_and_update.return_value = job
+
+    assert queue.runOnce("worker-1") is True
+    handler.assert_called_once_with(job, queue)
+    db.Request.update_one.assert_called_once_with(
+        {"_id": job["_id"]}, {"$set": {"status": FAILED, "error": "bad file"}}
+    )
+    mock_gridfs.return_value.delete.assert_called_once_with("file-id")
+
+
+@patch("jobs.gridfs.GridFS")
+def test_job_past_max_attempts_is_failed_without_running(mock_gridfs):
+    handler = MagicMock()
+    queue, db = make_queue(handler)
+    job = {"_id": ObjectId(), "file_id": "file-id", "attempts": queue.max_attempts + 1}
+    db.Request.find_one_and_update.return_value = job
+
+    assert queue.runOnce("worker-1") is True
+    handler.assert_not_called()
+    assert db.Request.update_one.call_args.args[1]["$set"]["status"] == FAILED
+    mock_gridfs.return_value.delete.assert_called_once_with("file-id")
+
+
+def test_lease_is_renewed_while_the_handler_runs():
+    queue, db = make_queue(lambda job, queue: time.sleep(0.1), lease_seconds=0.03)
+    job = {"_id": ObjectId(), "attempts": 1}
+    db.Request.find_one_and_update.return_value = job
+
+    queue.runOnce("worker-1")
+    renewals = [c.args for c in db.Request.update_one.call_args_list]
+    assert len(renewals) >= 2
+    query, update = renewals[0]
+    # only while this worker still holds the claim
+    assert query == {"_id": job["_id"], "worker": "worker-1"}
+    assert set(update["$set"]) == {"lease_until"}
+
+    # nothing renews a finished job
+    db.Request.update_one.reset_mock()
+    time.sleep(0.05)
+    db.Request.update_one.assert_not_called()
+
+
+def test_workers_start_once_and_stop():
+    queue, db = make_queue()
+    db.Request.find_one_and_update.return_value = None
+    queue.start()
+    queue.start()
+    assert len(queue._threads) == 1
+    queue.stop()
+    assert queue._threads == []
+
+
+def test_workers_restart_when_their_threads_are_gone():
+    """A forked process inherits the thread list but not the threads."""
+    queue, db = make_queue()
+    db.Request.find_one_and_update.return_value = None
+    dead = threading.Thread(target=lambda: None)
+    dead.start()
+    dead.join()
+    queue._threads = [dead]
+    queue.start()
+    assert len(queue._threads) == 1 and queue._threads[0].is_alive()
+    queue.stop()
+
+
+def test_update_publishes_status_changes():
+    queue, db = make_queue()
+    queue.events = MagicMock()
+    job_id = ObjectId()
+
+    queue.update(job_id, progress=500)
+    queue.update(job_id, file_id=None)
+    queue.fail(job_id, "boom")
+
+    assert queue.events.publish.call_args_list[0].args == (job_id, None, 500)
+    assert queue.events.publish.call_args_list[1].args == (job_id, FAILED, None)
+    assert queue.events.publish.call_count == 2
@@ -0,0 +1,64 @@
+"""Testing web-app/quota.py file."""
+
+from unittest.mock import MagicMock
+from quota import GLOBAL, QuotaGovernor
+
+
+def make_governor(user_grants, global_grants):
+    collection = MagicMock()
+    grants = {"user:1.2.3.4": list(user_grants), GLOBAL: list(global_grants)}
+    collection.find_one_and_update.side_effect = lambda query, *args, **kwargs: {"granted": grants[query["_id"]].pop(0)}
+    return QuotaGovernor(collection, daily_limit=10000, user_daily_limit=100), collection
+
+
+def test_reserve_takes_from_user_then_global_bucket():
+    governor, collection = make_governor([5], [5])
+    assert governor.reserve("1.2.3.4", 5) == 5
+    keys = [call.args[0]["_id"] for call in collection.find_one_and_update.call_args_list]
+    assert keys == ["user:1.2.3.4", GLOBAL]
+    assert collection.find_one_and_update.call_args.kwargs["upsert"] is True
+    collection.update_one.assert_not_called()
+
+
+def test_reserve_returns_units_the_global_bucket_lacks():
+    governor, collection = make_governor([5], [2])
+    assert governor.reserve("1.2.3.4", 5) == 2
+    collection.update_one.assert_called_once_with({"_id": "user:1.2.3.4"}, {"$inc": {"tokens": 3}})
+
+
+def test_reserve_skips_global_bucket_when_user_is_out():
+    governor, collection = make_governor([0], [])
+    assert governor.reserve("1.2.3.4", 5) == 0
+    assert collection.find_one_and_update.call_count == 1
+    assert governor.reserve("1.2.3.4", 0) == 0
+
+
+def test_settle_returns_unspent_units_and_charges_retries():
+    governor, collection = make_governor([], [])
+    governor.settle("1.2.3.4", 3, 1)
+    governor.settle("1.2.3.4", 2, 4)
+    governor.settle("1.2.3.4", 2, 2)
+    assert [call.args for call in collection.update_one.call_args_list] == [
+        ({"_id": "user:1.2.3.4"}, {"$inc": {"tokens": 2}}),
+        ({"_id": GLOBAL}, {"$inc": {"tokens": 2}}),
+        ({"_id": "user:1.2.3.4"}, {"$inc": {"tokens": -2}}),
+        ({"_id": GLOBAL}, {"$inc": {"tokens": -2}}),
+    ]
+
+
+def test_bucket_update_refills_and_debits_in_one_pipeline():
+    governor, collection = make_governor([3], [3])
+    governor.reserve("1.2.3.4", 3)
+    pipeline = collection.find_one_and_update.call_args_list[0].args[1]
+    assert [list(stage["$set"]) for stage in pipeline] == [["tokens", "updated_at"], ["granted"], ["tokens"]]
+    refill = pipeline[0]["$set"]["tokens"]["$min"]
+    assert refill[0] == 100
+
+
+def test_remaining_defaults_to_full_budget():
+    governor, collection = make_governor([], [])
+    collection.find_one.return_value = None
+    assert governor.remaining() == 10000
+    assert governor.remaining("1.2.3.4") == 100
+    collection.find_one.return_value = {"tokens": 41.7}
+    assert governor.remaining() == 41
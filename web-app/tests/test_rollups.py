@@ -0,0 +1,92 @@
+"""Testing web-app/rollups.py file."""
+
+import random
+from array import array
+from datetime import date, datetime, timezone
+import pytest
+from rollups import TimeRollups, isTimezone
+
+
+def epoch(*args):
+    return int(datetime(*args, tzinfo=timezone.utc).timestamp())
+
+
+def test_buckets_follow_daylight_saving_time():
+    rollups = TimeRollups("America/New_York")
+    # 12:00 UTC is 07:00 EST in January and 08:00 EDT in July
+    rollups.add([epoch(2023, 1, 10, 12), epoch(2023, 7, 10, 12)])
+    assert rollups.hourly[7] == 1
+    assert rollups.hourly[8] == 1
+
+
+def test_transition_night_lands_in_the_right_hour():
+    rollups = TimeRollups("America/New_York")
+    # clocks went forward at 07:00 UTC on 2023-03-12
+    rollups.add([epoch(2023, 3, 12, 6, 59), epoch(2023, 3, 12, 7, 0)])
+    assert rollups.hourly[1] == 1
+    assert rollups.hourly[3] == 1
+
+
+def test_half_hour_offsets_and_local_dates():
+    rollups = TimeRollups("Asia/Kolkata")
+    # 20:00 UTC on a Sunday is 01:30 on Monday in India
+    rollups.add([epoch(2023, 10, 1, 20)])
+    assert rollups.hourly[1] == 1
+    assert rollups.weekday[0] == 1
+    assert dict(rollups.daily) == {"2023-10-02": 1}
+    assert dict(rollups.monthly) == {"2023-10": 1}
+
+
+@pytest.mark.parametrize("zone", ["America/New_York", "Asia/Kolkata", "Australia/Lord_Howe", "UTC"])
+def test_sorted_runs_bucket_like_single_events(zone):
+    generator = random.Random(zone)
+    start = epoch(2022, 1, 1)
+    # clustered, like sessions, and across both of 2022's transitions
+    timestamps = sorted(start + generator.randrange(0, 365 * 86400) + generator.randrange(0, 7200) // 60 * 60 for _ in range(5000))
+    timestamps += [epoch(2022, 3, 13, 6, 59), epoch(2022, 3, 13, 7), epoch(2022, 11, 6, 5, 59), epoch(2022, 11, 6, 6)]
+    timestamps.sort()
+
+    single, runs = TimeRollups(zone), TimeRollups(zone)
+    single.add(timestamps)
+    runs.addSorted(memoryview(array("q", timestamps)))
+    assert runs.toDict() == single.toDict()
+
+
+def test_range_queries_use_day_totals():
+    rollups = TimeRollups("UTC")
+    rollups.add([epoch(2023, 9, 30, 10)] + [epoch(2023, 10, 1, 10)] * 2 + [epoch(2023, 12, 1, 10)])
+
+    assert rollups.between() == 4
+    assert rollups.between("2023-10-01", "2023-10-02") == 2
+    assert rollups.between(date(2023, 10, 1)) == 3
+    assert rollups.between(end="2023-10-01") == 1
+    assert rollups.lastDays(1, today=date(2023, 12, 1)) == 1
+    assert rollups.lastDays(62, today=date(2023, 12, 1)) == 3
+    assert rollups.lastDays(90, today=date(2023, 12, 1)) == 4
+    assert rollups.lastDays(30, today=date(2024, 6, 1)) == 0
+
+    rollups.add([epoch(2023, 12, 1, 11)])
+    assert rollups.lastDays(1, today=date(2023, 12, 1)) == 2
+
+
+def test_merge_and_round_trip():
+    left, right = TimeRollups("Europe/Berlin"), TimeRollups("Europe/Berlin")
+    left.add([epoch(2023, 10, 1, 10)])
+    right.add([epoch(2023, 10, 1, 11), epoch(2023, 11, 5, 11)])
+    merged = left.merge(right)
+
+    assert sum(merged.hourly) == 3
+    assert merged.monthly == {"2023-10": 2, "2023-11": 1}
+    restored = TimeRollups.fromDict(merged.toDict())
+    assert restored.toDict() == merged.toDict()
+    assert restored.between("2023-11-01") == 1
+
+    with pytest.raises(ValueError):
+        merged.merge(TimeRollups("UTC"))
+
+
+def test_is_timezone():
+    assert isTimezone("America/Los_Angeles")
+    assert not isTimezone("Mars/Olympus_Mons")
+    assert not isTimezone("../../etc/passwd")
+    assert not isTimezone(None)
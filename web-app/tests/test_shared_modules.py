@@ -0,0 +1,15 @@
+"""Testing that the modules both services keep a copy of stay identical."""
+
+from pathlib import Path
+import pytest
+
+ROOT = Path(__file__).resolve().parents[2]
+SHARED = ["clients.py", "leases.py", "telemetry.py", "ttlcache.py"]
+
+
+@pytest.mark.parametrize("name", SHARED)
+def test_open_ai_copy_matches(name):
+    other = ROOT / "open-ai" / name
+    if not other.exists():
+        pytest.skip("open-ai is not checked out next to web-app")
+    assert (ROOT / "web-app" / name).read_bytes() == other.read_bytes(), f"copy web-app/{name} to open-ai/{name}"
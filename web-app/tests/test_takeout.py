@@ -0,0 +1,76 @@
+"""Testing web-app/takeout.py file."""
+
+import io
+import json
+import pytest
+from datetime import datetime, timezone
+from takeout import dedupeWatchEvents, iterTakeoutRecords, iterWatchEvents, parseWatchRecord
+
+RECORDS = [
+    {"title": "Watched A", "titleUrl": "https://www.youtube.com/watch?v=abc123def45", "time": "2023-10-01T12:00:00Z"},
+    {"title": "Visited an ad", "time": "2023-10-01T12:05:00Z"},
+    {"title": "Watched B", "titleUrl": "https://www.youtube.com/watch?v=zyx987wvu65", "time": "2023-10-02T08:30:00.123Z"},
+    {"title": "Watched a post", "titleUrl": "https://www.youtube.com/post/xyz", "time": "2023-10-03T08:30:00Z"},
+]
+
+
+def test_records_survive_tiny_reads():
+    """Records split across many reads are still decoded whole."""
+    raw = json.dumps(RECORDS, indent=2).encode("utf-8")
+    for read_size in (1, 7, 64):
+        assert list(iterTakeoutRecords(io.BytesIO(raw), read_size=read_size)) == RECORDS
+
+
+def test_records_with_bom_and_multibyte_chars():
+    """A UTF-8 BOM and multi-byte characters split mid-read are handled."""
+    records = [{"title": "Watched ☃ ünïcode"}, {"title": "Watched 日本"}]
+    raw = b"\xef\xbb\xbf" + json.dumps(records, ensure_ascii=False).encode("utf-8")
+    assert list(iterTakeoutRecords(io.BytesIO(raw), read_size=3)) == records
+
+
+def test_records_empty_array():
+    assert list(iterTakeoutRecords(io.BytesIO(b"  [ ]  "))) == []
+
+
+def test_records_rejects_non_array():
+    with pytest.raises(ValueError):
+        list(iterTakeoutRecords(io.BytesIO(b'{"title": "x"}')))
+
+
+def test_records_rejects_truncated_file():
+    raw = json.dumps(RECORDS).encode("utf-8")[:-20]
+    with pytest.raises(ValueError):
+        list(iterTakeoutRecords(io.BytesIO(raw), read_size=16))
+
+
+def test_parse_watch_record():
+    assert parseWatchRecord(RECORDS[1]) is None
+    assert parseWatchRecord(RECORDS[3]) is None
+    assert parseWatchRecord(RECORDS[0]) == {
+        "video_id": "abc123def45",
+        "timestamp": datetime(2023, 10, 1, 12, 0, tzinfo=timezone.utc),
+    }
+
+
+def test_watch_events_match_full_parse():
+    """Streaming yields the same events as parsing the loaded list."""
+    raw = json.dumps(RECORDS).encode("utf-8")
+    streamed = list(iterWatchEvents(io.BytesIO(raw), read_size=5))
+    loaded = [e for e in map(parseWatchRecord, json.loads(raw)) if e is not None]
+    assert streamed == loaded
+    assert [e["video_id"] for e in streamed] == ["abc123def45", "zyx987wvu65"]
+
+
+def test_dedupe_watch_events_counts_rewatches():
+    first = datetime(2023, 10, 1, tzinfo=timezone.utc)
+    second = datetime(2023, 10, 2, tzinfo=timezone.utc)
+    events = [
+        {"video_id": "b", "timestamp": first},
+        {"video_id": "a", "timestamp": first},
+        {"video_id": "b", "timestamp": second},
+    ]
+    watched = dedupeWatchEvents(events)
+
+    assert list(watched) == ["b", "a"]
+    assert watched["b"] == {"views": 2, "timestamps": [first, second]}
+    assert watched["a"] == {"views": 1, "timestamps": [first]}
@@ -0,0 +1,49 @@
+"""Testing web-app/telemetry.py file."""
+
+from unittest.mock import MagicMock
+from telemetry import MONGO_SECONDS, MongoCommandTimer, Registry
+
+
+def test_counter_and_gauge_render_with_labels():
+    registry = Registry()
+    calls = registry.counter("calls_total", "Calls made.", ["status"])
+    rate = registry.gauge("rate", "Current rate.")
+    calls.inc(status=200)
+    calls.inc(2, status=200)
+    calls.inc(status='5"0\\0')
+    rate.set(12.5)
+
+    text = registry.render()
+    assert "# TYPE calls_total counter" in text
+    assert 'calls_total{status="200"} 3' in text
+    assert 'calls_total{status="5\\"0\\\\0"} 1' in text
+    assert "rate 12.5" in text
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    latency = registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value)
+
+    lines = registry.render().splitlines()
+    assert 'latency_seconds_bucket{le="0.1"} 2' in lines
+    assert 'latency_seconds_bucket{le="1.0"} 3' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 4' in lines
+    assert "latency_seconds_count 4" in lines
+    assert "latency_seconds_sum 3.65" in lines
+
+
+def test_histogram_time_and_registry_reuse():
+    registry = Registry()
+    first = registry.histogram("work_seconds", "Work.")
+    assert registry.histogram("work_seconds", "Work.") is first
+    with first.time():
+        pass
+    assert first.count() == 1
+
+
+def test_mongo_command_timer_records_durations():
+    before = MONGO_SECONDS.count(command="find", outcome="ok")
+    MongoCommandTimer().succeeded(MagicMock(command_name="find", duration_micros=1500))
+    assert MONGO_SECONDS.count(command="find", outcome="ok") == before + 1
@@ -0,0 +1,77 @@
+"""Testing web-app/videocache.py file."""
+
+import json
+from unittest.mock import MagicMock, patch
+from pymongo.errors import OperationFailure
+from videocache import VideoLRUCache, VideoMetadataCache
+
+
+def make_cache(docs=()):
+    collection = MagicMock()
+    collection.name = "video_metadata"
+    collection.find.return_value = list(docs)
+    return VideoMetadataCache(collection, ttl_seconds=3600), collection
+
+
+def test_indexes_created_once():
+    cache, collection = make_cache()
+    cache.getMany(["a"])
+    cache.getMany(["b"])
+    assert collection.create_index.call_count == 2
+    collection.create_index.assert_any_call([("video_id", 1)], unique=True)
+    collection.create_index.assert_any_call([("cached_at", 1)], expireAfterSeconds=3600)
+
+
+def test_ttl_change_updates_existing_index():
+    cache, collection = make_cache()
+    collection.create_index.side_effect = [None, OperationFailure("IndexOptionsConflict")]
+    cache.ensureIndexes()
+    collection.database.command.assert_called_once()
+    assert collection.database.command.call_args.kwargs["index"]["expireAfterSeconds"] == 3600
+
+
+def test_get_many_counts_hits_and_misses():
+    cache, collection = make_cache([{"video_id": "a", "item": {"id": "a"}}])
+    found = cache.getMany(["a", "b", "c"])
+
+    assert found == {"a": {"id": "a"}}
+    assert cache.stats() == {"hits": 1, "misses": 2, "hit_rate": 1 / 3}
+
+
+def test_put_many_bulk_upserts():
+    cache, collection = make_cache()
+    cache.putMany([{"id": "a"}, {"id": "b"}])
+
+    requests, = collection.bulk_write.call_args.args
+    assert collection.bulk_write.call_args.kwargs == {"ordered": False}
+    assert [r._filter for r in requests] == [{"video_id": "a"}, {"video_id": "b"}]
+    assert all(r._upsert for r in requests)
+
+
+def test_put_many_skips_empty():
+    cache, collection = make_cache()
+    cache.putMany([])
+    collection.bulk_write.assert_not_called()
+
+
+def test_lru_evicts_least_recently_used_by_size():
+    item_size = len(json.dumps({"id": "a"}))
+    lru = VideoLRUCache(max_bytes=item_size * 2, negative_ttl=60)
+    lru.putMany([{"id": "a"}, {"id": "b"}])
+    lru.getMany(["a"])
+    lru.putMany([{"id": "c"}])
+
+    found, absent = lru.getMany(["a", "b", "c"])
+    assert set(found) == {"a", "c"}
+    assert lru.size == item_size * 2
+
+
+def test_lru_negative_entries_expire():
+    lru = VideoLRUCache(max_bytes=1024, negative_ttl=60)
+    with patch("videocache.time.monotonic", return_value=100.0):
+        lru.putMissing(["gone"])
+        assert lru.getMany(["gone"]) == ({}, {"gone"})
+    with patch("videocache.time.monotonic", return_value=161.0):
+        assert lru.getMany(["gone"]) == ({}, set())
+    assert len(lru) == 0
+
@@ -0,0 +1,91 @@
+"""Testing web-app/watchstats.py file."""
+
+from datetime import datetime, timezone
+from watchstats import WatchMetrics
+
+
+def video(video_id, duration, channel="Channel", category="22", tags=()):
+    return {
+        "id": video_id,
+        "contentDetails": {"duration": duration},
+        "snippet": {"channelTitle": channel, "categoryId": category, "tags": list(tags)},
+    }
+
+
+def test_add_watch_buckets_hour_and_weekday():
+    metrics = WatchMetrics("America/New_York")
+    # 02:00 UTC Monday is 22:00 Sunday in New York (EDT)
+    metrics.addWatch(datetime(2023, 10, 2, 2, 0, tzinfo=timezone.utc))
+    assert metrics.hourly_watchtime[22] == 1
+    assert metrics.weekday_watchtime[6] == 1
+    # and 21:00 in winter (EST)
+    metrics.addWatch(datetime(2023, 12, 4, 2, 0, tzinfo=timezone.utc))
+    assert metrics.hourly_watchtime[21] == 1
+    assert metrics.time.monthly == {"2023-10": 1, "2023-12": 1}
+
+
+def test_add_video_weights_by_views_and_caps_length():
+    metrics = WatchMetrics()
+    metrics.addVideo(video("a", "PT10M", tags=["x"]), views=3)
+    metrics.addVideo(video("b", "PT7H"), views=1)
+
+    assert metrics.total_watchtime == 1800
+    assert metrics.total_videos == 3
+    assert metrics.tag_frequency["x"].frequency == 3
+    assert metrics.channel_stats["Channel"].toDict() == {"watchtime": 1800, "frequency": 3}
+    assert metrics.longest_video == ("a", 600)
+
+
+def test_merge_matches_serial_pass():
+    videos = [video("a", "PT1M", "A", tags=["t"]), video("b", "PT5M", "B"), video("c", "PT5M", "A", "10", ["t", "u"])]
+    serial = WatchMetrics()
+    for item in videos:
+        serial.addVideo(item)
+
+    left, right = WatchMetrics(), WatchMetrics()
+    left.addVideo(videos[0])
+    right.addVideo(videos[1])
+    right.addVideo(videos[2])
+
+    assert left.merge(right).toDict() == serial.toDict()
+    assert serial.longest_video == ("b", 300)
+
+
+def test_empty_metrics_are_bson_safe():
+    data = WatchMetrics().toDict()
+    assert data["shortest_video"]["duration"] is None
+    assert data["hourly_watchtime"] == [0] * 24
+
+
+def test_from_dict_round_trips():
+    metrics = WatchMetrics()
+    metrics.addWatch(datetime(2023, 10, 2, 2, 0, tzinfo=timezone.utc))
+    metrics.addVideo(video("a", "PT1M", "A", tags=["t"]), views=2)
+    metrics.addVideo(video("b", "PT5M", "B", "10"))
+
+    assert WatchMetrics.fromDict(metrics.toDict()).toDict() == metrics.toDict()
+    assert WatchMetrics.fromDict(WatchMetrics().toDict()).shortest_video == ("", float("inf"))
+
+
+def test_from_dict_accepts_metrics_stored_before_rollups():
+    data = WatchMetrics().toDict()
+    del data["time_rollups"]
+    data["hourly_watchtime"][5] = 3
+    metrics = WatchMetrics.fromDict(data)
+    assert metrics.hourly_watchtime[5] == 3
+    assert metrics.time.daily == {}
+
+
+def test_bounded_top_k_keeps_the_heaviest_and_round_trips():
+    metrics = WatchMetrics(top_k=2)
+    metrics.addVideo(video("a", "PT1M", "A", tags=["x", "y"]), views=5)
+    metrics.addVideo(video("b", "PT1M", "B", tags=["z"]), views=1)
+    metrics.addVideo(video("c", "PT1M", "C", tags=["x"]), views=3)
+
+    assert metrics.topTags(1) == [("x", 8)]
+    assert [name for name, _ in metrics.topChannels()] == ["A", "C"]
+    assert metrics.channel_stats.error("C") == 1
+
+    restored = WatchMetrics.fromDict(metrics.toDict())
+    assert restored.toDict() == metrics.toDict()
+    assert restored.channel_stats.capacity == 2
@@ -3,13 +3,17 @@
 import io
 from bson import ObjectId
 from bson.errors import InvalidId
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 import json
+import threading
+import tracemalloc
 import pytest
-from app import processWatchHistory, metrics, logOutput
+from datetime import datetime, timezone
+from app import CHUNK_SIZE, SSE_BUSY_RETRY_MS, enrichVideos, parseWorkers, processWatchHistory, resolveVideos, runJob, logOutput
+from watchstats import WatchMetrics
 
-@patch("app.requests.get")
-def test_processWatchHistory_and_enricheData(mock_get):
+@patch("app.youtube.session.get")
+def test_processWatchHistory_and_enricheData(mock_get, mock_video_cache):
     mock_get.return_value.status_code = 200
     mock_get.return_value.json.return_value = {
         "items": [{
@@ -32,15 +36,141 @@ def test_processWatchHistory_and_enricheData(mock_get):
             "titleUrl": "https://www.youtube.com/watch?v=abc123def45"
         })
     file_obj = io.BytesIO(json.dumps(mock_data).encode("utf-8"))
-    result = processWatchHistory(file_obj)
+    metrics = WatchMetrics()
+    result = processWatchHistory(file_obj, metrics=metrics)
 
     assert result is not None
-    assert metrics["total_watchtime"] > 0
-    assert metrics["channel_stats"]["Test Channel"]["frequency"] == 2
-    assert "test" in metrics["tag_frequency"]
+    assert metrics.total_watchtime > 0
+    # one api call for the single unique id, weighted by all 52 rewatches
+    assert mock_get.call_count == 1
+    assert metrics.channel_stats["Test Channel"].frequency == 52
+    assert "test" in metrics.tag_frequency
+    assert metrics.hourly_watchtime[8] == 52
+
+@patch("app.enrichData")
+def test_processWatchHistory_stream(mock_enrich):
+    mock_data = [{"title": "Watched Test Video", "time": "2023-10-01T12:00:00Z",
+                  "titleUrl": "https://www.youtube.com/watch?v=abc123def45"}] * 7
+    mock_data.insert(3, {"title": "Visited an ad", "time": "2023-10-01T12:00:00Z"})
+    file_obj = io.BytesIO(json.dumps(mock_data).encode("utf-8"))
+    events = []
+    processWatchHistory(file_obj, chunk_size=3, limit=5, stream=True, sink=events.extend)
+
+    assert len(events) == 5
+    assert events[0]["video_id"] == "abc123def45"
+    assert [len(call.args[0]) for call in mock_enrich.call_args_list] == [3, 2]
+
+@patch("app.youtube.fetchBatches")
+def test_resolveVideos_only_fetches_cache_misses(mock_fetch, mock_video_cache):
+    cached = {"id": "cached00001"}
+    fresh = {"id": "fresh000001"}
+    mock_video_cache.getMany.return_value = {"cached00001": cached}
+    mock_fetch.return_value = [[fresh]], 1, False
+
+    videos, sampled, skipped = resolveVideos(["cached00001", "fresh000001", "cached00001", "fresh000001"])
+
+    mock_video_cache.getMany.assert_called_once_with(["cached00001", "fresh000001"])
+    mock_fetch.assert_called_once_with(["fresh000001"])
+    mock_video_cache.putMany.assert_called_once_with([fresh])
+    assert videos == {"cached00001": cached, "fresh000001": fresh}
+    assert sampled == {"fresh000001"}
+    assert skipped == []
+
+@patch("app.youtube.fetchBatches")
+def test_resolveVideos_negative_caches_missing_ids(mock_fetch, mock_video_cache):
+    mock_fetch.return_value = [[{"id": "found000001"}]], 1, False
+
+    resolveVideos(["found000001", "deleted0001"])
+    videos, _, _ = resolveVideos(["found000001", "deleted0001", "found000001"])
+
+    mock_fetch.assert_called_once_with(["found000001", "deleted0001"])
+    assert mock_video_cache.getMany.call_count == 1
+    assert videos == {"found000001": {"id": "found000001"}}
+
+@patch("app.youtube.fetchBatches")
+def test_resolveVideos_does_not_negative_cache_failed_batches(mock_fetch, mock_video_cache, mock_quota):
+    ids = [f"video{i:06d}" for i in range(60)]
+    # the answered batch was retried once
+    mock_fetch.return_value = [None, [{"id": "video000050"}]], 2, False
+
+    videos, sampled, skipped = resolveVideos(ids, user="1.2.3.4")
+
+    assert videos == {"video000050": {"id": "video000050"}}
+    assert sampled == set(ids[50:])
+    assert skipped == ids[:50]
+    mock_quota.settle.assert_called_once_with("1.2.3.4", 2, 2)
+    # the failed batch is looked up again next time
+    mock_fetch.return_value = [[{"id": "video000000"}]], 1, False
+    videos, _, _ = resolveVideos(ids[:1])
+    assert videos == {"video000000": {"id": "video000000"}}
+
+def fake_resolve(video_ids, user=None):
+    return {
+        video_id: {
+            "id": video_id,
+            "contentDetails": {"duration": f"PT{int(video_id[-2:]) % 7 + 1}M"},
+            "snippet": {"channelTitle": f"Channel {video_id[-1]}", "categoryId": video_id[-2], "tags": [video_id[-3:]]},
+        }
+        for video_id in video_ids if not video_id.endswith("13")
+    }, set(), []
+
+@patch("app.youtube.fetchBatches")
+def test_enrich_samples_and_scales_when_quota_runs_short(mock_fetch, mock_video_cache, mock_quota):
+    """Only a sample the quota covers is fetched; it stands in for the skipped videos."""
+    ids = [f"video{i:06d}" for i in range(120)]
+    item = lambda video_id: {"id": video_id, "contentDetails": {"duration": "PT1M"}, "snippet": {"channelTitle": "C"}}
+    mock_fetch.side_effect = lambda sample: ([[item(video_id) for video_id in sample]], 1, False)
+    mock_quota.reserve.side_effect = lambda user, units: 1  # one 50-id batch of the 3 needed
+
+    metrics = WatchMetrics()
+    enrichVideos({video_id: 2 for video_id in ids}, metrics, user="1.2.3.4")
+
+    assert mock_quota.reserve.call_args.args == ("1.2.3.4", 3)
+    assert len(mock_fetch.call_args.args[0]) == 50
+    assert metrics.total_videos == 240
+    assert metrics.estimated_videos == 140
+    assert metrics.channel_stats["C"].frequency == 240
+
+@patch("app.youtube.fetchBatches")
+def test_resolveVideos_keeps_batches_answered_before_the_quota_ran_out(mock_fetch, mock_video_cache, mock_quota):
+    ids = [f"video{i:06d}" for i in range(100)]
+    mock_fetch.return_value = [[{"id": "video000000"}], None], 1, True
+
+    videos, sampled, skipped = resolveVideos(ids)
+
+    assert videos == {"video000000": {"id": "video000000"}}
+    assert skipped == ids[50:]
+    mock_video_cache.putMany.assert_called_once_with([{"id": "video000000"}])
+    # the unsent batch's unit goes back before the global bucket is emptied
+    assert [name for name, _, _ in mock_quota.method_calls][-2:] == ["settle", "exhaust"]
+    mock_quota.settle.assert_called_once_with("anonymous", 2, 1)
+
+@pytest.mark.parametrize("limit", [10000, 777])
+@patch("app.resolveVideos", side_effect=fake_resolve)
+def test_processWatchHistory_parallel_matches_serial(mock_resolve, limit):
+    mock_data = []
+    for i in range(3000):
+        mock_data.append({
+            "title": "Watched Test Video",
+            "time": f"2023-10-{i % 28 + 1:02d}T{i % 24:02d}:{i % 60:02d}:00Z",
+            "titleUrl": f"https://www.youtube.com/watch?v=video{(i * 7919) % 400:06d}",
+        })
+        if i % 50 == 0:
+            mock_data.append({"title": "Visited an ad", "time": "2023-10-01T12:00:00Z"})
+    raw = json.dumps(mock_data).encode("utf-8")
+
+    serial = WatchMetrics()
+    serial_events, parallel_events = [], []
+    processWatchHistory(io.BytesIO(raw), chunk_size=500, limit=limit, stream=True, metrics=serial, sink=serial_events.extend)
+    parallel = WatchMetrics()
+    processWatchHistory(io.BytesIO(raw), chunk_size=400, limit=limit, stream=True, metrics=parallel, workers=2, sink=parallel_events.extend)
+
+    assert parallel_events == serial_events
+    assert len(serial_events) == min(limit, 3000)
+    assert json.dumps(parallel.toDict()) == json.dumps(serial.toDict())
 
 def test_log_output(capsys):
-    logOutput()
+    logOutput(WatchMetrics())
     captured = capsys.readouterr()
     assert "Total Watchtime:" in captured.out
 
@@ -52,20 +182,348 @@ def test_home_page(client):
     assert b"Welcome to the YouTube Viewer Analyzer" in response.data
     assert b"Choose your YouTube JSON file" in response.data
 
-def test_upload_success(client, mock_db, mock_requests_post):
-    """Mock DB insert + requests.post to avoid hitting the analyzer service."""
+def test_upload_success(client, mock_jobs):
+    """Uploads are queued as a job and redirect to its results page."""
     fake_file = io.BytesIO(b'[{"title": "Test Video", "time": "2023-10-01T12:00:00"}]')
     data = {'file': (fake_file, 'watch-history.json')}
-    mock_db.Request.insert_one.return_value.inserted_id = ObjectId("6522b06b9f2e4e3d8f5b5e29")
-    mock_requests_post.return_value.status_code = 200
-    mock_requests_post.return_value.json.return_value = {"status": "ok"}
+    mock_jobs.submit.return_value = "6522b06b9f2e4e3d8f5b5e29"
 
     response = client.post("/upload", data=data, content_type='multipart/form-data')
     assert response.status_code in [200, 302]
     if response.status_code == 302:
         assert "/results/" in response.location
     assert response.location.endswith("6522b06b9f2e4e3d8f5b5e29")
+    mock_jobs.submit.assert_called_once()
+    mock_jobs.handOff.assert_not_called()
+    assert mock_jobs.submit.call_args.kwargs["trace_id"] == response.headers["X-Trace-Id"]
+    assert mock_jobs.submit.call_args.kwargs["timezone"] == "America/New_York"
+
+    response = client.post("/upload", data={'file': (io.BytesIO(b'[]'), 'watch-history.json'), 'timezone': 'Asia/Tokyo'},
+                           content_type='multipart/form-data', headers={"X-Trace-Id": "trace-1"})
+    assert mock_jobs.submit.call_args.kwargs["trace_id"] == "trace-1"
+    assert mock_jobs.submit.call_args.kwargs["timezone"] == "Asia/Tokyo"
+
+
+def test_upload_user_is_not_taken_from_forwarded_header(client, mock_jobs):
+    """A client can't claim a fresh quota bucket by sending X-Forwarded-For."""
+    mock_jobs.submit.return_value = "6522b06b9f2e4e3d8f5b5e29"
+    client.post("/upload", data={'file': (io.BytesIO(b'[]'), 'watch-history.json')},
+                content_type='multipart/form-data', headers={"X-Forwarded-For": "10.9.8.7"},
+                environ_base={"REMOTE_ADDR": "192.0.2.1"})
+    assert mock_jobs.submit.call_args.kwargs["user"] == "192.0.2.1"
+
+
+@patch("app.PARALLEL_PARSE_MIN_BYTES", 1000)
+@patch("app.PARSE_WORKERS", 4)
+def test_parse_workers_need_a_big_upload_and_limit():
+    assert parseWorkers(999, 10 ** 6) == 1
+    # the default HISTORY_LIMIT keeps less than a chunk per worker
+    assert parseWorkers(10 ** 9, 1000) == 1
+    assert parseWorkers(10 ** 9, 4 * CHUNK_SIZE) == 4
+
+
+def test_first_request_starts_workers(client, mock_jobs):
+    """Workers start in the serving process, not only when run as a script."""
+    client.get("/metrics")
+    mock_jobs.start.assert_called_with()
+
+
+def test_metrics_endpoint(client):
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert "# TYPE webapp_records_parsed_total counter" in response.get_data(as_text=True)
+
+
+@patch("app.clients")
+def test_health_endpoint(mock_clients, client):
+    mock_clients.health.return_value = {"mongo": {"ok": True, "seconds": 0.01}}
+    response = client.get("/health")
+    assert response.status_code == 200
+    assert response.get_json()["mongo"]["ok"]
+    mock_clients.health.return_value = {"mongo": {"ok": False, "seconds": 5.0, "error": "ServerSelectionTimeoutError"}}
+    assert client.get("/health").status_code == 503
+
+
+@patch("app.eventStore")
+def test_run_job_hands_off_to_analyzer(mock_event_store):
+    queue = MagicMock()
+    job = {"_id": ObjectId("6522b06b9f2e4e3d8f5b5e29"), "file_id": "file", "trace_id": "trace-1"}
+    queue.openUpload.return_value = io.BytesIO(b'[{"title": "Test Video", "time": "2023-10-01T12:00:00"}]')
+    writer = mock_event_store.writer.return_value
+    writer.count = 0
+
+    runJob(job, queue)
+
+    mock_event_store.writer.assert_called_once_with(job["_id"])
+    writer.flush.assert_called_once()
+    queue.update.assert_called_once_with(
+        job["_id"],
+        status="analyzing",
+        event_count=0,
+        metrics=WatchMetrics().toDict(),
+        segments=[job["_id"]],
+    )
+    queue.discardUpload.assert_called_once_with(job)
+    queue.handOff.assert_called_once_with(job["_id"], "trace-1")
+
+
+@patch("app.userHistory")
+@patch("app.eventStore")
+@patch("app.enrichData")
+def test_run_job_reupload_only_processes_new_records(mock_enrich, mock_event_store, mock_history, event_columns):
+    from ingest import UserHistory
+    older = [{"title": "Watched", "time": f"2023-10-01T12:0{minute}:00Z",
+              "titleUrl": f"https://www.youtube.com/watch?v=video{minute}aaaaa"} for minute in (3, 2, 1)]
+    newer = [{"title": "Watched", "time": f"2023-10-02T12:0{minute}:00Z",
+              "titleUrl": f"https://www.youtube.com/watch?v=video{minute}bbbbb"} for minute in (2, 1)]
+    mock_enrich.return_value = {}
+    collection = MagicMock()
+    collection.update_one.return_value.matched_count = 1
+    history = UserHistory(collection)
+    mock_history.merge.side_effect = history.merge
+    mock_history.watermark.side_effect = history.watermark
+    writer = mock_event_store.writer.return_value
+    writer.write.side_effect = lambda events: setattr(writer, "count", writer.count + len(events))
+    queue = MagicMock()
+    job = {"_id": ObjectId(), "file_id": "file", "user": "1.2.3.4"}
+
+    writer.count = 0
+    mock_history.load.return_value = None
+    queue.openUpload.return_value = io.BytesIO(json.dumps(older).encode())
+    runJob(job, queue)
+    stored = dict(collection.insert_one.call_args.args[0])
+
+    writer.count = 0
+    mock_history.load.return_value = stored
+    queue.openUpload.return_value = io.BytesIO(json.dumps(newer + older).encode())
+    second = dict(job, _id=ObjectId())
+    runJob(second, queue)
+
+    # only the two new events were parsed and enriched the second time
+    assert [len(call.args[0]) for call in mock_enrich.call_args_list] == [3, 2]
+    assert queue.update.call_args_list[-1].kwargs["event_count"] == 5
+    fields = collection.update_one.call_args.args[1]["$set"]
+    assert fields["event_count"] == 5
+    assert fields["watermark"]["latest"] == datetime(2023, 10, 2, 12, 2, tzinfo=timezone.utc)
+    # the old rows stay where they are: only the new events are written, under the new request
+    assert [call.args[0] for call in mock_event_store.writer.call_args_list] == [job["_id"], second["_id"]]
+    assert all(name.startswith("writer") for name, _, _ in mock_event_store.method_calls)
+    assert fields["segments"] == [job["_id"], second["_id"]]
+    assert queue.update.call_args_list[-1].kwargs["segments"] == [job["_id"], second["_id"]]
+    with event_columns.open(job["_id"]) as first, event_columns.open(second["_id"]) as new:
+        assert (len(first), len(new)) == (3, 2)
+    with event_columns.openHistory(fields["segments"]) as history:
+        assert len(history) == 5
+
+
+@patch("app.userHistory")
+@patch("app.ingestUpload")
+def test_run_job_retried_after_merge_does_not_ingest_again(mock_ingest, mock_history):
+    queue = MagicMock()
+    job = {"_id": ObjectId(), "file_id": "file", "user": "1.2.3.4"}
+    from ingest import UserHistory
+    mock_history.segments.side_effect = UserHistory.segments
+    mock_history.load.return_value = {"jobs": [job["_id"]], "metrics": {"total_videos": 3}, "event_count": 3}
+
+    runJob(job, queue)
+
+    mock_ingest.assert_not_called()
+    assert queue.update.call_args.kwargs == {
+        "status": "analyzing", "event_count": 3, "metrics": {"total_videos": 3}, "segments": [job["_id"]],
+    }
+    queue.handOff.assert_called_once()
+
+
+@patch("app.enrichData")
+def test_processWatchHistory_sink_receives_chunks(mock_enrich):
+    mock_data = [{"title": "Watched Test Video", "time": "2023-10-01T12:00:00Z",
+                  "titleUrl": "https://www.youtube.com/watch?v=abc123def45"}] * 5
+    file_obj = io.BytesIO(json.dumps(mock_data).encode("utf-8"))
+    chunks = []
+    events = processWatchHistory(file_obj, chunk_size=2, stream=True, sink=lambda chunk: chunks.append(len(chunk)))
 
+    assert events is None
+    assert chunks == [2, 2, 1]
+
+
+@patch("app.enrichData", lambda events, metrics, user=None: {})
+def test_processWatchHistory_stream_keeps_nothing_without_a_sink():
+    record = {"title": "Watched Test Video", "time": "2023-10-01T12:00:00Z",
+              "titleUrl": "https://www.youtube.com/watch?v=abc123def45"}
+
+    def peak(count):
+        raw = json.dumps([record] * count).encode("utf-8")
+        tracemalloc.start()
+        try:
+            assert processWatchHistory(io.BytesIO(raw), chunk_size=100, limit=count, stream=True) is None
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    # ten times the events, about the same memory: only one chunk is alive at a time
+    assert peak(20000) < 2 * peak(2000)
+
+
+def test_results_time_answers_from_stored_rollups(client, mock_db):
+    metrics = WatchMetrics("Asia/Tokyo")
+    metrics.addWatches([datetime.now(timezone.utc), datetime(2020, 1, 1, tzinfo=timezone.utc)])
+    mock_db.Request.find_one.return_value = {"metrics": {"time_rollups": metrics.time.toDict()}}
+
+    data = client.get("/results/6522b06b9f2e4e3d8f5b5e29/time?days=90").get_json()
+    assert data["timezone"] == "Asia/Tokyo"
+    assert sum(count for _, count in data["monthly"]) == 2
+    assert data["last_days"] == {"days": 90, "events": 1}
+    assert mock_db.Request.find_one.call_args.args[1] == {"metrics.time_rollups": 1}
+
+    assert client.get("/results/6522b06b9f2e4e3d8f5b5e29/time?days=0").status_code == 400
+    mock_db.Request.find_one.return_value = {"metrics": {"hourly_watchtime": [0] * 24}}
+    assert client.get("/results/6522b06b9f2e4e3d8f5b5e29/time").status_code == 404
+
+
+def test_results_activity_reads_event_columns(client, mock_db, event_columns):
+    from columnar import EventColumnsWriter
+    writer = EventColumnsWriter()
+    video = {"id": "abc123def45", "contentDetails": {"duration": "PT1M"}, "snippet": {"channelTitle": "Test Channel"}}
+    writer.extend([
+        {"video_id": "abc123def45", "timestamp": datetime(2023, 10, day, 16, tzinfo=timezone.utc)} for day in (1, 2, 3)
+    ], {"abc123def45": video})
+    request_id = "6522b06b9f2e4e3d8f5b5e29"
+    event_columns.save(request_id, writer)
+    mock_db.Request.find_one.return_value = {"_id": ObjectId(request_id)}
+
+    data = client.get(f"/results/{request_id}/activity?from=2023-10-02").get_json()
+    assert data["events"] == 2
+    assert data["hourly_watchtime"][12] == 2
+    assert data["channel_stats"] == [{"name": "Test Channel", "watchtime": 120.0, "frequency": 2}]
+
+    assert client.get(f"/results/{request_id}/activity?from=yesterday").status_code == 400
+    # a continuation reads the segments of the uploads it continued too
+    event_columns.save("6522b06b9f2e4e3d8f5b5e28", writer)
+    mock_db.Request.find_one.return_value = {"segments": ["6522b06b9f2e4e3d8f5b5e28", request_id]}
+    assert client.get(f"/results/{request_id}/activity").get_json()["events"] == 6
+    mock_db.Request.find_one.return_value = None
+    assert client.get("/results/6522b06b9f2e4e3d8f5b5e30/activity").status_code == 404
+
+
+def test_results_page_shows_job_status(client, mock_db):
+    valid_id = str(ObjectId())
+    mock_db.Request.find_one.return_value = {"_id": ObjectId(valid_id), "status": "enriching", "progress": 300, "analysis": None}
+
+    response = client.get(f"/results/{valid_id}")
+    assert response.status_code == 200
+    assert b"Looking up your videos (300 so far)" in response.data
+
+
+def test_results_page_failed_job(client, mock_db):
+    valid_id = str(ObjectId())
+    mock_db.Request.find_one.return_value = {"_id": ObjectId(valid_id), "status": "failed", "analysis": None}
+
+    response = client.get(f"/results/{valid_id}")
+    assert response.status_code == 500
+
+
+def test_results_status(client, mock_db):
+    valid_id = str(ObjectId())
+    mock_db.Request.find_one.return_value = {"status": "enriching", "progress": 50}
+
+    response = client.get(f"/results/{valid_id}/status")
+    assert response.get_json() == {"status": "enriching", "progress": 50}
+    assert mock_db.Request.find_one.call_args.args[1] == {"status": 1, "progress": 1, "partial": 1}
+
+    mock_db.Request.find_one.return_value = {"status": "analyzing", "partial": {"habits": {"summary": "s"}}}
+    response = client.get(f"/results/{valid_id}/status")
+    assert response.get_json()["partial"] == {"habits": {"summary": "s"}}
+
+    mock_db.Request.find_one.return_value = {"status": "done"}
+    assert client.get(f"/results/{valid_id}/status").get_json()["status"] == "done"
+
+    mock_db.Request.find_one.return_value = None
+    assert client.get(f"/results/{valid_id}/status").status_code == 404
+
+
+def test_results_pending_skips_analysis(client, mock_db):
+    """Pending jobs are answered from a status-only projection and never cached."""
+    valid_id = str(ObjectId())
+    mock_db.Request.find_one.return_value = {"status": "analyzing"}
+
+    response = client.get(f"/results/{valid_id}")
+    assert response.status_code == 200
+    assert mock_db.Request.find_one.call_count == 1
+    assert mock_db.Request.find_one.call_args.args[1] == {"status": 1, "progress": 1}
+    assert "no-store" in response.headers["Cache-Control"]
+
+
+def test_results_final_page_cached_with_validators(client, mock_db, result_cache):
+    valid_id = str(ObjectId())
+    mock_db.Request.find_one.return_value = {
+        "status": "done",
+        "analysis": {
+            "channels": {"most_frequent": ["Mock Channel"], "watch_time": {"Mock Channel": 10}},
+            "categories": {"most_watched": ["Gaming"], "watch_time": {"Gaming": 10}},
+            "habits": {"summary": "Mock summary", "recommendations": []},
+        },
+        "completed_at": datetime(2025, 4, 1, 12, 0, tzinfo=timezone.utc),
+    }
+
+    first = client.get(f"/results/{valid_id}")
+    assert first.status_code == 200
+    assert b"Mock summary" in first.data
+    assert first.headers["ETag"]
+    assert first.headers["Last-Modified"] == "Tue, 01 Apr 2025 12:00:00 GMT"
+    reads = mock_db.Request.find_one.call_count
+
+    second = client.get(f"/results/{valid_id}", headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 304
+    third = client.get(f"/results/{valid_id}", headers={"If-Modified-Since": first.headers["Last-Modified"]})
+    assert third.status_code == 304
+    assert client.get(f"/results/{valid_id}/status").get_json()["status"] == "done"
+    assert mock_db.Request.find_one.call_count == reads
+    assert len(result_cache) == 1
+
+
+@patch("app.jobEvents")
+def test_results_events_streams_until_done(mock_events, client, mock_db):
+    valid_id = str(ObjectId())
+    mock_events.follow.return_value = (update for update in [
+        {"status": "enriching", "progress": 10}, None, {"status": None, "progress": 20, "id": "e2"}, {"status": "done", "progress": None},
+    ])
+
+    response = client.get(f"/results/{valid_id}/events", headers={"Last-Event-ID": "e1"})
+    assert response.mimetype == "text/event-stream"
+    lines = response.get_data(as_text=True).splitlines()
+    messages = [json.loads(line[len("data: "):]) for line in lines if line.startswith("data: ")]
+    assert messages == [
+        {"status": "enriching", "progress": 10},
+        {"status": "enriching", "progress": 20},
+        {"status": "done", "progress": 20},
+    ]
+    assert [line for line in lines if line.startswith("id: ")] == ["id: e2"]
+    assert mock_events.follow.call_args.kwargs["after"] == "e1"
+
+
+@patch("app.jobEvents")
+def test_results_events_are_bounded(mock_events, client, mock_db):
+    mock_events.follow.side_effect = lambda *args, **kwargs: (update for update in [{"status": "enriching"}])
+    with patch("app.eventStreams", threading.BoundedSemaphore(1)) as streams:
+        # a stream frees its slot once the server closes it
+        client.get(f"/results/{ObjectId()}/events").close()
+        assert streams.acquire(blocking=False)
+
+        # while one is open the next browser is told to come back later
+        busy = client.get(f"/results/{ObjectId()}/events")
+        assert busy.get_data(as_text=True) == f"retry: {SSE_BUSY_RETRY_MS}\n\n"
+        mock_events.follow.assert_called_once()
+
+
+@patch("app.jobEvents")
+def test_results_events_finished_job(mock_events, client, mock_db):
+    mock_events.follow.return_value = (update for update in [{"status": "done"}])
+    response = client.get(f"/results/{ObjectId()}/events")
+    assert response.get_data(as_text=True) == 'data: {"status": "done", "progress": 0}\n\n'
+
+    mock_events.follow.return_value = (update for update in [None])
+    assert client.get(f"/results/{ObjectId()}/events").status_code == 404
 
 
 def test_results_page_valid_objectid(client, mock_db):
@@ -118,6 +576,12 @@ def test_results_page_not_found(client, mock_db):
     assert b"Couldn't generate results" in response.data
     assert b"Try again" in response.data
     
+@pytest.mark.parametrize("path", ["status", "time", "events", "activity"])
+def test_results_endpoints_reject_malformed_ids(client, mock_db, path):
+    assert client.get(f"/results/not-an-id/{path}").status_code == 404
+    mock_db.Request.find_one.assert_not_called()
+
+
 def test_results_page_invalid_objectid(client):
     """Test invalid ObjectId raises InvalidId error."""
     with patch("app.ObjectId", side_effect=InvalidId("bad id")):
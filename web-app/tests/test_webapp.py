@@ -1,13 +1,14 @@
 """Testing web-app/app.py file."""
 
 import pytest
+from unittest.mock import patch
 from app import app
 
 
 @pytest.fixture
 def client():
     app.config["TESTING"] = True
-    with app.test_client() as client:
+    with patch("app.jobs"), app.test_client() as client:
         yield client
 
 
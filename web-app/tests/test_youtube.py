@@ -0,0 +1,130 @@
+"""Testing web-app/youtube.py against a local stub of the videos endpoint."""
+
+import json
+import threading
+import time
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+from youtube import QUOTA_UNITS, QuotaExceeded, VideoFetcher, batched
+
+
+class StubYouTube(BaseHTTPRequestHandler):
+    """Answers videos.list with one item per requested ID."""
+
+    failures = {}  # batch index -> statuses to return before succeeding
+    calls = []
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def do_GET(self):
+        cls = type(self)
+        ids = parse_qs(urlparse(self.path).query)["id"][0].split(",")
+        with cls.lock:
+            cls.calls.append(ids)
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+            pending = cls.failures.get(ids[0], [])
+            status = pending.pop(0) if pending else 200
+        time.sleep(0.05)
+        with cls.lock:
+            cls.in_flight -= 1
+
+        if status == 200:
+            body = {"items": [{
+                "id": video_id,
+                "contentDetails": {"duration": "PT1M"},
+                "snippet": {"channelTitle": "Channel", "categoryId": "22"},
+            } for video_id in ids]}
+        elif status == "quota":
+            status = 403
+            body = {"error": {"code": 403, "errors": [{"reason": "quotaExceeded"}]}}
+        else:
+            body = {"error": {"code": status}}
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_url():
+    StubYouTube.failures = {}
+    StubYouTube.calls = []
+    StubYouTube.max_in_flight = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubYouTube)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/youtube/v3/videos"
+    server.shutdown()
+    server.server_close()
+
+
+def video_ids(count):
+    return [f"vid{i:08d}" for i in range(count)]
+
+
+def test_batched():
+    assert [len(batch) for batch in batched(video_ids(120))] == [50, 50, 20]
+
+
+def test_fetch_batches_in_order_and_concurrent(stub_url):
+    """Batches run in parallel but come back in submission order."""
+    fetcher = VideoFetcher("key", stub_url, concurrency=4, backoff=0)
+    ids = video_ids(400)
+    results, units, exhausted = fetcher.fetchBatches(ids)
+
+    assert [item["id"] for batch in results for item in batch] == ids
+    assert (units, exhausted) == (8, False)
+    assert len(StubYouTube.calls) == 8
+    assert 1 < StubYouTube.max_in_flight <= 4
+
+
+def test_fetch_retries_quota_and_server_errors(stub_url):
+    StubYouTube.failures = {"vid00000000": [403, 503]}
+    fetcher = VideoFetcher("key", stub_url, concurrency=2, retries=3, backoff=0)
+    quota = QUOTA_UNITS.value()
+    results, units, _ = fetcher.fetchBatches(video_ids(10))
+
+    assert len(results[0]) == 10
+    assert len(StubYouTube.calls) == 3
+    # every attempt is charged against the quota
+    assert QUOTA_UNITS.value() - quota == 3
+    assert units == 3
+
+
+def test_fetch_gives_up_after_retries(stub_url):
+    """An exhausted batch yields None, not an empty answer."""
+    StubYouTube.failures = {"vid00000000": [500, 500, 500]}
+    fetcher = VideoFetcher("key", stub_url, concurrency=2, retries=2, backoff=0)
+    results, units, _ = fetcher.fetchBatches(video_ids(60))
+
+    assert results[0] is None
+    assert len(results[1]) == 10
+    # only the answered batch counts against the reservation
+    assert units == 1
+
+
+def test_fetch_raises_when_daily_quota_is_spent(stub_url):
+    StubYouTube.failures = {"vid00000000": ["quota"] * 3}
+    fetcher = VideoFetcher("key", stub_url, concurrency=1, retries=2, backoff=0)
+    with pytest.raises(QuotaExceeded):
+        fetcher.fetchBatch(video_ids(10))
+
+
+def test_batches_answered_before_the_quota_ran_out_are_kept(stub_url):
+    StubYouTube.failures = {"vid00000050": ["quota"]}
+    fetcher = VideoFetcher("key", stub_url, concurrency=1, retries=0, backoff=0)
+    results, units, exhausted = fetcher.fetchBatches(video_ids(200))
+
+    assert exhausted
+    assert len(results) == 4
+    assert len(results[0]) == 50
+    assert results[1] is None
+    assert units == 1
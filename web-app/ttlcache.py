@@ -0,0 +1,60 @@
+"""Base of the MongoDB caches whose entries a TTL index expires.
+
+web-app and open-ai each keep an identical copy of this module: every
+service is its own Docker build context, and compose bind-mounts web-app's
+source over the image, so a copy made at build time would be hidden.
+web-app/tests/test_shared_modules.py fails if the two copies differ.
+"""
+
+import threading
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+
+
+class TTLCache:
+    """Documents unique on ``key_field`` and deleted ``ttl_seconds`` after ``cached_at``.
+
+    Subclasses name ``key_field`` and add their own reads and writes,
+    counting lookups with ``_record`` so ``stats`` can report the hit rate.
+    """
+
+    key_field = None
+
+    def __init__(self, collection, ttl_seconds):
+        self.collection = collection
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._indexed = False
+
+    def ensureIndexes(self):
+        """Create the unique key index and TTL index once per process."""
+        if self._indexed:
+            return
+        self.collection.create_index([(self.key_field, ASCENDING)], unique=True)
+        try:
+            self.collection.create_index([("cached_at", ASCENDING)], expireAfterSeconds=self.ttl_seconds)
+        except OperationFailure:
+            # TTL changed since the index was built; update it in place
+            self.collection.database.command(
+                "collMod",
+                self.collection.name,
+                index={"keyPattern": {"cached_at": 1}, "expireAfterSeconds": self.ttl_seconds},
+            )
+        self._indexed = True
+
+    def _record(self, hits, lookups):
+        with self._lock:
+            self.hits += hits
+            self.misses += lookups - hits
+
+    def stats(self):
+        """Return the hit/miss counters and hit rate since startup."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
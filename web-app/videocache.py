@@ -0,0 +1,136 @@
+"""Caches of YouTube video metadata: a shared MongoDB store and an in-process LRU."""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pymongo import UpdateOne
+from ttlcache import TTLCache
+
+
+class VideoMetadataCache(TTLCache):
+    """Cache of ``videos.list`` items keyed by video ID, expired by a TTL index.
+
+    Documents look like ``{video_id, item, cached_at}``; ``hits``/``misses``
+    count lookups so the saved API quota can be reported.
+    """
+
+    key_field = "video_id"
+
+    def getMany(self, video_ids):
+        """Return ``{video_id: item}`` for the IDs present in the cache."""
+        self.ensureIndexes()
+        found = {}
+        if video_ids:
+            cursor = self.collection.find(
+                {"video_id": {"$in": list(video_ids)}},
+                {"_id": 0, "video_id": 1, "item": 1},
+            )
+            found = {doc["video_id"]: doc["item"] for doc in cursor}
+        self._record(len(found), len(video_ids))
+        return found
+
+    def putMany(self, items):
+        """Upsert freshly fetched ``videos.list`` items in one bulk write."""
+        if not items:
+            return
+        self.ensureIndexes()
+        now = datetime.now(timezone.utc)
+        self.collection.bulk_write(
+            [
+                UpdateOne(
+                    {"video_id": item["id"]},
+                    {"$set": {"item": item, "cached_at": now}},
+                    upsert=True,
+                )
+                for item in items
+            ],
+            ordered=False,
+        )
+
+
+class VideoLRUCache:
+    """Bounded in-process LRU of video metadata sitting in front of Mongo.
+
+    Entries are charged by their JSON size against ``max_bytes``. IDs the API
+    did not return (deleted or private videos) are remembered as negative
+    entries for ``negative_ttl`` seconds so they are not requested again.
+    """
+
+    NEGATIVE_SIZE = 64
+
+    def __init__(self, max_bytes, negative_ttl):
+        self.max_bytes = max_bytes
+        self.negative_ttl = negative_ttl
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # video_id -> (item or None, size, expires)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def getMany(self, video_ids):
+        """Return ``({video_id: item}, absent_ids)`` for the IDs held in memory."""
+        found = {}
+        absent = set()
+        now = time.monotonic()
+        with self._lock:
+            for video_id in video_ids:
+                entry = self._entries.get(video_id)
+                if entry is None:
+                    self.misses += 1
+                    continue
+                item, size, expires = entry
+                if item is None and expires <= now:
+                    self._discard(video_id)
+                    self.misses += 1
+                    continue
+                self._entries.move_to_end(video_id)
+                self.hits += 1
+                if item is None:
+                    absent.add(video_id)
+                else:
+                    found[video_id] = item
+        return found, absent
+
+    def putMany(self, items):
+        """Remember ``videos.list`` items, evicting least recently used ones."""
+        with self._lock:
+            for item in items:
+                self._store(item["id"], item, len(json.dumps(item)), None)
+
+    def putMissing(self, video_ids):
+        """Remember IDs the API had no metadata for until ``negative_ttl`` passes."""
+        expires = time.monotonic() + self.negative_ttl
+        with self._lock:
+            for video_id in video_ids:
+                self._store(video_id, None, self.NEGATIVE_SIZE, expires)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _store(self, video_id, item, size, expires):
+        if size > self.max_bytes:
+            return
+        self._discard(video_id)
+        self._entries[video_id] = (item, size, expires)
+        self.size += size
+        while self.size > self.max_bytes:
+            _, (_, evicted, _) = self._entries.popitem(last=False)
+            self.size -= evicted
+
+    def _discard(self, video_id):
+        entry = self._entries.pop(video_id, None)
+        if entry is not None:
+            self.size -= entry[1]
@@ -0,0 +1,162 @@
+"""Per-job accumulator for watch-history metrics."""
+
+from array import array
+import isodate
+from config import DEFAULT_TIMEZONE, TOP_K_CAPACITY
+from heavyhitters import StatTotals, TopK
+from rollups import TimeRollups
+
+# 6 hour cap on counted video length
+MAX_DURATION = 21600
+
+
+class WatchMetrics:
+    """Metrics for a single upload, built up chunk by chunk.
+
+    Every job gets its own instance, so concurrent uploads never share state.
+    Partial results from parallel workers are combined with ``merge``. Watch
+    times are bucketed in the uploader's ``timezone``. Tags, channels and
+    categories are counted in ``TopK`` summaries of ``top_k`` counters each
+    (``None`` keeps them all), so memory stays flat however varied the
+    history is.
+    """
+
+    __slots__ = (
+        "total_watchtime",
+        "total_videos",
+        "time",
+        "tag_frequency",
+        "channel_stats",
+        "category_stats",
+        "longest_video",
+        "shortest_video",
+        "estimated_videos",
+    )
+
+    def __init__(self, timezone=DEFAULT_TIMEZONE, top_k=TOP_K_CAPACITY):
+        self.total_watchtime = 0
+        self.total_videos = 0
+        self.time = TimeRollups(timezone)
+        self.tag_frequency = TopK(top_k)
+        self.channel_stats = TopK(top_k)
+        self.category_stats = TopK(top_k)
+        self.longest_video = ("", 0)
+        self.shortest_video = ("", float("inf"))
+        # views attributed by scaling up a quota-limited sample
+        self.estimated_videos = 0
+
+    @property
+    def hourly_watchtime(self):
+        return self.time.hourly
+
+    @property
+    def weekday_watchtime(self):
+        return self.time.weekday
+
+    def addWatches(self, timestamps):
+        """Count a batch of watch events (aware datetimes) in the time rollups."""
+        self.time.add(int(timestamp.timestamp()) for timestamp in timestamps)
+
+    def addWatch(self, timestamp):
+        self.addWatches((timestamp,))
+
+    def addVideo(self, enriched_video, views=1):
+        """Add a ``videos.list`` item, weighted by how often it was watched."""
+        duration = isodate.parse_duration(enriched_video["contentDetails"]["duration"]).total_seconds()
+        if duration > MAX_DURATION:
+            return
+        snippet = enriched_video["snippet"]
+        channel = snippet.get("channelTitle", "UnknownChannel")
+        category = snippet.get("categoryId", "UnknownCategory")
+
+        self.total_watchtime += duration * views
+        self.total_videos += views
+        for tag in snippet.get("tags", []):
+            self.tag_frequency.add(tag, views)
+        self.channel_stats.add(channel, views, duration * views)
+        self.category_stats.add(category, views, duration * views)
+        if duration > self.longest_video[1]:
+            self.longest_video = (enriched_video["id"], duration)
+        if duration < self.shortest_video[1]:
+            self.shortest_video = (enriched_video["id"], duration)
+
+    def merge(self, other):
+        """Fold ``other`` into this accumulator and return ``self``.
+
+        Merging partials in input order gives the same result as one serial
+        pass, including which video wins a tie for longest/shortest, as long
+        as the top-K summaries haven't had to evict anything.
+        """
+        self.total_watchtime += other.total_watchtime
+        self.total_videos += other.total_videos
+        self.time.merge(other.time)
+        self.tag_frequency.merge(other.tag_frequency)
+        self.channel_stats.merge(other.channel_stats)
+        self.category_stats.merge(other.category_stats)
+        if other.longest_video[1] > self.longest_video[1]:
+            self.longest_video = other.longest_video
+        if other.shortest_video[1] < self.shortest_video[1]:
+            self.shortest_video = other.shortest_video
+        self.estimated_videos += other.estimated_videos
+        return self
+
+    def topTags(self, n=100):
+        return [(tag, totals.frequency) for tag, totals in self.tag_frequency.top(n)]
+
+    def topChannels(self, n=100):
+        return self.channel_stats.top(n)
+
+    def topCategories(self, n=100):
+        return self.category_stats.top(n)
+
+    def toDict(self):
+        """Plain, BSON-safe form for storing on the request document."""
+        return {
+            "total_watchtime": self.total_watchtime,
+            "total_videos": self.total_videos,
+            "hourly_watchtime": list(self.hourly_watchtime),
+            "weekday_watchtime": list(self.weekday_watchtime),
+            "time_rollups": self.time.toDict(),
+            "tag_frequency": [[tag, totals.frequency] for tag, totals in self.tag_frequency.items()],
+            "channel_stats": [dict(name=name, **totals.toDict()) for name, totals in self.channel_stats.items()],
+            "category_stats": [dict(name=name, **totals.toDict()) for name, totals in self.category_stats.items()],
+            "longest_video": {"video_id": self.longest_video[0], "duration": self.longest_video[1]},
+            "shortest_video": {
+                "video_id": self.shortest_video[0],
+                "duration": self.shortest_video[1] if self.total_videos else None,
+            },
+            "estimated_videos": self.estimated_videos,
+            "top_k": {
+                "tags": self.tag_frequency.toDict(),
+                "channels": self.channel_stats.toDict(),
+                "categories": self.category_stats.toDict(),
+            },
+        }
+
+    @classmethod
+    def fromDict(cls, data):
+        """Rebuild an accumulator from ``toDict`` output, e.g. a user's stored aggregates."""
+        metrics = cls()
+        metrics.total_watchtime = data["total_watchtime"]
+        metrics.total_videos = data["total_videos"]
+        if "time_rollups" in data:
+            metrics.time = TimeRollups.fromDict(data["time_rollups"])
+        else:
+            # stored before rollups: only the histograms, in the default timezone
+            metrics.time.hourly = array("q", data["hourly_watchtime"])
+            metrics.time.weekday = array("q", data["weekday_watchtime"])
+        # stored before top-K summaries: exact counts
+        sketches = data.get("top_k", {"tags": {}, "channels": {}, "categories": {}})
+        metrics.tag_frequency = TopK.fromEntries(
+            ((tag, StatTotals(0, count)) for tag, count in data["tag_frequency"]), sketches["tags"],
+        )
+        for field, kind in (("channel_stats", "channels"), ("category_stats", "categories")):
+            setattr(metrics, field, TopK.fromEntries(
+                ((entry["name"], StatTotals(entry["watchtime"], entry["frequency"])) for entry in data[field]),
+                sketches[kind],
+            ))
+        metrics.longest_video = (data["longest_video"]["video_id"], data["longest_video"]["duration"])
+        shortest = data["shortest_video"]
+        metrics.shortest_video = (shortest["video_id"], float("inf") if shortest["duration"] is None else shortest["duration"])
+        metrics.estimated_videos = data.get("estimated_videos", 0)
+        return metrics
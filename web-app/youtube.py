@@ -0,0 +1,115 @@
+"""Concurrent, pooled client for the YouTube Data API ``videos.list`` endpoint."""
+
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from telemetry import registry
+
+BATCH_SIZE = 50
+PART = "snippet,contentDetails,statistics"
+FIELDS = "items(id,snippet(title,channelTitle,categoryId,tags,publishedAt),contentDetails(duration))"
+# 403 is how the API reports exhausted quota / rate limits
+RETRY_STATUSES = (403, 429, 500, 502, 503, 504)
+# quota units charged per videos.list request, whatever the number of IDs
+QUOTA_COST = 1
+
+logger = logging.getLogger(__name__)
+
+
+class QuotaExceeded(Exception):
+    """The API refused a request because the project's daily quota is used up."""
+
+
+API_CALLS = registry.counter("youtube_api_calls_total", "videos.list requests sent, retries included.", ["status"])
+QUOTA_UNITS = registry.counter("youtube_quota_units_total", "YouTube Data API quota units spent.")
+API_SECONDS = registry.histogram("youtube_api_seconds", "Duration of videos.list calls, retries included.")
+
+
+def batched(video_ids, size=BATCH_SIZE):
+    """Split ``video_ids`` into consecutive lists of at most ``size`` IDs."""
+    return [video_ids[i:i + size] for i in range(0, len(video_ids), size)]
+
+
+class VideoFetcher:
+    """Fetch video metadata with several 50-ID batches in flight at once.
+
+    All requests share one keep-alive ``requests.Session`` whose pool is sized
+    to ``concurrency``; 403/5xx answers are retried with exponential backoff.
+    """
+
+    def __init__(self, api_key, url, concurrency=4, retries=3, backoff=0.5, timeout=10):
+        self.api_key = api_key
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset(["GET"]),
+            backoff_factor=backoff,
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="youtube")
+
+    def fetchBatch(self, video_ids):
+        """Return ``(items, units)`` for one ``videos.list`` call.
+
+        ``items`` is None if the call failed, which says nothing about whether
+        its videos exist, unlike an answer without some of them. ``units`` is
+        the quota the call cost, retries included. Raises ``QuotaExceeded``
+        when the API reports the daily quota spent.
+        """
+        params = {
+            "key": self.api_key,
+            "part": PART,
+            "fields": FIELDS,
+            "id": ",".join(video_ids),
+        }
+        with API_SECONDS.time():
+            response = self.session.get(self.url, params=params, timeout=self.timeout)
+        retries = getattr(response.raw, "retries", None)
+        attempts = len(retries.history) + 1 if retries else 1
+        API_CALLS.inc(attempts, status=response.status_code)
+        QUOTA_UNITS.inc(attempts * QUOTA_COST)
+        if not response.ok:
+            if response.status_code == 403 and "quotaExceeded" in response.text:
+                raise QuotaExceeded(response.text)
+            logger.warning("videos.list answered %s for %d ids", response.status_code, len(video_ids))
+            return None, attempts * QUOTA_COST
+        return response.json().get("items", []), attempts * QUOTA_COST
+
+    def fetchBatches(self, video_ids):
+        """Fetch ``video_ids`` in 50-ID batches concurrently.
+
+        Returns ``(batches, units, exhausted)``: one list of items per batch,
+        in the same order as the batches so callers aggregate exactly as they
+        would with serial requests; the units the answered batches cost,
+        retries included; and whether the API reported the daily quota spent.
+        A batch that failed, or was never sent because the quota ran out,
+        is None. Batches answered before that are still returned.
+        """
+        spent = threading.Event()
+
+        def fetch(batch):
+            # batches still queued when the quota runs out are not sent
+            if spent.is_set():
+                return None, 0
+            try:
+                return self.fetchBatch(batch)
+            except QuotaExceeded:
+                spent.set()
+                return None, 0
+
+        batches, units = [], 0
+        for items, cost in self.executor.map(fetch, batched(video_ids)):
+            if items is not None:
+                units += cost
+            batches.append(items)
+        return batches, units, spent.is_set()